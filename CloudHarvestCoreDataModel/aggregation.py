@@ -0,0 +1,259 @@
+from functools import partial
+from itertools import compress
+from operator import is_not, itemgetter
+from typing import Any, Callable, Dict, Iterable, List, Tuple
+from .flattening import field_values
+
+# Only these types are summed and averaged. Booleans are ignored even though bool is a subclass of int.
+_NUMBER_TYPES = frozenset((int, float))
+
+_is_not_none = partial(is_not, None)
+
+
+def aggregate_count(values: list) -> int:
+    """
+    Returns the number of values which are not None.
+
+    Args:
+        values (list): The values of a field for the records of a group.
+    """
+
+    return len(values) - values.count(None)
+
+
+def aggregate_sum(values: list) -> int or float:
+    """
+    Returns the sum of the numeric values. Other values, including booleans and strings, are ignored.
+
+    Args:
+        values (list): The values of a field for the records of a group.
+    """
+
+    return sum(_numbers(values))
+
+
+def aggregate_avg(values: list) -> float or None:
+    """
+    Returns the mean of the numeric values, or None when there are none.
+
+    Args:
+        values (list): The values of a field for the records of a group.
+    """
+
+    numbers = _numbers(values)
+
+    return sum(numbers) / len(numbers) if numbers else None
+
+
+def aggregate_min(values: list) -> Any:
+    """
+    Returns the smallest value which is not None, or None when there are none. Values of different types are compared
+    with sorting.sort_key().
+
+    Args:
+        values (list): The values of a field for the records of a group.
+    """
+
+    return _extreme(min, values)
+
+
+def aggregate_max(values: list) -> Any:
+    """
+    Returns the largest value which is not None, or None when there are none. Values of different types are compared
+    with sorting.sort_key().
+
+    Args:
+        values (list): The values of a field for the records of a group.
+    """
+
+    return _extreme(max, values)
+
+
+def aggregate_first(values: list) -> Any:
+    """
+    Returns the value of the first record of the group.
+
+    Args:
+        values (list): The values of a field for the records of a group.
+    """
+
+    return values[0]
+
+
+def aggregate_last(values: list) -> Any:
+    """
+    Returns the value of the last record of the group.
+
+    Args:
+        values (list): The values of a field for the records of a group.
+    """
+
+    return values[-1]
+
+
+def aggregate_count_distinct(values: list) -> int:
+    """
+    Returns the number of distinct values which are not None. Values which cannot be hashed, such as lists and
+    dictionaries, are compared by their deduplication.fingerprint().
+
+    Args:
+        values (list): The values of a field for the records of a group.
+    """
+
+    try:
+        distinct = set(values)
+
+    except TypeError:
+        from .deduplication import fingerprint
+
+        distinct = {value if value is None else fingerprint({'value': value}) for value in values}
+
+    distinct.discard(None)
+
+    return len(distinct)
+
+
+# Maps the name of each aggregate operator to the function which computes it from the values of a group
+AGGREGATE_FUNCTIONS = {
+    'avg': aggregate_avg,
+    'count': aggregate_count,
+    'count_distinct': aggregate_count_distinct,
+    'first': aggregate_first,
+    'last': aggregate_last,
+    'max': aggregate_max,
+    'min': aggregate_min,
+    'sum': aggregate_sum,
+}
+
+
+def compile_aggregations(aggregations: Dict[str, str or dict]) -> List[Tuple[str, str, str, Callable]]:
+    """
+    Validates aggregations and resolves their operators once, before any record is read.
+
+    Each aggregation maps the name of an output key to either an operator applied to a field, such as
+    {'TotalSize': {'sum': 'Size'}}, or to 'count', which counts the records of each group.
+
+    Args:
+        aggregations (Dict[str, str or dict]): The aggregations to compile.
+
+    Returns:
+        A list of (name, operator, field, function) tuples. field is None when records are counted.
+
+    Raises:
+        ValueError: When an aggregation is not 'count' or a dictionary of exactly one supported operator and its field.
+    """
+
+    result = []
+    for name, aggregation in aggregations.items():
+        if aggregation == 'count':
+            operator, field = 'count', None
+
+        elif isinstance(aggregation, dict) and len(aggregation) == 1:
+            operator, field = next(iter(aggregation.items()))
+
+        else:
+            raise ValueError(f"Invalid aggregation for '{name}': {aggregation}")
+
+        if operator not in AGGREGATE_FUNCTIONS:
+            raise ValueError(f"Invalid aggregate operator for '{name}': {operator}. "
+                             f"Expected one of {', '.join(AGGREGATE_FUNCTIONS)}")
+
+        if field is None and operator != 'count':
+            raise ValueError(f"The '{operator}' aggregate operator for '{name}' requires a field")
+
+        result.append((name, operator, field, AGGREGATE_FUNCTIONS[operator]))
+
+    return result
+
+
+def aggregate_groups(groups: Iterable[Tuple[tuple, List[int] or List[dict]]],
+                     fields: Tuple[str, ...],
+                     aggregations: List[Tuple[str, str, str, Callable]],
+                     records: List[dict] = None) -> List[dict]:
+    """
+    Builds one record per group containing the group fields and the result of each aggregation.
+
+    When records is provided, groups hold the positions of their records in records. Each aggregated field is then read
+    from every record in a single pass, in record order, and the values of a group are picked from that column, which is
+    faster than visiting the records of each group scattered across the record set. Otherwise, groups hold their records
+    and each field is read from the records of each group.
+
+    Args:
+        groups (Iterable[Tuple[tuple, List[int] or List[dict]]]): (key, positions) or (key, records) pairs, where key
+            holds the values of the fields. Positions and records must be in record set order.
+        fields (Tuple[str, ...]): The fields the records were grouped by.
+        aggregations (List[Tuple[str, str, str, Callable]]): Aggregations compiled by compile_aggregations().
+        records (List[dict], optional): The records which positions refer to. Defaults to None.
+
+    Returns:
+        List[dict]: The aggregated records, in the order of the groups.
+    """
+
+    # Flattened fields such as 'State.Name' are resolved against nested records
+    columns = {}
+    if records is not None:
+        for name, operator, field, function in aggregations:
+            if field is not None and field not in columns:
+                columns[field] = field_values(records, field)
+
+    results = []
+    for key, members in groups:
+        result = dict(zip(fields, key))
+        values = {}
+
+        for name, operator, field, function in aggregations:
+            if field is None:
+                result[name] = len(members)
+                continue
+
+            group_values = values.get(field)
+            if group_values is None:
+                group_values = values[field] = _group_values(members, field, columns.get(field))
+
+            result[name] = function(group_values)
+
+        results.append(result)
+
+    return results
+
+
+def _group_values(members: list, field: str, column: list or None) -> list:
+    """
+    Returns the values of a field for the members of a group, picked from a column by position or read from records.
+    """
+
+    if column is None:
+        return field_values(members, field)
+
+    if len(members) == 1:
+        return [column[members[0]]]
+
+    return list(itemgetter(*members)(column))
+
+
+def _numbers(values: list) -> list:
+    """
+    Returns the values which are numbers.
+    """
+
+    return list(compress(values, map(_NUMBER_TYPES.__contains__, map(type, values))))
+
+
+def _extreme(function: Callable, values: list) -> Any:
+    """
+    Returns min() or max() of the values which are not None.
+    """
+
+    values = list(filter(_is_not_none, values))
+
+    if not values:
+        return None
+
+    try:
+        return function(values)
+
+    except TypeError:
+        # Values of different types, such as numbers and strings
+        from .sorting import sort_key
+
+        return function(values, key=sort_key)
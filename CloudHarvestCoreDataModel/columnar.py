@@ -0,0 +1,594 @@
+from itertools import compress, repeat
+from typing import Dict, Iterable, List, Literal
+from .flattening import get_path
+from .indexes import HarvestIndex, HarvestSortedIndex
+from .matching import (_MATCH_OPERATIONS, _NEGATE, HarvestCompiledExpression, HarvestCompiledMatch, HarvestMatch,
+                       compile_expression)
+from .record import HarvestRecord
+
+
+class HarvestColumnarRow:
+    """
+    The HarvestColumnarRow class is a lightweight handle on a single row of a HarvestColumnarRecordSet. It provides the
+    get() method indexes use to read field values without materializing a HarvestRecord.
+
+    Rows are also the recordset of the HarvestRecord copies returned by the record set, so that the is_matched_record,
+    matching_expressions, and non_matching_expressions of a copy reflect the match results of its row.
+
+    Attributes:
+        recordset (HarvestColumnarRecordSet): The record set the row belongs to.
+        position (int): The position of the row in the record set.
+    """
+
+    __slots__ = ('recordset', 'position')
+
+    def __init__(self, recordset: 'HarvestColumnarRecordSet', position: int):
+        self.recordset = recordset
+        self.position = position
+
+    def get(self, key: str, default=None):
+        """
+        Returns the value of a key in the row, or default if the row does not contain the key.
+
+        :param key: The key to retrieve
+        :param default: The value to return when the row does not contain the key, defaults to None
+        """
+
+        return self.recordset.get_value(self.position, key, default)
+
+    @property
+    def match_expressions(self) -> List[HarvestCompiledMatch]:
+        return self.recordset.match_expressions
+
+    def is_matched(self, record: HarvestRecord = None) -> bool:
+        """
+        Check whether the row satisfied every match added to the record set.
+
+        :param record: A copy of the row, which is accepted for HarvestRecord.is_matched_record and otherwise ignored
+        """
+
+        return self.recordset.is_matched(self.position)
+
+    def explain_record(self, record: HarvestRecord) -> List[HarvestMatch]:
+        """
+        Explain how the row was evaluated by each match added to the record set. See HarvestRecordSet.explain_record().
+
+        :param record: A copy of the row
+        """
+
+        result = []
+        for compiled, bitmap in zip(self.recordset.match_expressions, self.recordset.match_bitmaps):
+            match = HarvestMatch(record=record, syntax=compiled)
+            match.match()
+            match.is_match = bool(bitmap[self.position])
+
+            result.append(match)
+
+        return result
+
+
+class HarvestColumnarRecordSet:
+    """
+    The HarvestColumnarRecordSet class is a column-oriented alternative to HarvestRecordSet for very large inventories.
+    Each key is stored as a single list of values with a null mask marking the rows which do not contain the key, which
+    avoids the cost of a dictionary and match state per row. Matches are evaluated one column at a time, with map()
+    over the column list rather than a lookup per record, and kept as one bitmap per expression. Columns are plain
+    Python lists, so evaluation is not vectorized. Flattened keys such as 'Tags.0.Value' are resolved against the nested
+    values of the column of their first part, as HarvestRecordSet resolves them against nested records.
+
+    The record set exposes the same add, add_match, unwind, and create_index methods as HarvestRecordSet. Iterating
+    over it or indexing into it returns HarvestRecord copies of the rows, whose is_matched_record reflects the match
+    results of their row; changes made to those copies are not written back. Use to_recordset() when records need to be
+    modified.
+
+    Attributes:
+        name (str): The name of the record set.
+        indexes (dict): The indexes of the record set, keyed by index name.
+        index_fields (dict): The fields of each index, keyed by index name.
+        match_expressions (List[HarvestCompiledMatch]): The compiled matches added with add_match().
+        match_bitmaps (List[bytearray]): One bitmap per match expression where 1 marks a matching row.
+        limit_bitmap (bytearray): When add_match() was given a limit, a bitmap where 0 marks the rows after the limit,
+            which do not match. None otherwise.
+        last_match_plan (dict): The plan used by the most recent add_match() call.
+    """
+
+    def __init__(self, name: str = None, data: Iterable[dict] = None):
+        """
+        Initialize a HarvestColumnarRecordSet object.
+
+        :param name: The name of the record set, defaults to a random UUID
+        :param data: An iterable of dictionaries to initialize the record set with, defaults to None
+        """
+
+        from uuid import uuid4
+        self.name = name or str(uuid4())
+
+        # Each column is a list of values with one entry per row. Rows which do not contain the key hold None in the
+        # column and 1 in the matching null mask.
+        self._columns: Dict[str, list] = {}
+        self._missing: Dict[str, bytearray] = {}
+        self._length = 0
+
+        self.indexes = {}
+        self.index_fields = {}
+
+        self.match_expressions: List[HarvestCompiledMatch] = []
+        self.match_bitmaps: List[bytearray] = []
+        self.limit_bitmap: bytearray or None = None
+        self.last_match_plan = None
+
+        if data is not None:
+            self.add(data=data)
+
+    def __enter__(self) -> 'HarvestColumnarRecordSet':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        return None
+
+    def __getitem__(self, position: int) -> HarvestRecord:
+        if position < 0:
+            position += self._length
+
+        if not 0 <= position < self._length:
+            raise IndexError('HarvestColumnarRecordSet index out of range')
+
+        return self._record(position)
+
+    def __iter__(self) -> Iterable[HarvestRecord]:
+        for position in range(self._length):
+            yield self._record(position)
+
+    def __len__(self) -> int:
+        return self._length
+
+    @property
+    def keys(self) -> List[str]:
+        return sorted(key for key, missing in self._missing.items() if missing.count(0))
+
+    def _record(self, position: int) -> HarvestRecord:
+        """
+        Returns a HarvestRecord copy of a row.
+
+        :param position: The position of the row
+        """
+
+        return HarvestRecord(recordset=HarvestColumnarRow(self, position), **{
+            key: column[position]
+            for key, column in self._columns.items()
+            if not self._missing[key][position]
+        })
+
+    def get_value(self, position: int, key: str, default=None):
+        """
+        Returns the value of a key in a row, or default if the row does not contain the key. A flattened key such as
+        'Tags.0.Value' which the row does not contain is resolved against the nested value of its first part, as
+        flattening.get_path() resolves it against a record.
+
+        :param position: The position of the row
+        :param key: The key to retrieve
+        :param default: The value to return when the row does not contain the key, defaults to None
+        """
+
+        column = self._columns.get(key)
+
+        if column is not None and not self._missing[key][position]:
+            return column[position]
+
+        first = self._first_part(key)
+
+        if first is None or self._missing[first][position]:
+            return default
+
+        return get_path({first: self._columns[first][position]}, key, default=default)
+
+    def _first_part(self, key: str) -> str or None:
+        """
+        Returns the first part of a flattened key when it is a column, or None otherwise.
+        """
+
+        if not isinstance(key, str) or '.' not in key:
+            return None
+
+        first = key.split('.', 1)[0]
+
+        return first if first in self._columns else None
+
+    def _key_values(self, key: str) -> list or None:
+        """
+        Returns the value of a key for every row, as get_value() reads it, or None when no row can contain the key.
+        Rows which do not contain the key have a value of None.
+
+        :param key: The key to retrieve
+        """
+
+        column = self._columns.get(key)
+        first = self._first_part(key)
+
+        if first is None:
+            return column
+
+        nested = [get_path({first: value}, key) for value in self._columns[first]]
+
+        if column is None:
+            return nested
+
+        return [resolved if missing else value for value, missing, resolved in zip(column, self._missing[key], nested)]
+
+    def column(self, key: str) -> list:
+        """
+        Returns a copy of the values of a key for every row. Rows which do not contain the key have a value of None.
+        Flattened keys are resolved as get_value() resolves them.
+
+        :param key: The key to retrieve
+        """
+
+        column = self._key_values(key)
+
+        return list(column) if column is not None else [None] * self._length
+
+    def add(self, data: (List[dict]) or dict) -> 'HarvestColumnarRecordSet':
+        """
+        Add a record or a list of records to the record set.
+
+        :param data: A dictionary, HarvestRecord, or list of them
+        """
+
+        if isinstance(data, dict):
+            data = (data, )
+
+        return self.add_many(data)
+
+    def add_many(self, data: Iterable[dict]) -> 'HarvestColumnarRecordSet':
+        """
+        Bulk load records into the record set. Every column is extended once per call.
+
+        :param data: A list, generator, or other iterable of dictionaries. Nested lists and tuples are flattened.
+        """
+
+        batch = list(self._iter_dicts(data))
+
+        if not batch:
+            return self
+
+        start = self._length
+        length = len(batch)
+
+        # Keys which are new to the record set become columns which are missing for every existing row
+        for key in dict.fromkeys(key for record in batch for key in record):
+            if key not in self._columns:
+                self._columns[key] = [None] * start
+                self._missing[key] = bytearray(b'\x01') * start
+
+        for key, column in self._columns.items():
+            column.extend([record.get(key) for record in batch])
+            self._missing[key].extend([key not in record for record in batch])
+
+        self._length += length
+
+        # Rows added after a match was evaluated are considered matched, as they are in HarvestRecordSet
+        for bitmap in self._match_bitmaps():
+            bitmap.extend(b'\x01' * length)
+
+        for index in self.indexes.values():
+            index.insert_records(HarvestColumnarRow(self, position) for position in range(start, self._length))
+
+        return self
+
+    def _iter_dicts(self, data: Iterable) -> Iterable[dict]:
+        """
+        Yield dictionaries from an iterable of dictionaries or nested lists.
+
+        :param data: The iterable to flatten
+        """
+
+        for item in data:
+            if isinstance(item, dict):
+                yield item
+
+            elif isinstance(item, (list, tuple)):
+                yield from self._iter_dicts(item)
+
+    def add_match(self, syntax: List[str] or str, limit: int = None) -> 'HarvestColumnarRecordSet':
+        """
+        Add a match to the record set. The match is evaluated over the whole column of its key, or answered by an index
+        when one supports it. Each operand of an expression (see matching.HarvestCompiledExpression) is evaluated over
+        its column and the bitmaps are combined.
+
+        When a limit is provided, the rows after the row at which limit rows match every match are marked as not
+        matching in limit_bitmap, so the same rows match as with HarvestRecordSet.add_match(). Unlike HarvestRecordSet,
+        every row is still evaluated, since each match is evaluated over the whole column.
+
+        :param syntax: The match syntax or expression to add, or a list of them which are added in order
+        :param limit: The number of matching rows after which the remaining rows do not match, defaults to None
+        """
+
+        syntaxes = [syntax] if isinstance(syntax, str) else list(syntax)
+
+        for syntax in syntaxes:
+            compiled = compile_expression(syntax)
+            plan = self.explain_match(syntax)
+
+            if plan['path'] == 'index':
+                bitmap = bytearray(self._length)
+
+                for row in self.indexes[plan['index_name']].lookup(compiled):
+                    bitmap[row.position] = 1
+
+            else:
+                bitmap = self._evaluate(compiled)
+
+            self.match_expressions.append(compiled)
+            self.match_bitmaps.append(bitmap)
+            self.last_match_plan = plan
+
+        if limit is not None:
+            # The rows up to and including the limit-th matching row are kept
+            end = 0
+            if limit > 0:
+                matched = list(compress(range(self._length), self._matched_mask()))
+                end = matched[limit - 1] + 1 if len(matched) >= limit else self._length
+
+            if end < self._length:
+                limit_bitmap = bytearray(b'\x01') * end + bytearray(self._length - end)
+
+                if self.limit_bitmap is not None:
+                    limit_bitmap = bytearray(map(min, self.limit_bitmap, limit_bitmap))
+
+                self.limit_bitmap = limit_bitmap
+
+        return self
+
+    def _evaluate(self, compiled: HarvestCompiledMatch or HarvestCompiledExpression) -> bytearray:
+        """
+        Evaluates a compiled match over a column and returns a bitmap of the matching rows.
+
+        Columns which only contain strings, or only contain numbers when the literal is numeric, are compared with a
+        single operator applied across the column. Other columns are evaluated value by value with the same casting
+        rules as HarvestCompiledMatch.
+
+        :param compiled: The compiled match or expression
+        """
+
+        if isinstance(compiled, HarvestCompiledExpression):
+            if compiled.operator == 'NOT':
+                return self._evaluate(compiled.operands[0]).translate(_NEGATE)
+
+            # Each byte is 0 or 1, so the bitmaps are combined as integers, as in _matched_mask()
+            bitmaps = [int.from_bytes(self._evaluate(operand), 'little') for operand in compiled.operands]
+
+            mask = bitmaps[0]
+            for bitmap in bitmaps[1:]:
+                mask = mask & bitmap if compiled.operator == 'AND' else mask | bitmap
+
+            return bytearray(mask.to_bytes(self._length, 'little'))
+
+        # Flattened keys such as 'Tags.Name' are resolved against nested values, as HarvestCompiledMatch resolves them
+        column = self._key_values(compiled.key)
+
+        if column is None:
+            return bytearray([compiled.evaluate_value(None)]) * self._length
+
+        types = set(map(type, column))
+        operation = _MATCH_OPERATIONS[compiled.operator]
+
+        if types <= {str}:
+            if compiled.pattern is not None:
+                return bytearray(map(bool, map(compiled.pattern.search, column)))
+
+            if compiled.operator != '=':
+                return bytearray(map(operation, column, repeat(compiled.value)))
+
+        if compiled.operator != '=' and compiled.cast_as == 'float' and types <= {int, float}:
+            return bytearray(map(operation, map(float, column), repeat(compiled.cast_value)))
+
+        return bytearray(map(compiled.evaluate_value, column))
+
+    def _match_bitmaps(self) -> List[bytearray]:
+        """
+        Returns the match bitmaps and, when add_match() was given a limit, limit_bitmap.
+        """
+
+        return self.match_bitmaps if self.limit_bitmap is None else self.match_bitmaps + [self.limit_bitmap]
+
+    def _matched_mask(self) -> bytearray:
+        """
+        Returns a bitmap of the rows which match every match expression.
+        """
+
+        bitmaps = self._match_bitmaps()
+
+        if not bitmaps:
+            return bytearray(b'\x01') * self._length
+
+        # Each byte is 0 or 1, so a bitwise AND of the bitmaps as integers is a row-wise AND
+        mask = int.from_bytes(bitmaps[0], 'little')
+        for bitmap in bitmaps[1:]:
+            mask &= int.from_bytes(bitmap, 'little')
+
+        return bytearray(mask.to_bytes(self._length, 'little'))
+
+    def is_matched(self, position: int) -> bool:
+        """
+        Check whether a row satisfied every match added to the record set.
+
+        :param position: The position of the row
+        """
+
+        return all(bitmap[position] for bitmap in self._match_bitmaps())
+
+    def clear_matches(self) -> 'HarvestColumnarRecordSet':
+        """
+        Clear all matches from the record set.
+        """
+
+        self.match_expressions.clear()
+        self.match_bitmaps.clear()
+        self.limit_bitmap = None
+
+        return self
+
+    def explain_match(self, syntax: str) -> dict:
+        """
+        Describe how add_match() will evaluate a match syntax.
+
+        :param syntax: The match syntax
+        :return: A dictionary containing the syntax, the path ('index' or 'scan'), and the name of the index used, if any
+        """
+
+        compiled = compile_expression(syntax)
+
+        for index_name, index in self.indexes.items():
+            if index.supports(compiled):
+                return {'syntax': syntax, 'path': 'index', 'index_name': index_name}
+
+        return {'syntax': syntax, 'path': 'scan', 'index_name': None}
+
+    def get_matched_records(self) -> 'HarvestColumnarRecordSet':
+        """
+        Get all rows in the record set that are a match.
+
+        :return: A HarvestColumnarRecordSet containing the matched rows
+        """
+
+        result = HarvestColumnarRecordSet()
+        positions = list(compress(range(self._length), self._matched_mask()))
+
+        result._columns = {key: [column[position] for position in positions] for key, column in self._columns.items()}
+        result._missing = {key: bytearray(missing[position] for position in positions) for key, missing in self._missing.items()}
+        result._length = len(positions)
+
+        return result
+
+    def remove_unmatched_records(self) -> 'HarvestColumnarRecordSet':
+        """
+        Remove all rows in the record set that are not a match.
+        """
+
+        mask = self._matched_mask()
+
+        self._columns = {key: list(compress(column, mask)) for key, column in self._columns.items()}
+        self._missing = {key: bytearray(compress(missing, mask)) for key, missing in self._missing.items()}
+        self.match_bitmaps = [bytearray(compress(bitmap, mask)) for bitmap in self.match_bitmaps]
+        self.limit_bitmap = None
+        self._length = mask.count(1)
+
+        self.rebuild_indexes()
+
+        return self
+
+    def create_index(self, index_name: str, *fields, index_type: Literal['hash', 'sorted'] = 'hash') -> 'HarvestColumnarRecordSet':
+        """
+        Create an index for the record set.
+
+        :param index_name: The name of the index
+        :param fields: The fields to include in the index
+        :param index_type: 'hash' (the default) or 'sorted'; see HarvestRecordSet.create_index()
+        """
+
+        rows = [HarvestColumnarRow(self, position) for position in range(self._length)]
+
+        match index_type:
+            case 'hash':
+                index = HarvestIndex(*fields, records=rows)
+
+            case 'sorted':
+                index = HarvestSortedIndex(*fields, records=rows)
+
+            case _:
+                raise ValueError(f'Invalid index type: {index_type}')
+
+        self.indexes[index_name] = index
+        self.index_fields[index_name] = fields
+
+        return self
+
+    def drop_index(self, index_name: str) -> 'HarvestColumnarRecordSet':
+        """
+        Drop an index from the record set.
+
+        :param index_name: The name of the index to drop
+        """
+
+        self.indexes.pop(index_name)
+        self.index_fields.pop(index_name, None)
+
+        return self
+
+    def rebuild_indexes(self) -> 'HarvestColumnarRecordSet':
+        """
+        Rebuild all indexes for the record set.
+        """
+
+        index_types = {index_name: index.index_type for index_name, index in self.indexes.items()}
+
+        self.indexes.clear()
+        for index_name, fields in self.index_fields.items():
+            self.create_index(index_name, *fields, index_type=index_types.get(index_name, 'hash'))
+
+        return self
+
+    def unwind(self, source_key: str, preserve_null_and_empty_keys: bool = True) -> 'HarvestColumnarRecordSet':
+        """
+        Unwind a list in the record set into separate rows. The other columns are repeated by position rather than by
+        copying records.
+
+        :param source_key: The key of the list to unwind
+        :param preserve_null_and_empty_keys: Whether to preserve rows which do not contain the key, defaults to True
+        """
+
+        source_column = self._columns.get(source_key, [None] * self._length)
+        source_missing = self._missing.get(source_key, bytearray(b'\x01') * self._length)
+
+        positions = []
+        values = []
+        missing = bytearray()
+        for position, (value, is_missing) in enumerate(zip(source_column, source_missing)):
+            if is_missing:
+                if preserve_null_and_empty_keys:
+                    positions.append(position)
+                    values.append(None)
+                    missing.append(1)
+
+            elif isinstance(value, (list, tuple)):
+                positions.extend(repeat(position, len(value)))
+                values.extend(value)
+                missing.extend(bytes(len(value)))
+
+            else:
+                positions.append(position)
+                values.append(value)
+                missing.append(0)
+
+        self._columns = {key: [column[position] for position in positions] for key, column in self._columns.items()}
+        self._missing = {key: bytearray(mask[position] for position in positions) for key, mask in self._missing.items()}
+        self._columns[source_key] = values
+        self._missing[source_key] = missing
+        self.match_bitmaps = [bytearray(bitmap[position] for position in positions) for bitmap in self.match_bitmaps]
+        if self.limit_bitmap is not None:
+            self.limit_bitmap = bytearray(self.limit_bitmap[position] for position in positions)
+
+        self._length = len(positions)
+
+        self.rebuild_indexes()
+
+        return self
+
+    def to_dataframe(self):
+        """
+        Returns the record set as a pandas DataFrame with one column per key. Rows which do not contain a key have a value
+        of None. pandas is imported when this method is called.
+        """
+
+        from pandas import DataFrame
+
+        return DataFrame(self._columns)
+
+    def to_recordset(self):
+        """
+        Returns the record set as a HarvestRecordSet.
+        """
+
+        from .recordset import HarvestRecordSet
+
+        return HarvestRecordSet(name=self.name, data=iter(self))
@@ -0,0 +1,163 @@
+from hashlib import blake2b
+from json import JSONEncoder
+from typing import Any, Iterable, Iterator, List, Sequence
+
+# Records are encoded with sorted keys and no whitespace so that equal records always produce the same bytes. The C
+# encoder handles nesting and key order, so a normalized record is encoded in a single call.
+_encoder = JSONEncoder(sort_keys=True, separators=(',', ':'), default=lambda value: _encode_default(value))
+
+
+def fingerprint(record: dict, keys: Sequence[str] = None) -> bytes:
+    """
+    Returns a stable 128-bit fingerprint of a record's structure and values. Nested dictionaries, lists, and other values
+    are included, key order is ignored, and the fingerprint is the same in every process. Numbers which are equal, such
+    as 1, 1.0, and True, have the same fingerprint, while tuples and lists, and the string '1' and the number 1, do not.
+
+    Args:
+        record (dict): The record to fingerprint.
+        keys (Sequence[str], optional): When provided, only these keys are included. A missing key is treated as None.
+
+    Returns:
+        bytes: A 16-byte digest.
+    """
+
+    if keys is not None:
+        record = {key: record.get(key) for key in keys}
+
+    encoded = _encoder.encode(_normalize(record))
+
+    return blake2b(encoded.encode('utf-8', 'surrogatepass'), digest_size=16).digest()
+
+
+# Dictionary keys are encoded as strings tagged with their type: 's' followed by a string key, or 'v' followed by the
+# encoded value of any other key. Values which are not JSON types are encoded as a single-key dictionary whose key starts
+# with '#', which no tagged key does, so they cannot be confused with a dictionary of the record.
+_TAG_STR = 's'
+_TAG_VALUE = 'v'
+_TAG_TYPE = '#'
+
+
+def _encode_default(value: Any) -> dict:
+    """
+    Encodes values which are not JSON types. The type is included so that a value is not equal to its string form.
+    """
+
+    kind = type(value)
+
+    return {f'{_TAG_TYPE}{kind.__module__}.{kind.__qualname__}': repr(value)}
+
+
+def _normalize(value: Any) -> Any:
+    """
+    Converts a value into JSON types in which equal values are identical. Booleans and whole floats become integers, as
+    they compare equal to them, dictionary keys become strings tagged with their type, and tuples and sets are tagged
+    with their type so that they are not equal to lists.
+    """
+
+    kind = type(value)
+
+    # Strings and integers are the most common values and are already normalized
+    if kind is str or kind is int or value is None:
+        return value
+
+    if isinstance(value, dict):
+        return {_normalize_key(key): _normalize(item) for key, item in value.items()}
+
+    if isinstance(value, list):
+        return [_normalize(item) for item in value]
+
+    if isinstance(value, (bool, float)):
+        return _normalize_number(value)
+
+    if isinstance(value, tuple):
+        return {f'{_TAG_TYPE}tuple': [_normalize(item) for item in value]}
+
+    if isinstance(value, (set, frozenset)):
+        return {f'{_TAG_TYPE}set': sorted(_encoder.encode(_normalize(item)) for item in value)}
+
+    return value
+
+
+def _normalize_key(key: Any) -> str:
+    """
+    Returns a dictionary key as a string tagged with its type, so that keys such as 1 and '1' remain different.
+    """
+
+    if type(key) is str:
+        return _TAG_STR + key
+
+    return _TAG_VALUE + _encoder.encode(_normalize(key))
+
+
+def _normalize_number(value: Any) -> Any:
+    """
+    Returns booleans and whole floats as the integer they are equal to, and any other value unchanged.
+    """
+
+    if isinstance(value, bool) or (isinstance(value, float) and value.is_integer()):
+        return int(value)
+
+    return value
+
+
+class HarvestDeduplicator:
+    """
+    Tracks the fingerprints of the records it has seen so that later copies of a record can be discarded. The same
+    deduplicator can be used across several record sets or chunks of a stream to keep only the first copy of each record
+    overall.
+
+    Attributes:
+        keys (List[str]): When provided, records are compared on these keys only.
+
+    Methods:
+        is_duplicate(record) -> bool:
+            Returns True when a record with the same fingerprint was already seen, and remembers the record otherwise.
+
+        filter(records) -> Iterator[dict]:
+            Yields the first copy of each record, in order.
+    """
+
+    def __init__(self, keys: List[str] = None):
+        """
+        Constructs a new HarvestDeduplicator instance.
+
+        Args:
+            keys (List[str], optional): When provided, records are compared on these keys only. Defaults to None.
+        """
+
+        self.keys = keys
+        self._seen = set()
+
+    def __len__(self) -> int:
+        return len(self._seen)
+
+    def is_duplicate(self, record: dict) -> bool:
+        """
+        Returns True when a record with the same fingerprint was already seen, and remembers the record otherwise.
+
+        Args:
+            record (dict): The record to check.
+        """
+
+        key = fingerprint(record, self.keys)
+
+        if key in self._seen:
+            return True
+
+        self._seen.add(key)
+
+        return False
+
+    def filter(self, records: Iterable[dict]) -> Iterator[dict]:
+        """
+        Yields the first copy of each record, in order.
+
+        Args:
+            records (Iterable[dict]): The records to deduplicate.
+        """
+
+        is_duplicate = self.is_duplicate
+
+        for record in records:
+            if not is_duplicate(record):
+                yield record
@@ -0,0 +1,562 @@
+from collections.abc import Mapping
+from functools import lru_cache, partial
+from operator import methodcaller
+from typing import Any, Callable, Iterable, Iterator, List, Tuple
+
+# The number of flattened key paths a HarvestFlattener remembers before its layout is discarded and rediscovered. This
+# bounds the memory used by long-running processes which flatten records with unbounded keys, such as tag names.
+MAX_CACHED_PATHS = 100000
+
+# The number of flattened record shapes a HarvestFlattener remembers for unflattening
+MAX_CACHED_SHAPES = 1024
+
+# Values which are flattened into one key per item. Empty containers are kept as values.
+_CONTAINERS = (dict, list, tuple, set)
+
+_MISSING = object()
+
+
+class HarvestFlattener:
+    """
+    Flattens nested records into a single level of separator-joined keys and unflattens them again. The results are the
+    same as flatten_json.flatten() and flatten_json.unflatten_list(), except that unflattened keys keep their original
+    order rather than being sorted.
+
+    The layout of the records seen so far is cached, so records which share a shape, such as the records of a single API
+    response, are not examined from scratch:
+
+    - Flattening walks a tree of the key paths seen so far alongside the record, so each joined key string is formatted
+      once and shared by every flattened record, which also reduces their memory use.
+    - Unflattening remembers each flattened shape (the keys of a record, in order). The second time a shape is seen, it
+      is compiled into a list of steps which rebuild the nested record without splitting keys or searching for lists.
+
+    Attributes:
+        separator (str): The string placed between the keys of each level.
+        max_paths (int): The number of key paths remembered before the layout is discarded.
+        max_shapes (int): The number of flattened shapes remembered before they are discarded.
+
+    Methods:
+        flatten(record) -> dict:
+            Returns a flattened copy of a record.
+
+        flatten_record(record) -> dict:
+            Flattens a record in place.
+
+        unflatten(record) -> dict:
+            Returns an unflattened copy of a record.
+
+        unflatten_record(record) -> dict:
+            Unflattens a record in place.
+
+        clear():
+            Discards the cached layout.
+    """
+
+    def __init__(self, separator: str = '.', max_paths: int = MAX_CACHED_PATHS, max_shapes: int = MAX_CACHED_SHAPES):
+        """
+        Constructs a new HarvestFlattener instance.
+
+        Args:
+            separator (str, optional): The string placed between the keys of each level. Defaults to '.'.
+            max_paths (int, optional): The number of key paths remembered before the layout is discarded. Defaults to
+            MAX_CACHED_PATHS.
+            max_shapes (int, optional): The number of flattened shapes remembered before they are discarded. Defaults
+            to MAX_CACHED_SHAPES.
+        """
+
+        self.separator = separator
+        self.max_paths = max_paths
+        self.max_shapes = max_shapes
+
+        # {key: [path, {child key or index: [path, {...}]}]}
+        self._layout = {}
+        self._paths = 0
+
+        # {flattened key: (key, key, ...)}
+        self._parts = {}
+
+        # {(flattened key, ...): steps, or None when the shape has only been seen once}
+        self._shapes = {}
+
+    def __len__(self) -> int:
+        return self._paths
+
+    def clear(self) -> 'HarvestFlattener':
+        """
+        Discards the cached layout.
+        """
+
+        self._layout = {}
+        self._paths = 0
+        self._parts = {}
+        self._shapes = {}
+
+        return self
+
+    def flatten(self, record: dict) -> dict:
+        """
+        Returns a flattened copy of a record.
+
+        Args:
+            record (dict): The record to flatten.
+
+        Returns:
+            dict: A dictionary whose values are not dictionaries, lists, tuples, or sets, unless they are empty.
+        """
+
+        return self._flatten_items({}, record.items())
+
+    def flatten_record(self, record: dict) -> dict:
+        """
+        Flattens a record in place. The flattened keys are written straight into the record rather than into a copy
+        which is then copied back.
+
+        Args:
+            record (dict): The record to flatten.
+
+        Returns:
+            dict: The record.
+        """
+
+        items = list(record.items())
+        record.clear()
+
+        return self._flatten_items(record, items)
+
+    def _flatten_items(self, target: dict, items: Iterable[Tuple[Any, Any]]) -> dict:
+        """
+        Writes the flattened (key, value) items of a record into target.
+        """
+
+        if self._paths > self.max_paths:
+            self._layout = {}
+            self._paths = 0
+
+        layout = self._layout
+        flatten_value = self._flatten_value
+
+        for key, value in items:
+            if value and isinstance(value, _CONTAINERS):
+                entry = layout.get(key)
+
+                if entry is None:
+                    # Top level keys are kept as they are
+                    entry = layout[key] = [key, {}]
+                    self._paths += 1
+
+                flatten_value(target, entry, value)
+
+            else:
+                target[key] = value
+
+        return target
+
+    def _flatten_value(self, target: dict, entry: list, value: dict or list or tuple or set) -> None:
+        """
+        Writes every value nested below a non-empty container into target.
+        """
+
+        path, children = entry
+
+        for key, item in value.items() if isinstance(value, dict) else enumerate(value):
+            child = children.get(key)
+
+            if child is None:
+                child = children[key] = [f'{path}{self.separator}{key}', {}]
+                self._paths += 1
+
+            if item and isinstance(item, _CONTAINERS):
+                self._flatten_value(target, child, item)
+
+            else:
+                target[child[0]] = item
+
+    def iter_items(self, items: Iterable[Tuple[Any, Any]]) -> Iterator[Tuple[Any, Any]]:
+        """
+        Yields the flattened (key, value) pairs of a record's items one at a time, without building a flattened record.
+        This is the lazy form of flatten(), which writes the pairs directly instead for speed.
+
+        Args:
+            items (Iterable[Tuple[Any, Any]]): The top level (key, value) items of a record.
+        """
+
+        if self._paths > self.max_paths:
+            self._layout = {}
+            self._paths = 0
+
+        layout = self._layout
+        iter_value = self._iter_value
+
+        for key, value in items:
+            if value and isinstance(value, _CONTAINERS):
+                entry = layout.get(key)
+
+                if entry is None:
+                    # Top level keys are kept as they are
+                    entry = layout[key] = [key, {}]
+                    self._paths += 1
+
+                yield from iter_value(entry, value)
+
+            else:
+                yield key, value
+
+    def _iter_value(self, entry: list, value: dict or list or tuple or set) -> Iterator[Tuple[Any, Any]]:
+        """
+        Yields every value nested below a non-empty container.
+        """
+
+        path, children = entry
+
+        for key, item in value.items() if isinstance(value, dict) else enumerate(value):
+            child = children.get(key)
+
+            if child is None:
+                child = children[key] = [f'{path}{self.separator}{key}', {}]
+                self._paths += 1
+
+            if item and isinstance(item, _CONTAINERS):
+                yield from self._iter_value(child, item)
+
+            else:
+                yield child[0], item
+
+    def unflatten(self, record: dict) -> dict:
+        """
+        Returns an unflattened copy of a record. Keys are split on the separator and levels whose keys are '0' through
+        'n-1' become lists. When a key is both a value and a prefix of other keys, such as 'a' and 'a.b', the nested
+        keys are kept.
+
+        Args:
+            record (dict): The flattened record.
+
+        Returns:
+            dict: The nested record.
+        """
+
+        return self._unflatten_values({}, tuple(record), list(record.values()))
+
+    def unflatten_record(self, record: dict) -> dict:
+        """
+        Unflattens a record in place. See unflatten().
+
+        Args:
+            record (dict): The flattened record.
+
+        Returns:
+            dict: The record.
+        """
+
+        shape = tuple(record)
+        values = list(record.values())
+        record.clear()
+
+        return self._unflatten_values(record, shape, values)
+
+    def _unflatten_values(self, target: dict, shape: tuple, values: list) -> dict:
+        """
+        Writes the nested form of a flattened record, given as its keys and values, into target.
+        """
+
+        shapes = self._shapes
+        steps = shapes.get(shape)
+
+        if steps is None:
+            if shape not in shapes:
+                # Shapes which are only seen once, such as records with unique tag keys, are not worth compiling
+                if len(shapes) >= self.max_shapes:
+                    shapes.clear()
+
+                shapes[shape] = None
+
+                return self._unflatten_items(target, zip(shape, values))
+
+            steps = shapes[shape] = self._compile_shape(shape)
+
+        # Each step either creates a container or sets a value: (container, key, size of a new list, value position)
+        containers = [target]
+        for container, key, size, position in steps:
+            if position is None:
+                node = {} if size is None else [None] * size
+                containers[container][key] = node
+                containers.append(node)
+
+            else:
+                containers[container][key] = values[position]
+
+        return target
+
+    def _compile_shape(self, shape: tuple) -> List[tuple]:
+        """
+        Returns the steps which rebuild a nested record from the values of a flattened record with this shape. The steps
+        are found by unflattening the positions of the values.
+        """
+
+        structure = self._unflatten_items({}, ((key, _Position(position)) for position, key in enumerate(shape)))
+        steps = []
+        containers = 0
+
+        def compile_container(node: dict or list, container: int):
+            nonlocal containers
+
+            for key, value in node.items() if isinstance(node, dict) else enumerate(node):
+                if isinstance(value, _Position):
+                    steps.append((container, key, None, int(value)))
+
+                else:
+                    steps.append((container, key, len(value) if isinstance(value, list) else None, None))
+                    containers += 1
+                    compile_container(value, containers)
+
+        compile_container(structure, 0)
+
+        return steps
+
+    def _unflatten_items(self, target: dict, items: Iterable[Tuple[Any, Any]]) -> dict:
+        """
+        Writes the nested form of flattened (key, value) items into target.
+        """
+
+        if len(self._parts) > self.max_paths:
+            self._parts = {}
+
+        parts_cache = self._parts
+        separator = self.separator
+
+        for key, value in items:
+            parts = parts_cache.get(key)
+
+            if parts is None:
+                parts = parts_cache[key] = tuple(key.split(separator)) if isinstance(key, str) else (key, )
+
+            node = target
+            for part in parts[:-1]:
+                child = node.get(part)
+
+                if not isinstance(child, dict):
+                    child = node[part] = {}
+
+                node = child
+
+            if not isinstance(node.get(parts[-1]), dict):
+                node[parts[-1]] = value
+
+        for key, value in target.items():
+            if value and isinstance(value, dict):
+                target[key] = _dicts_to_lists(value)
+
+        return target
+
+
+class HarvestFlatView(Mapping):
+    """
+    A read-only flattened view of a nested record. Flattened keys such as 'Tags.0.Value' are resolved against the nested
+    record when they are read and the flattened keys are produced one at a time when the view is iterated, so the
+    flattened record is never built. The view reflects later changes to the record.
+
+    The keys and values of the view are those of HarvestFlattener.flatten(record). Keys which contain the separator are
+    only found at the top level of the record.
+
+    Attributes:
+        record (dict): The nested record.
+        separator (str): The string placed between the keys of each level.
+
+    Methods:
+        to_dict() -> dict:
+            Returns the flattened record.
+    """
+
+    __slots__ = ('record', 'separator')
+
+    def __init__(self, record: dict, separator: str = '.'):
+        """
+        Constructs a new HarvestFlatView instance.
+
+        Args:
+            record (dict): The nested record.
+            separator (str, optional): The string placed between the keys of each level. Defaults to '.'.
+        """
+
+        self.record = record
+        self.separator = separator
+
+    def __getitem__(self, key):
+        value = get_path(self.record, key, self.separator, _MISSING)
+
+        # Non-empty containers are not values of the flattened record
+        if value is _MISSING or (value and isinstance(value, _CONTAINERS)):
+            raise KeyError(key)
+
+        return value
+
+    def __iter__(self) -> Iterator:
+        return (key for key, value in self.items())
+
+    def __len__(self) -> int:
+        return sum(1 for item in self.items())
+
+    def __repr__(self) -> str:
+        return f'{self.__class__.__name__}({self.record!r})'
+
+    def items(self) -> Iterator[Tuple[Any, Any]]:
+        """
+        Yields the flattened (key, value) pairs of the record.
+        """
+
+        return get_flattener(self.separator).iter_items(self.record.items())
+
+    def values(self) -> Iterator[Any]:
+        """
+        Yields the flattened values of the record.
+        """
+
+        return (value for key, value in self.items())
+
+    def to_dict(self) -> dict:
+        """
+        Returns the flattened record.
+        """
+
+        return get_flattener(self.separator).flatten(self.record)
+
+
+class _Position(int):
+    """
+    The position of a value in a flattened record, which tells values apart from containers when a shape is compiled.
+    """
+
+
+def _dicts_to_lists(node: dict) -> dict or list:
+    """
+    Returns node as a list when its keys are '0' through 'n-1', after converting the dictionaries nested below it.
+    """
+
+    for key, value in node.items():
+        if value and isinstance(value, dict):
+            node[key] = _dicts_to_lists(value)
+
+    if '0' in node and all(str(index) in node for index in range(1, len(node))):
+        return [node[str(index)] for index in range(len(node))]
+
+    return node
+
+
+def get_path(record: dict, key: Any, separator: str = '.', default: Any = None) -> Any:
+    """
+    Returns the value of a key of a record. When the record does not have the key, a flattened key such as
+    'Tags.0.Value' is resolved against the nested record, so the same key can be read from flat and nested records.
+
+    Args:
+        record (dict): The record to read.
+        key (Any): A key of the record or a flattened key.
+        separator (str, optional): The string placed between the keys of each level. Defaults to '.'.
+        default (Any, optional): The value returned when the key is not found. Defaults to None.
+    """
+
+    value = record.get(key, _MISSING)
+
+    if value is not _MISSING:
+        return value
+
+    if not isinstance(key, str) or separator not in key:
+        return default
+
+    value = record
+    for part in _split_path(key, separator):
+        if isinstance(value, dict):
+            value = value.get(part, _MISSING)
+
+            if value is _MISSING:
+                return default
+
+        elif isinstance(value, (list, tuple, set)) and part.isdecimal():
+            index = int(part)
+
+            if index >= len(value):
+                return default
+
+            value = list(value)[index] if isinstance(value, set) else value[index]
+
+        else:
+            return default
+
+    return value
+
+
+@lru_cache(maxsize=4096)
+def _split_path(key: str, separator: str) -> Tuple[str, ...]:
+    """
+    Returns the parts of a flattened key.
+    """
+
+    return tuple(key.split(separator))
+
+
+def field_getter(field: Any, separator: str = '.') -> Callable[[dict], Any]:
+    """
+    Returns a function which reads a field of a record, returning None when the record does not have the field. Fields
+    which contain the separator are resolved against nested records with get_path().
+
+    Args:
+        field (Any): The field to read.
+        separator (str, optional): The string placed between the keys of each level. Defaults to '.'.
+    """
+
+    if isinstance(field, str) and separator in field:
+        return partial(get_path, key=field, separator=separator)
+
+    return methodcaller('get', field)
+
+
+def field_values(records: Iterable[dict], field: Any, separator: str = '.') -> list:
+    """
+    Returns the value of a field for each record, as field_getter() would read it, in a single pass. Reading a column of
+    values this way avoids calling a getter for each record when the field does not contain the separator.
+
+    Args:
+        records (Iterable[dict]): The records to read.
+        field (Any): The field to read.
+        separator (str, optional): The string placed between the keys of each level. Defaults to '.'.
+    """
+
+    if isinstance(field, str) and separator in field:
+        return list(map(partial(get_path, key=field, separator=separator), records))
+
+    return [record.get(field) for record in records]
+
+
+@lru_cache(maxsize=16)
+def get_flattener(separator: str = '.') -> HarvestFlattener:
+    """
+    Returns the HarvestFlattener shared by every record flattened with a separator, so that records flattened one at a
+    time still share a cached layout.
+
+    Args:
+        separator (str, optional): The string placed between the keys of each level. Defaults to '.'.
+    """
+
+    return HarvestFlattener(separator=separator)
+
+
+def flatten(record: dict, separator: str = '.') -> dict:
+    """
+    Returns a flattened copy of a record. See HarvestFlattener.
+
+    Args:
+        record (dict): The record to flatten.
+        separator (str, optional): The string placed between the keys of each level. Defaults to '.'.
+    """
+
+    return get_flattener(separator).flatten(record)
+
+
+def unflatten(record: dict, separator: str = '.') -> dict:
+    """
+    Returns an unflattened copy of a record. See HarvestFlattener.
+
+    Args:
+        record (dict): The flattened record.
+        separator (str, optional): The string placed between the keys of each level. Defaults to '.'.
+    """
+
+    return get_flattener(separator).unflatten(record)
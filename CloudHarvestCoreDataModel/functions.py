@@ -1,49 +1,101 @@
-from datetime import datetime
-from typing import Any, Dict, List, Literal
+from datetime import datetime, timezone
+from functools import lru_cache
+from re import ASCII, compile as re_compile
+from typing import Any, Dict, Iterable, List, Literal
 
 
-def cast(value: Any, typeof: Literal['bool', 'str', 'int', 'float', 'list', 'dict', 'datetime.fromtimestamp', 'datetime.fromisoformat'] or str) -> (bool, str, int, float, list, dict, datetime):
+def cast(value: Any, typeof: Literal['bool', 'str', 'int', 'float', 'list', 'dict', 'datetime', 'datetime.fromtimestamp', 'datetime.fromisoformat'] or str) -> (bool, str, int, float, list, dict, datetime):
     """
     Converts a value into a specific type based on a parameter which is a string representation of the desired type.
 
     Parameters:
     value (Any): The value to be converted.
-    typeof (Literal['bool', 'str', 'int', 'float', 'list', 'dict', 'datetime.fromtimestamp', 'datetime.fromisoformat']): The string representation of the target type.
+    typeof (Literal['bool', 'str', 'int', 'float', 'list', 'dict', 'datetime', 'datetime.fromtimestamp', 'datetime.fromisoformat']): The string representation of the target type.
+    'datetime' returns datetime values unchanged and parses strings with datetime.fromisoformat.
 
     Returns:
     Union[bool, str, int, float, list, dict, datetime]: The converted value or None if the conversion fails or if the target type is not supported.
     """
 
-    type_mapping = {
-        'int': int,
-        'float': float,
-        'str': str,
-        'bool': bool,
-        'list': list,
-        'dict': dict,
-        'datetime.fromtimestamp': datetime.fromtimestamp,
-        'datetime.fromisoformat': datetime.fromisoformat
-    }
-
-    if typeof in type_mapping:
-        try:
-            if typeof == 'bool':
-                if value in (False, None, 'False', 'false', 'No', 'no'):
-                    result = False
-                else:
-                    result = True
-            else:
-                result = type_mapping[typeof](value)
+    caster = _CASTERS.get(typeof)
 
-            return result
+    if caster is None:
+        return None
 
-        except ValueError:
-            return None
+    try:
+        return caster(value)
 
-    else:
+    except (TypeError, ValueError):
         return None
 
 
+def cast_many(values: Iterable[Any], typeof: Literal['bool', 'str', 'int', 'float', 'list', 'dict', 'datetime', 'datetime.fromtimestamp', 'datetime.fromisoformat'] or str) -> List[Any]:
+    """
+    Converts every value in a column of values into a specific type. The result is the same as calling cast() on each
+    value, but the conversion is looked up once and the whole column is converted in a single map() when every value
+    can be converted.
+
+    Parameters:
+    values (Iterable[Any]): The values to be converted.
+    typeof (str): The string representation of the target type. See cast().
+
+    Returns:
+    List[Any]: The converted values, with None for each value which could not be converted.
+    """
+
+    values = values if isinstance(values, (list, tuple)) else list(values)
+    caster = _CASTERS.get(typeof)
+
+    if caster is None:
+        return [None] * len(values)
+
+    try:
+        return list(map(caster, values))
+
+    except (TypeError, ValueError):
+        return [cast(value, typeof) for value in values]
+
+
+def _to_bool(value: Any) -> bool:
+    """
+    Returns False for false-like values and True for any other value.
+    """
+
+    try:
+        return value not in _FALSE_VALUES
+
+    except TypeError:
+        # Unhashable values such as lists are never false-like
+        return True
+
+
+def _to_datetime(value: Any) -> datetime:
+    """
+    Returns datetime values unchanged and parses any other value with datetime.fromisoformat().
+    """
+
+    if isinstance(value, datetime):
+        return value
+
+    return datetime.fromisoformat(value)
+
+
+_FALSE_VALUES = frozenset((False, None, 'False', 'false', 'No', 'no'))
+
+# Built once rather than on every call to cast()
+_CASTERS = {
+    'int': int,
+    'float': float,
+    'str': str,
+    'bool': _to_bool,
+    'list': list,
+    'dict': dict,
+    'datetime': _to_datetime,
+    'datetime.fromtimestamp': datetime.fromtimestamp,
+    'datetime.fromisoformat': datetime.fromisoformat
+}
+
+
 def fuzzy_cast(value: Any) -> Any:
     """
     Attempts to cast a value to a more appropriate type based on the value itself.
@@ -53,35 +105,17 @@ def fuzzy_cast(value: Any) -> Any:
     Returns: Any
     """
 
-    # Check if the value is a boolean
-    if is_bool(value):
-        cast_variables_as = 'bool'
-
-    # Check if the value is a datetime
-    elif is_datetime(value):
-        cast_variables_as = 'datetime'
+    cast_variables_as = infer_type(value)
 
-    # Check if the value is null
-    elif is_null(value):
-        cast_variables_as = 'null'
+    if cast_variables_as == 'number':
+        # If the value is a string and does not contain a decimal point or exponent, cast it as an integer
+        if isinstance(value, str) and not any(character in value for character in '.eE'):
+            cast_variables_as = 'int'
 
-    # Check if the value is a number
-    elif is_number(value):
-        # If the value is a string and contains a decimal point, cast it as a float
-        if isinstance(value, str):
-            if '.' in str(value):
-                cast_variables_as = 'float'
-            else:
-                # If the value is a string and does not contain a decimal point, cast it as an integer
-                cast_variables_as = 'int'
+        # Otherwise, cast it as a float
         else:
-            # If the value is not a string, cast it as a float
             cast_variables_as = 'float'
 
-    # If none of the above conditions are met, cast the value as a string
-    else:
-        cast_variables_as = 'str'
-
     # Use the cast() function to cast the value to the determined type
     return cast(value, cast_variables_as)
 
@@ -97,6 +131,81 @@ def delimiter_list_to_string(value: list, delimiter: str) -> str:
     return delimiter.join(value)
 
 
+def freshness(last_seen: datetime or None, now: datetime, fresh_range: int = 3600, aging_range: int = 43200) -> Literal['F', 'A', 'S', 'I']:
+    """
+    Returns the freshness code of a record based on the time since it was last seen.
+
+    Parameters:
+    last_seen (datetime): When the record was last seen, or None when the record is inactive. Naive datetimes are treated as UTC.
+    now (datetime): The timezone-aware time the age of the record is measured from.
+    fresh_range (int): Records seen within this many seconds are fresh.
+    aging_range (int): Records seen within this many seconds, but not within fresh_range, are aging. Older records are stale.
+
+    Returns:
+    str: 'F' (fresh), 'A' (aging), 'S' (stale), or 'I' (inactive) when last_seen is None.
+    """
+
+    if last_seen is None:
+        return 'I'
+
+    if last_seen.tzinfo is None:
+        last_seen = last_seen.replace(tzinfo=timezone.utc)
+
+    age = (now - last_seen).total_seconds()
+
+    if age <= fresh_range:
+        return 'F'
+
+    elif age <= aging_range:
+        return 'A'
+
+    return 'S'
+
+
+def infer_type(value: Any) -> Literal['bool', 'datetime', 'null', 'number', 'str']:
+    """
+    Determines the type a value represents, checking in order whether it is a boolean, a datetime, null, or a number.
+    The result for strings is cached because the same literals, such as the values of match syntaxes, are inferred
+    repeatedly.
+    :param value: The value to check.
+    :return: 'bool', 'datetime', 'null', 'number', or 'str'
+    """
+
+    if isinstance(value, str):
+        return _infer_str_type(value)
+
+    if is_bool(value):
+        return 'bool'
+
+    elif is_datetime(value):
+        return 'datetime'
+
+    elif is_null(value):
+        return 'null'
+
+    elif is_number(value):
+        return 'number'
+
+    return 'str'
+
+
+@lru_cache(maxsize=4096)
+def _infer_str_type(value: str) -> str:
+    if value in _BOOL_STRINGS:
+        return 'bool'
+
+    elif is_datetime(value):
+        return 'datetime'
+
+    elif value in _NULL_STRINGS:
+        return 'null'
+
+    elif is_number(value):
+        return 'number'
+
+    return 'str'
+
+
 def is_bool(value: str) -> bool:
     """
     Determines if a value is a boolean.
@@ -104,8 +213,10 @@ def is_bool(value: str) -> bool:
     :return: A boolean indicating if the value is a boolean.
     """
 
-    if value in ('False', 'false', 'No', 'no', 'True', 'true', 'Yes', 'yes'):
-        return True
+    if isinstance(value, str):
+        return value in _BOOL_STRINGS
+
+    return isinstance(value, bool)
 
 
 def is_datetime(value: str) -> bool:
@@ -114,6 +225,14 @@ def is_datetime(value: str) -> bool:
     :param value: The value to check.
     :return: A boolean indicating if the value is a datetime.
     """
+
+    if isinstance(value, datetime):
+        return True
+
+    # Only strings shaped like an ISO 8601 date are parsed, so most values are rejected without raising an exception
+    if not isinstance(value, str) or not _ISO_DATE.match(value):
+        return False
+
     try:
         datetime.fromisoformat(value)
         return True
@@ -128,22 +247,32 @@ def is_null(value: str) -> bool:
     :param value: The value to check.
     :return: A boolean indicating if the value is null.
     """
-    if value in (None, 'None', 'null'):
-        return True
+
+    return value is None or (isinstance(value, str) and value in _NULL_STRINGS)
 
 
 def is_number(value: str) -> bool:
     """
-    Determines if a value is a number.
+    Determines if a value is a number. Strings are numbers when they contain an integer or a decimal number.
     :param value: The value to check.
     :return: A boolean indicating if the value is a number.
     """
-    try:
-        int(value)
-        return True
 
-    except ValueError:
-        return False
+    if isinstance(value, str):
+        return _NUMBER.match(value) is not None
+
+    return isinstance(value, (int, float))
+
+
+_BOOL_STRINGS = frozenset(('False', 'false', 'No', 'no', 'True', 'true', 'Yes', 'yes'))
+_NULL_STRINGS = frozenset(('None', 'null'))
+
+# Strings which may be accepted by datetime.fromisoformat() start with a four digit year followed by a month or an ISO week
+_ISO_DATE = re_compile(r'\d{4}-?(\d{2}|W\d{2})')
+
+# Integers and decimal numbers, with optional surrounding whitespace, sign, and underscores between digits, matching
+# what int() and float() accept
+_NUMBER = re_compile(r'\s*[+-]?(\d(_?\d)*(\.(\d(_?\d)*)?)?|\.\d(_?\d)*)([eE][+-]?\d(_?\d)*)?\s*\Z', ASCII)
 
 
 def key_value_list_to_dict(value: List[Dict], key_name: str = 'Key', value_name: str = 'Value') -> dict:
@@ -0,0 +1,503 @@
+from typing import Dict, Iterable, List, Set
+from .flattening import field_getter
+
+
+class HarvestIndex(dict):
+    """
+    The HarvestIndex class is a hash index over one or more fields of a HarvestRecordSet. Each key is a tuple of field
+    values and each value is the list of records sharing those field values.
+
+    Indexes are maintained incrementally: records are inserted into or evicted from their buckets as the record set
+    changes, and records are only moved between buckets when an indexed field value changed.
+
+    Attributes:
+        fields (tuple): The fields which make up the index key.
+
+    Methods:
+        key(record) -> tuple:
+            Returns the index key of a record.
+
+        insert_records(records) -> HarvestIndex:
+            Adds records to their buckets.
+
+        evict_records(records) -> HarvestIndex:
+            Removes records from their buckets.
+
+        reindex_records(records) -> HarvestIndex:
+            Moves records whose indexed field values changed to their new buckets.
+
+        supports(compiled) -> bool:
+            Returns whether the index can answer a compiled match.
+
+        lookup(compiled) -> List[dict]:
+            Returns the records matching a compiled match using the index buckets.
+    """
+
+    index_type = 'hash'
+
+    def __init__(self, *fields, records: Iterable = None):
+        """
+        Constructs a new HarvestIndex instance.
+
+        Args:
+            *fields: The fields to include in the index.
+            records (Iterable, optional): Records to insert into the index. Defaults to None.
+        """
+
+        super().__init__()
+
+        self.fields = fields
+
+        # Flattened fields such as 'Tags.0.Value' are resolved against nested records
+        self._getters = tuple(field_getter(field) for field in fields)
+
+        # Maps id(record) to the key the record is currently bucketed under. This allows records to be evicted or
+        # re-bucketed even when their field values changed after they were inserted.
+        self._record_keys = {}
+
+        # Keys of single-field indexes whose value is not a string. String values can be looked up directly while
+        # other values are cast by the match before being compared, so they must be evaluated individually.
+        self._non_str_keys = set()
+
+        if records is not None:
+            self.insert_records(records)
+
+    def clear(self) -> None:
+        """
+        Removes all records from the index.
+        """
+
+        super().clear()
+        self._record_keys.clear()
+        self._non_str_keys.clear()
+
+    def key(self, record: dict) -> tuple:
+        """
+        Returns the index key of a record.
+
+        Args:
+            record (dict): The record to build a key for.
+
+        Returns:
+            tuple: The values of the indexed fields.
+        """
+
+        # Sometimes a dictionary may not have the associated field. In this case, we will use None as the value.
+        return tuple(get_value(record) for get_value in self._getters)
+
+    def insert_records(self, records: Iterable[dict]) -> 'HarvestIndex':
+        """
+        Adds records to their buckets.
+
+        Args:
+            records (Iterable[dict]): The records to insert.
+
+        Returns:
+            HarvestIndex: The current HarvestIndex instance.
+        """
+
+        record_keys = self._record_keys
+
+        for record in records:
+            key = self.key(record)
+            record_keys[id(record)] = key
+
+            bucket = self.get(key)
+            if bucket is None:
+                self[key] = [record]
+
+                if len(key) == 1 and type(key[0]) is not str:
+                    self._non_str_keys.add(key)
+
+            else:
+                bucket.append(record)
+
+        return self
+
+    def evict_records(self, records: Iterable[dict]) -> 'HarvestIndex':
+        """
+        Removes records from their buckets.
+
+        Args:
+            records (Iterable[dict]): The records to evict.
+
+        Returns:
+            HarvestIndex: The current HarvestIndex instance.
+        """
+
+        evictions = {}
+        for record in records:
+            key = self._record_keys.pop(id(record), None)
+
+            if key is not None:
+                evictions.setdefault(key, set()).add(id(record))
+
+        self._discard(evictions)
+
+        return self
+
+    def reindex_records(self, records: Iterable[dict]) -> 'HarvestIndex':
+        """
+        Moves records whose indexed field values changed to their new buckets. Records whose key did not change are
+        left untouched.
+
+        Args:
+            records (Iterable[dict]): The records which may have been modified.
+
+        Returns:
+            HarvestIndex: The current HarvestIndex instance.
+        """
+
+        moved = []
+        evictions = {}
+        for record in records:
+            old_key = self._record_keys.get(id(record))
+            new_key = self.key(record)
+
+            if old_key != new_key:
+                moved.append(record)
+
+                if old_key is not None:
+                    evictions.setdefault(old_key, set()).add(id(record))
+
+        self._discard(evictions)
+        self.insert_records(moved)
+
+        return self
+
+    def supports(self, compiled) -> bool:
+        """
+        Returns whether the index can answer a compiled match. Hash indexes answer equality matches on a single field.
+
+        Args:
+            compiled (HarvestCompiledMatch): The compiled match.
+
+        Returns:
+            bool: True if lookup() can be used for the compiled match, False otherwise.
+        """
+
+        return compiled.operator == '==' and self.fields == (compiled.key, )
+
+    def lookup(self, compiled) -> List[dict]:
+        """
+        Returns the records matching a compiled match using the index buckets. Records with string values are found
+        with a single hash lookup. Non-string values are cast by the match before being compared, and values of
+        different types may share a bucket (1, 1.0, and True hash alike), so each distinct type and value pair in those
+        buckets is evaluated once.
+
+        Args:
+            compiled (HarvestCompiledMatch): A compiled match for which supports() is True.
+
+        Returns:
+            List[dict]: The matching records.
+        """
+
+        result = list(self.get((compiled.value, ), ()))
+
+        get_value = self._getters[0]
+        evaluated = {}
+        for key in self._non_str_keys:
+            for record in self[key]:
+                value = get_value(record)
+                signature = (type(value), value)
+
+                if signature not in evaluated:
+                    evaluated[signature] = compiled.evaluate_value(value)
+
+                if evaluated[signature]:
+                    result.append(record)
+
+        return result
+
+    def _discard(self, evictions: Dict[tuple, Set[int]]) -> None:
+        """
+        Removes records from buckets, filtering each affected bucket once.
+
+        :param evictions: A dictionary of bucket keys to the ids of the records to remove from that bucket
+        """
+
+        for key, record_ids in evictions.items():
+            bucket = self.get(key)
+
+            if bucket is None:
+                continue
+
+            remaining = [record for record in bucket if id(record) not in record_ids]
+
+            if remaining:
+                self[key] = remaining
+
+            else:
+                self.pop(key)
+                self._non_str_keys.discard(key)
+
+
+class HarvestSortedIndex:
+    """
+    The HarvestSortedIndex class is an ordered index over a single field of a HarvestRecordSet. It answers range matches
+    ('<', '>', '<=', '>=') as well as '==' and '!=' in O(log n + k) using bisection over sorted keys.
+
+    Values are normalized with the same casting rules HarvestCompiledMatch uses. String values are kept in their own
+    sorted run since matches compare them as strings, numbers are kept as floats, and datetimes are kept in separate
+    runs for timezone aware and naive values because they cannot be compared with each other. Values which fit none of
+    these runs, or which do not fit the run a match needs, are evaluated individually.
+
+    Attributes:
+        fields (tuple): The field which makes up the index key.
+
+    Methods:
+        insert_records(records) -> HarvestSortedIndex:
+            Adds records to the index.
+
+        evict_records(records) -> HarvestSortedIndex:
+            Removes records from the index.
+
+        reindex_records(records) -> HarvestSortedIndex:
+            Moves records whose indexed field value changed to their new position.
+
+        supports(compiled) -> bool:
+            Returns whether the index can answer a compiled match.
+
+        lookup(compiled) -> List[dict]:
+            Returns the records matching a compiled match.
+    """
+
+    index_type = 'sorted'
+
+    def __init__(self, *fields, records: Iterable = None):
+        """
+        Constructs a new HarvestSortedIndex instance.
+
+        Args:
+            *fields: The field to include in the index. Sorted indexes accept exactly one field.
+            records (Iterable, optional): Records to insert into the index. Defaults to None.
+        """
+
+        if len(fields) != 1:
+            raise ValueError('Sorted indexes must be created on exactly one field.')
+
+        self.fields = fields
+        self._get_value = field_getter(fields[0])
+
+        # Maps each run name to a pair of parallel lists: the sorted keys and the records they belong to
+        self._runs = {}
+
+        # Records whose value does not belong to any run
+        self._unsorted = []
+
+        # Maps id(record) to the run the record is stored in and its key within that run
+        self._record_keys = {}
+
+        if records is not None:
+            self.insert_records(records)
+
+    def __len__(self) -> int:
+        return len(self._record_keys)
+
+    def clear(self) -> None:
+        """
+        Removes all records from the index.
+        """
+
+        self._runs.clear()
+        self._unsorted.clear()
+        self._record_keys.clear()
+
+    @staticmethod
+    def _run_key(value) -> tuple:
+        """
+        Returns the run a value belongs to and the key it is sorted by, or (None, None) if it cannot be sorted.
+
+        :param value: The record value
+        """
+
+        from datetime import datetime
+
+        if type(value) is str:
+            return 'str', value
+
+        if isinstance(value, (bool, int, float)):
+            # NaN cannot be ordered
+            if value == value:
+                return 'float', float(value)
+
+        elif isinstance(value, datetime):
+            return ('datetime' if value.utcoffset() is not None else 'datetime.naive'), value
+
+        return None, None
+
+    def insert_records(self, records: Iterable[dict]) -> 'HarvestSortedIndex':
+        """
+        Adds records to the index.
+
+        Args:
+            records (Iterable[dict]): The records to insert.
+
+        Returns:
+            HarvestSortedIndex: The current HarvestSortedIndex instance.
+        """
+
+        from bisect import bisect_right
+
+        get_value = self._get_value
+
+        batches = {}
+        for record in records:
+            run, key = self._run_key(get_value(record))
+            self._record_keys[id(record)] = (run, key)
+
+            if run is None:
+                self._unsorted.append(record)
+
+            else:
+                batches.setdefault(run, []).append((key, record))
+
+        for run, batch in batches.items():
+            keys, run_records = self._runs.setdefault(run, ([], []))
+
+            # Small batches are inserted in place while large batches are merged with a single sort
+            if len(batch) < 64:
+                for key, record in batch:
+                    position = bisect_right(keys, key)
+                    keys.insert(position, key)
+                    run_records.insert(position, record)
+
+            else:
+                merged = sorted(list(zip(keys, run_records)) + batch, key=lambda pair: pair[0])
+                keys[:] = [pair[0] for pair in merged]
+                run_records[:] = [pair[1] for pair in merged]
+
+        return self
+
+    def evict_records(self, records: Iterable[dict]) -> 'HarvestSortedIndex':
+        """
+        Removes records from the index.
+
+        Args:
+            records (Iterable[dict]): The records to evict.
+
+        Returns:
+            HarvestSortedIndex: The current HarvestSortedIndex instance.
+        """
+
+        evictions = {}
+        for record in records:
+            if id(record) in self._record_keys:
+                run, key = self._record_keys.pop(id(record))
+                evictions.setdefault(run, set()).add(id(record))
+
+        for run, record_ids in evictions.items():
+            if run is None:
+                self._unsorted[:] = [record for record in self._unsorted if id(record) not in record_ids]
+                continue
+
+            keys, run_records = self._runs[run]
+            remaining = [(key, record) for key, record in zip(keys, run_records) if id(record) not in record_ids]
+            keys[:] = [pair[0] for pair in remaining]
+            run_records[:] = [pair[1] for pair in remaining]
+
+        return self
+
+    def reindex_records(self, records: Iterable[dict]) -> 'HarvestSortedIndex':
+        """
+        Moves records whose indexed field value changed to their new position.
+
+        Args:
+            records (Iterable[dict]): The records which may have been modified.
+
+        Returns:
+            HarvestSortedIndex: The current HarvestSortedIndex instance.
+        """
+
+        get_value = self._get_value
+        moved = [
+            record for record in records
+            if self._record_keys.get(id(record)) != self._run_key(get_value(record))
+        ]
+
+        self.evict_records(moved)
+        self.insert_records(moved)
+
+        return self
+
+    def supports(self, compiled) -> bool:
+        """
+        Returns whether the index can answer a compiled match. Sorted indexes answer every operator except '='.
+
+        Args:
+            compiled (HarvestCompiledMatch): The compiled match.
+
+        Returns:
+            bool: True if lookup() can be used for the compiled match, False otherwise.
+        """
+
+        return compiled.operator != '=' and self.fields == (compiled.key, )
+
+    def lookup(self, compiled) -> List[dict]:
+        """
+        Returns the records matching a compiled match.
+
+        String values are compared with the literal value as strings, and values in the run matching the type the
+        literal was cast to are compared with the cast literal. Both are resolved by bisection. Every other value is
+        evaluated individually.
+
+        Args:
+            compiled (HarvestCompiledMatch): A compiled match for which supports() is True.
+
+        Returns:
+            List[dict]: The matching records.
+        """
+
+        match compiled.cast_as:
+            case 'float':
+                cast_run = 'float'
+
+            case 'datetime':
+                cast_run = 'datetime' if compiled.cast_value.utcoffset() is not None else 'datetime.naive'
+
+            case _:
+                cast_run = None
+
+        result = []
+        for run, (keys, run_records) in self._runs.items():
+            if run == 'str':
+                result.extend(self._range(keys, run_records, compiled.operator, compiled.value))
+
+            elif run == cast_run:
+                result.extend(self._range(keys, run_records, compiled.operator, compiled.cast_value))
+
+            else:
+                result.extend(record for record in run_records if compiled.evaluate(record))
+
+        result.extend(record for record in self._unsorted if compiled.evaluate(record))
+
+        return result
+
+    @staticmethod
+    def _range(keys: list, run_records: list, operator: str, value) -> list:
+        """
+        Returns the records of a run whose keys satisfy an operator against a value.
+        """
+
+        from bisect import bisect_left, bisect_right
+
+        match operator:
+            case '>':
+                return run_records[bisect_right(keys, value):]
+
+            case '>=' | '=>':
+                return run_records[bisect_left(keys, value):]
+
+            case '<':
+                return run_records[:bisect_left(keys, value)]
+
+            case '<=' | '=<':
+                return run_records[:bisect_right(keys, value)]
+
+            case '==':
+                return run_records[bisect_left(keys, value):bisect_right(keys, value)]
+
+            case '!=':
+                return run_records[:bisect_left(keys, value)] + run_records[bisect_right(keys, value):]
+
+        raise ValueError(f'Sorted indexes do not support the {operator} operator.')
@@ -1,7 +1,11 @@
 import operator
 from collections import OrderedDict
-from re import findall
-from typing import List
+from functools import lru_cache
+from itertools import compress
+from re import compile as re_compile, error as re_error, findall, IGNORECASE
+from typing import Any, Iterable, List, Tuple
+from .flattening import field_getter
+from .functions import cast, infer_type
 
 # The order of _MATCH_OPERATIONS's keys is important. The keys should be ordered from longest to shortest to ensure that
 # the longest match is attempted first. For example, '==' should be before '=' to ensure that '==' is matched
@@ -20,12 +24,813 @@ _MATCH_OPERATIONS = {
     }
 
 
+class HarvestCompiledMatch:
+    """
+    The HarvestCompiledMatch class is a matching syntax which has been parsed once so that it can be evaluated against
+    many records. The operator, key, and literal value are extracted when the instance is created, and the type the
+    literal should be cast to when it is compared with a non-string record value is inferred and applied ahead of time.
+
+    Instances should be obtained through compile_match(), which caches them by syntax.
+
+    Attributes:
+        syntax (str): The matching syntax.
+        operator (str): The operator used by the matching syntax.
+        key (str): The record key the syntax is matched against.
+        value (str): The literal value of the syntax.
+        cast_as (str): The type the literal and non-string record values are cast to before being compared.
+        cast_value (Any): The literal value cast to cast_as.
+        pattern (re.Pattern): For the '=' operator, the literal compiled as a case-insensitive regular expression.
+        get_value (Callable): Reads the match key from a record. Flattened keys such as 'Tags.0.Value' are resolved
+        against nested records (see flattening.get_path()).
+
+    Methods:
+        compare(record) -> tuple:
+            Performs the matching operation and returns the result along with the compared values.
+
+        compare_value(record_key_value) -> tuple:
+            Same as compare() for the value of the match key rather than a whole record.
+
+        evaluate(record) -> bool:
+            Performs the matching operation and returns whether the record is a match.
+
+        evaluate_value(record_key_value) -> bool:
+            Same as evaluate() for the value of the match key rather than a whole record.
+
+        evaluate_records(records, statistics) -> bytearray:
+            Returns a bitmap of the records which are a match.
+    """
+
+    __slots__ = ('syntax', 'operator', 'key', 'value', 'cast_as', 'cast_value', 'pattern', 'get_value', '_operation')
+
+    def __init__(self, syntax: str):
+        """
+        Constructs a new HarvestCompiledMatch instance.
+
+        Args:
+            syntax (str): The matching syntax to be compiled.
+        """
+
+        self.syntax = syntax
+        self.operator = get_operator_key(syntax)
+        self.key, self.value = syntax.split(self.operator, maxsplit=1)
+        self.get_value = field_getter(self.key)
+
+        # Numbers are compared as floats; every other inferred type is also the name of its cast
+        inferred = infer_type(self.value)
+        self.cast_as = 'float' if inferred == 'number' else inferred
+
+        self.cast_value = cast(self.value, self.cast_as)
+        self._operation = _MATCH_OPERATIONS[self.operator]
+
+        # Invalid patterns are left uncompiled so that the error is raised when a record is matched, as with findall()
+        self.pattern = None
+        if self.operator == '=':
+            try:
+                self.pattern = compile_pattern(self.value)
+
+            except re_error:
+                pass
+
+    def __repr__(self) -> str:
+        return f'{self.__class__.__name__}({self.syntax!r})'
+
+    def compare(self, record: dict) -> Tuple[Any, Any, Any]:
+        """
+        Performs the matching operation and returns the result along with the compared values.
+
+        Args:
+            record (dict): The record to be matched.
+
+        Returns:
+            tuple: The result of the matching operation, the (cast) record value, and the (cast) matching value.
+        """
+
+        return self.compare_value(self.get_value(record))
+
+    def compare_value(self, record_key_value: Any) -> Tuple[Any, Any, Any]:
+        """
+        Performs the matching operation against a record value and returns the result along with the compared values.
+
+        Args:
+            record_key_value (Any): The value of the match key in a record.
+
+        Returns:
+            tuple: The result of the matching operation, the (cast) record value, and the (cast) matching value.
+        """
+
+        # Values are only cast when the record value is not a string, since the literal value is always a string
+        if type(record_key_value) is str:
+            matching_value = self.value
+
+        else:
+            matching_value = self.cast_value
+            record_key_value = cast(record_key_value, self.cast_as)
+
+        # Values which cannot be compared, such as a missing key against a number, are not a match
+        try:
+            if self.operator == '=':
+                if self.pattern is not None and matching_value is self.value:
+                    result = self.pattern.findall(record_key_value)
+
+                else:
+                    result = findall(pattern=matching_value, string=record_key_value, flags=IGNORECASE)
+
+            else:
+                result = self._operation(record_key_value, matching_value)
+
+        except TypeError:
+            result = [] if self.operator == '=' else False
+
+        return result, record_key_value, matching_value
+
+    def evaluate(self, record: dict) -> bool:
+        """
+        Performs the matching operation and returns whether the record is a match.
+
+        Args:
+            record (dict): The record to be matched.
+
+        Returns:
+            bool: True if the record is a match, False otherwise.
+        """
+
+        return self.evaluate_value(self.get_value(record))
+
+    def evaluate_value(self, record_key_value: Any) -> bool:
+        """
+        Performs the matching operation against a record value and returns whether it is a match.
+
+        Args:
+            record_key_value (Any): The value of the match key in a record.
+
+        Returns:
+            bool: True if the value is a match, False otherwise.
+        """
+
+        # Contains matches stop at the first occurrence of the pattern rather than finding every occurrence
+        if self.pattern is not None:
+            if type(record_key_value) is not str:
+                # Non-string values are compared with the cast literal, which is only a pattern when cast as a string
+                if self.cast_as != 'str':
+                    return False
+
+                record_key_value = cast(record_key_value, 'str')
+
+            return self.pattern.search(record_key_value) is not None
+
+        return bool(self.compare_value(record_key_value)[0])
+
+    def evaluate_records(self, records: List[dict], statistics: 'HarvestMatchStatistics' = None) -> bytearray:
+        """
+        Returns a bitmap of the records which are a match, where 1 marks a matching record.
+
+        Args:
+            records (List[dict]): The records to be matched.
+            statistics (HarvestMatchStatistics, optional): Unused. Accepted so that matches and expressions are
+                evaluated alike.
+        """
+
+        return bytearray(map(self.evaluate, records))
+
+
+@lru_cache(maxsize=1024)
+def compile_match(syntax: str) -> HarvestCompiledMatch:
+    """
+    Returns a HarvestCompiledMatch for a matching syntax. Compiled matches are cached so that repeated syntaxes are only
+    parsed once.
+
+    Args:
+        syntax (str): The matching syntax to be compiled.
+
+    Returns:
+        HarvestCompiledMatch: The compiled matching syntax.
+    """
+
+    return HarvestCompiledMatch(syntax)
+
+
+@lru_cache(maxsize=1024)
+def compile_pattern(pattern: str):
+    """
+    Returns a pattern for the '=' (contains) operator compiled as a case-insensitive regular expression. Compiled
+    patterns are cached so that each pattern is only compiled once across expressions.
+
+    Args:
+        pattern (str): The regular expression.
+
+    Returns:
+        re.Pattern: The compiled pattern.
+    """
+
+    return re_compile(pattern, IGNORECASE)
+
+
+def get_operator_key(syntax: str) -> str:
+    """
+    Retrieves the operator key from a matching syntax.
+
+    Args:
+        syntax (str): The matching syntax.
+
+    Returns:
+        str: The operator key.
+
+    Raises:
+        ValueError: If no valid operator is found in the syntax.
+    """
+
+    for op in _MATCH_OPERATIONS.keys():
+        if op in syntax:
+            return op
+
+    raise ValueError('No valid operator found in syntax. Valid operators are: ' + ', '.join(_MATCH_OPERATIONS.keys()))
+
+
+# The estimated share of records which satisfy an operator, used until a syntax has been evaluated by a match
+# statistics collector. Equality is assumed to be selective and inequality to let most records through.
+_DEFAULT_SELECTIVITY = {
+    '==': 0.1,
+    '!=': 0.9,
+    '>=': 0.5,
+    '=>': 0.5,
+    '<=': 0.5,
+    '=<': 0.5,
+    '>': 0.5,
+    '<': 0.5,
+    '=': 0.25
+}
+
+
+def estimate_cost(match: 'HarvestCompiledMatch or HarvestCompiledExpression',
+                  statistics: 'HarvestMatchStatistics' = None) -> float:
+    """
+    Estimates the relative cost of evaluating a compiled match against a record. Comparisons of top-level keys with a
+    string literal cost 1. Contains matches, which search a regular expression, literals which are cast before they are
+    compared, and flattened keys, which are resolved level by level, cost more. The cost of an expression is the
+    expected cost of the operands it evaluates before it short-circuits.
+
+    Args:
+        match (HarvestCompiledMatch or HarvestCompiledExpression): The compiled match or expression.
+        statistics (HarvestMatchStatistics, optional): The statistics which give the selectivity of the operands of an
+            expression. Defaults to the default selectivity of their operators.
+
+    Returns:
+        float: The estimated cost.
+    """
+
+    if isinstance(match, HarvestCompiledExpression):
+        return match.estimate_cost(statistics)
+
+    cost = 1.0
+
+    if match.operator == '=':
+        # Invalid patterns are compiled again for every record
+        cost += 0.5 if match.pattern is not None else 2
+
+    if match.cast_as != 'str':
+        cost += 0.25
+
+    if '.' in match.key:
+        cost += 1
+
+    return cost
+
+
+class HarvestMatchStatistics:
+    """
+    The HarvestMatchStatistics class collects the selectivity of each match syntax, the share of the records evaluated
+    against it which matched, and orders matches so that the cheapest and most selective are evaluated first. When
+    matches are combined with AND and each record stops at the first match it fails, evaluating matches by ascending
+    cost / (1 - selectivity) minimizes the expected cost per record.
+
+    Syntaxes which have not been evaluated yet use a default selectivity for their operator. The selectivity of a syntax
+    is averaged with the latest run, so the order follows changes in the data of repeated queries. Each
+    HarvestRecordSet and HarvestMatchSet keeps its own statistics, which may be shared by assigning the same instance.
+
+    Attributes:
+        max_syntaxes (int): The number of syntaxes kept. The statistics are discarded once there are more.
+
+    Methods:
+        order(matches) -> list:
+            Returns the matches in the order they should be evaluated.
+
+        rank(match) -> float:
+            Returns the expected cost of a match per record it removes.
+
+        record(match, evaluated, matched) -> None:
+            Records the result of evaluating a match against a number of records.
+
+        selectivity(match) -> float:
+            Returns the share of records expected to satisfy a match.
+    """
+
+    def __init__(self, max_syntaxes: int = 1024):
+        """
+        Constructs a new HarvestMatchStatistics instance.
+
+        Args:
+            max_syntaxes (int, optional): The number of syntaxes kept. Defaults to 1024.
+        """
+
+        self.max_syntaxes = max_syntaxes
+        self._selectivity = {}
+
+    def __len__(self) -> int:
+        return len(self._selectivity)
+
+    def clear(self) -> None:
+        """
+        Discards the collected statistics.
+        """
+
+        self._selectivity.clear()
+
+    def order(self, matches: list, operator: str = 'AND') -> list:
+        """
+        Returns the matches in the order they should be evaluated. Matches with the same rank keep their order.
+
+        Args:
+            matches (list): The compiled matches or expressions.
+            operator (str, optional): 'AND' when a record stops at the first match it fails, or 'OR' when a record stops
+                at the first match it satisfies. Defaults to 'AND'.
+        """
+
+        return sorted(matches, key=lambda match: self.rank(match, operator))
+
+    def rank(self, match: HarvestCompiledMatch or 'HarvestCompiledExpression', operator: str = 'AND') -> float:
+        """
+        Returns the expected cost of a match per record it decides: the records it removes when combined with AND, or
+        the records it accepts when combined with OR. Matches with a lower rank are evaluated first.
+
+        Args:
+            match (HarvestCompiledMatch or HarvestCompiledExpression): The compiled match or expression.
+            operator (str, optional): 'AND' or 'OR'. Defaults to 'AND'.
+        """
+
+        selectivity = self.selectivity(match)
+
+        return estimate_cost(match, self) / max(1 - selectivity if operator == 'AND' else selectivity, 0.01)
+
+    def record(self, match: HarvestCompiledMatch or 'HarvestCompiledExpression', evaluated: int, matched: int) -> None:
+        """
+        Records the result of evaluating a match against a number of records.
+
+        Args:
+            match (HarvestCompiledMatch or HarvestCompiledExpression): The compiled match or expression.
+            evaluated (int): The number of records evaluated.
+            matched (int): The number of records which matched.
+        """
+
+        if not evaluated:
+            return
+
+        observed = matched / evaluated
+        previous = self._selectivity.get(match.syntax)
+
+        if previous is None and len(self._selectivity) >= self.max_syntaxes:
+            self._selectivity.clear()
+
+        self._selectivity[match.syntax] = observed if previous is None else (previous + observed) / 2
+
+    def selectivity(self, match: HarvestCompiledMatch or 'HarvestCompiledExpression') -> float:
+        """
+        Returns the share of records expected to satisfy a match. Expressions which have not been evaluated yet are
+        estimated from the selectivity of their operands.
+
+        Args:
+            match (HarvestCompiledMatch or HarvestCompiledExpression): The compiled match or expression.
+        """
+
+        selectivity = self._selectivity.get(match.syntax)
+
+        if selectivity is not None:
+            return selectivity
+
+        if isinstance(match, HarvestCompiledExpression):
+            return match.estimate_selectivity(self)
+
+        return _DEFAULT_SELECTIVITY[match.operator]
+
+
+# Never records results, so it orders matches by their estimated cost and the default selectivity of their operators
+_DEFAULT_STATISTICS = HarvestMatchStatistics()
+
+
+# Splits an expression on AND and OR keywords, which are upper case and surrounded by whitespace
+_EXPRESSION_KEYWORDS = re_compile(r'\s+(AND|OR)\s+')
+
+# Swaps the 0 and 1 bytes of a bitmap
+_NEGATE = bytes.maketrans(b'\x00\x01', b'\x01\x00')
+
+# The operators of MongoDB's query language which combine other queries. Every other operator starting with '$' is an
+# aggregation expression, which must be wrapped in $expr when it is combined with a query.
+_MONGO_QUERY_OPERATORS = ('$and', '$expr', '$nor', '$or')
+
+
+class HarvestCompiledExpression:
+    """
+    The HarvestCompiledExpression class is a boolean expression of matching syntaxes, such as
+    'State==running OR State==stopped' or 'NOT (Name=web AND Size>8)', which has been parsed once so that it can be
+    evaluated against many records in a single pass.
+
+    Operands are combined with AND, OR, and NOT, and grouped with parentheses. AND binds more tightly than OR. AND and
+    OR are only keywords when they are upper case and surrounded by whitespace, and NOT when it is upper case and
+    followed by whitespace or a parenthesis. A syntax is only parsed as an expression when it starts with a parenthesis
+    or when every part between the keywords is a matching syntax; otherwise, such as for 'Name==Salt AND Pepper', it is
+    a single matching syntax whose value contains the keyword.
+
+    Operands are evaluated cheapest first and, for AND, most selective first or, for OR, least selective first. Each
+    record stops at the first operand which decides the result. evaluate_records() orders the operands by the
+    HarvestMatchStatistics it is given, when it is given one, and records their selectivity in it; otherwise operands
+    are ordered by their estimated cost and the default selectivity of their operators. An OR of equality matches on the
+    same key, such as 'State==running OR State==stopped', reads the key once and looks string values up in the set of
+    literals.
+
+    Instances should be obtained through compile_expression(), which caches them by syntax, and are never modified
+    after they are constructed, so they may be shared by record sets and threads.
+
+    Attributes:
+        syntax (str): The expression, with its operands written in a normalized form.
+        operator (str): 'AND', 'OR', or 'NOT'.
+        operands (list): The HarvestCompiledMatch and HarvestCompiledExpression operands. NOT has a single operand.
+        key (None): Expressions have no single key, so indexes never answer them.
+        value (None): Expressions have no single literal value.
+
+    Methods:
+        as_mongo_match() -> dict:
+            Converts the expression into a MongoDB query for a $match stage.
+
+        compare(record) -> tuple:
+            Evaluates the expression and returns the result along with the record and the expression.
+
+        estimate_cost(statistics) -> float:
+            Returns the expected cost of evaluating the expression against a record.
+
+        estimate_selectivity(statistics) -> float:
+            Returns the share of records expected to satisfy the expression.
+
+        evaluate(record) -> bool:
+            Returns whether the record satisfies the expression.
+
+        evaluate_records(records, statistics) -> bytearray:
+            Returns a bitmap of the records which satisfy the expression.
+    """
+
+    __slots__ = ('syntax', 'operator', 'operands', 'key', 'value', '_order', '_members')
+
+    def __init__(self, operator: str, operands: list):
+        """
+        Constructs a new HarvestCompiledExpression instance.
+
+        Args:
+            operator (str): 'AND', 'OR', or 'NOT'.
+            operands (list): The compiled matches and expressions to combine.
+        """
+
+        if operator not in ('AND', 'OR', 'NOT'):
+            raise ValueError(f'Invalid expression operator: {operator}. Expected one of AND, OR, NOT')
+
+        if not operands or (operator == 'NOT' and len(operands) != 1):
+            raise ValueError(f'Invalid number of operands for {operator}: {len(operands)}')
+
+        self.operator = operator
+        self.operands = list(operands)
+        self.key = None
+        self.value = None
+
+        # Operands which are themselves AND or OR expressions are written in parentheses
+        syntaxes = [f'({operand.syntax})' if isinstance(operand, HarvestCompiledExpression)
+                    and operand.operator != 'NOT' else operand.syntax for operand in self.operands]
+
+        self.syntax = f'NOT {syntaxes[0]}' if operator == 'NOT' else f' {operator} '.join(syntaxes)
+        self._order = self.operands if operator == 'NOT' else _DEFAULT_STATISTICS.order(self.operands, operator)
+
+        # String values are equal to one of the literals exactly when they are in the set of literals
+        self._members = None
+        if operator == 'OR' and all(isinstance(operand, HarvestCompiledMatch) and operand.operator == '=='
+                                    and operand.key == self.operands[0].key for operand in self.operands):
+            self._members = frozenset(operand.value for operand in self.operands)
+
+    def __repr__(self) -> str:
+        return f'{self.__class__.__name__}({self.syntax!r})'
+
+    def as_mongo_match(self) -> dict:
+        """
+        Converts the expression into a MongoDB query for a $match stage. AND, OR, and NOT become $and, $or, and $nor,
+        and operands which HarvestMatch converts into aggregation expressions, such as '=' and '!=', are wrapped in
+        $expr.
+
+        Returns:
+            dict: A dictionary representing the MongoDB query.
+        """
+
+        operands = []
+        for operand in self.operands:
+            query = operand.as_mongo_match() if isinstance(operand, HarvestCompiledExpression) \
+                else HarvestMatch(syntax=operand).as_mongo_match()
+
+            operator = next(iter(query))
+            if operator.startswith('$') and operator not in _MONGO_QUERY_OPERATORS:
+                query = {'$expr': query}
+
+            operands.append(query)
+
+        return {{'AND': '$and', 'OR': '$or', 'NOT': '$nor'}[self.operator]: operands}
+
+    def compare(self, record: dict) -> Tuple[bool, dict, str]:
+        """
+        Evaluates the expression and returns the result along with the record and the expression, in the same form as
+        HarvestCompiledMatch.compare().
+
+        Args:
+            record (dict): The record to be matched.
+        """
+
+        return self.evaluate(record), record, self.syntax
+
+    def estimate_cost(self, statistics: HarvestMatchStatistics = None) -> float:
+        """
+        Returns the expected cost of evaluating the expression against a record: the cost of each operand, weighted by
+        the share of records which reach it.
+
+        Args:
+            statistics (HarvestMatchStatistics, optional): The statistics which give the selectivity of the operands.
+                Defaults to the default selectivity of their operators.
+        """
+
+        if self._members is not None:
+            return estimate_cost(self.operands[0])
+
+        statistics = _DEFAULT_STATISTICS if statistics is None else statistics
+
+        cost = 0.0
+        reached = 1.0
+        for operand in self._operand_order(statistics):
+            cost += reached * estimate_cost(operand, statistics)
+
+            selectivity = statistics.selectivity(operand)
+            reached *= selectivity if self.operator == 'AND' else 1 - selectivity
+
+        return cost
+
+    def estimate_selectivity(self, statistics: HarvestMatchStatistics = None) -> float:
+        """
+        Returns the share of records expected to satisfy the expression, assuming its operands are independent.
+
+        Args:
+            statistics (HarvestMatchStatistics, optional): The statistics which give the selectivity of the operands.
+                Defaults to the default selectivity of their operators.
+        """
+
+        statistics = _DEFAULT_STATISTICS if statistics is None else statistics
+        selectivities = [statistics.selectivity(operand) for operand in self.operands]
+
+        if self.operator == 'NOT':
+            return 1 - selectivities[0]
+
+        result = 1.0
+        for selectivity in selectivities:
+            result *= selectivity if self.operator == 'AND' else 1 - selectivity
+
+        return result if self.operator == 'AND' else 1 - result
+
+    def evaluate(self, record: dict) -> bool:
+        """
+        Returns whether the record satisfies the expression.
+
+        Args:
+            record (dict): The record to be matched.
+        """
+
+        if self.operator == 'NOT':
+            return not self.operands[0].evaluate(record)
+
+        if self._members is not None:
+            return self._evaluate_member(self.operands[0].get_value(record))
+
+        if self.operator == 'AND':
+            for operand in self._order:
+                if not operand.evaluate(record):
+                    return False
+
+            return True
+
+        for operand in self._order:
+            if operand.evaluate(record):
+                return True
+
+        return False
+
+    def _operand_order(self, statistics: HarvestMatchStatistics) -> list:
+        """
+        Returns the operands in the order they should be evaluated according to the statistics.
+        """
+
+        if self.operator == 'NOT' or statistics is _DEFAULT_STATISTICS:
+            return self._order
+
+        return statistics.order(self.operands, self.operator)
+
+    def _evaluate_member(self, record_key_value: Any) -> bool:
+        """
+        Returns whether the value of the key shared by the operands of an OR of equality matches satisfies one of them.
+        """
+
+        if type(record_key_value) is str:
+            return record_key_value in self._members
+
+        # Other values are cast by each operand before they are compared
+        for operand in self.operands:
+            if operand.evaluate_value(record_key_value):
+                return True
+
+        return False
+
+    def evaluate_records(self, records: List[dict], statistics: HarvestMatchStatistics = None) -> bytearray:
+        """
+        Returns a bitmap of the records which satisfy the expression, where 1 marks a matching record. Each operand is
+        evaluated against the records which the operands before it did not decide, in the order given by the statistics,
+        and the share of those records which matched is recorded in the statistics.
+
+        Args:
+            records (List[dict]): The records to be matched.
+            statistics (HarvestMatchStatistics, optional): The statistics which order the operands and record their
+                selectivity. Defaults to ordering the operands by their estimated cost without recording anything.
+        """
+
+        if self.operator == 'NOT':
+            return self.operands[0].evaluate_records(records, statistics).translate(_NEGATE)
+
+        if self._members is not None:
+            values = list(map(self.operands[0].get_value, records))
+
+            if set(map(type, values)) <= {str}:
+                return bytearray(map(self._members.__contains__, values))
+
+            return bytearray(map(self._evaluate_member, values))
+
+        # AND decides a record when an operand fails, OR when an operand matches
+        decided = 0 if self.operator == 'AND' else 1
+        result = bytearray([1 - decided]) * len(records)
+        positions = range(len(records))
+
+        for operand in self._operand_order(_DEFAULT_STATISTICS if statistics is None else statistics):
+            if not records:
+                break
+
+            evaluated = operand.evaluate_records(records, statistics)
+            if statistics is not None:
+                statistics.record(operand, len(records), evaluated.count(1))
+
+            undecided = evaluated if decided == 0 else evaluated.translate(_NEGATE)
+            if len(records) == len(result):
+                result = bytearray(evaluated)
+
+            else:
+                for position in compress(positions, undecided.translate(_NEGATE)):
+                    result[position] = decided
+
+            positions = list(compress(positions, undecided))
+            records = list(compress(records, undecided))
+
+        return result
+
+
+@lru_cache(maxsize=1024)
+def compile_expression(syntax: str) -> HarvestCompiledMatch or HarvestCompiledExpression:
+    """
+    Returns a HarvestCompiledExpression for a boolean expression of matching syntaxes, or a HarvestCompiledMatch when
+    the syntax is a single matching syntax. Compiled expressions are cached so that repeated syntaxes are only parsed
+    once.
+
+    Args:
+        syntax (str): The expression to be compiled.
+
+    Returns:
+        HarvestCompiledMatch or HarvestCompiledExpression: The compiled expression.
+
+    Raises:
+        ValueError: When the expression is not valid, such as when its parentheses are not balanced.
+    """
+
+    tokens = _tokenize_expression(syntax)
+
+    if len(tokens) == 1:
+        return tokens[0]
+
+    position = 0
+
+    def next_token():
+        nonlocal position
+        position += 1
+
+        return tokens[position - 1] if position <= len(tokens) else None
+
+    def parse(operator: str):
+        # OR operands are AND expressions, and AND operands are NOT expressions, groups, or matching syntaxes
+        operands = [parse('AND') if operator == 'OR' else parse_operand()]
+
+        while position < len(tokens) and tokens[position] == operator:
+            next_token()
+            operands.append(parse('AND') if operator == 'OR' else parse_operand())
+
+        return operands[0] if len(operands) == 1 else HarvestCompiledExpression(operator, operands)
+
+    def parse_operand():
+        token = next_token()
+
+        if token == 'NOT':
+            return HarvestCompiledExpression('NOT', [parse_operand()])
+
+        if token == '(':
+            result = parse('OR')
+
+            if next_token() != ')':
+                raise ValueError(f'Unbalanced parentheses in match expression: {syntax}')
+
+            return result
+
+        if isinstance(token, HarvestCompiledMatch):
+            return token
+
+        raise ValueError(f'Unexpected {token or "end of expression"} in match expression: {syntax}')
+
+    result = parse('OR')
+
+    if position != len(tokens):
+        raise ValueError(f'Unexpected {tokens[position]} in match expression: {syntax}')
+
+    return result
+
+
+def _tokenize_expression(syntax: str) -> list:
+    """
+    Splits an expression into the keywords AND, OR, and NOT, parentheses, and the matching syntaxes between them,
+    compiled with compile_match(). A syntax which is not an expression is returned as its only token, unchanged.
+
+    A syntax is only an expression when it starts with a parenthesis or when every part between the keywords is a
+    matching syntax, so that values which contain the keywords, such as 'Name==Salt AND Pepper', are still matched as a
+    single syntax.
+    """
+
+    # re.split() puts the keywords captured by the pattern at odd positions
+    pieces = _EXPRESSION_KEYWORDS.split(syntax)
+    explicit = syntax.lstrip().startswith('(')
+
+    if len(pieces) == 1 and not explicit and not syntax.lstrip().startswith(('NOT ', 'NOT(')):
+        return [compile_match(syntax)]
+
+    tokens = []
+    for piece_position, piece in enumerate(pieces):
+        if piece_position % 2:
+            tokens.append(piece)
+            continue
+
+        piece = piece.strip()
+
+        while True:
+            if piece.startswith('('):
+                tokens.append('(')
+                piece = piece[1:].lstrip()
+
+            elif piece.startswith('NOT') and piece[3:4] in (' ', '\t', '('):
+                tokens.append('NOT')
+                piece = piece[3:].lstrip()
+
+            else:
+                break
+
+        # A syntax with more closing than opening parentheses ends with the parentheses closing its groups, since
+        # parentheses which are part of a syntax, such as in a regular expression, are balanced
+        closing = 0
+        while piece.endswith(')') and piece.count(')') > piece.count('('):
+            closing += 1
+            piece = piece[:-1].rstrip()
+
+        try:
+            if not piece:
+                raise ValueError(f'Missing matching syntax in match expression: {syntax}')
+
+            tokens.append(compile_match(piece))
+
+        except ValueError:
+            if explicit:
+                raise
+
+            return [compile_match(syntax)]
+
+        tokens.extend(')' * closing)
+
+    return tokens
+
+
 class HarvestMatch:
     """
     The HarvestMatch class is used to perform matching operations on a record based on a provided syntax.
 
     Attributes:
         syntax (str): The matching syntax to be used.
+        compiled (HarvestCompiledMatch): The compiled matching syntax.
         key (str): The key to be used in the matching operation.
         value (str): The value to be used in the matching operation.
         operator (str): The operator to be used in the matching operation.
@@ -43,21 +848,24 @@ class HarvestMatch:
             Retrieves the operator key from the matching syntax.
     """
 
-    def __init__(self, syntax: str, record: OrderedDict = None):
+    def __init__(self, syntax: str or HarvestCompiledMatch or HarvestCompiledExpression, record: OrderedDict = None):
         """
         Constructs a new HarvestMatch instance.
 
         Args:
-            syntax (str): The matching syntax to be used.
+            syntax (str or HarvestCompiledMatch or HarvestCompiledExpression): The matching syntax or expression to be
+                used, either as a string or already compiled.
             record (OrderedDict, optional): The record to be matched. Defaults to an empty dictionary.
         """
 
         self._record = record or {}
-        self.syntax = syntax
+        self.compiled = syntax if isinstance(syntax, (HarvestCompiledMatch, HarvestCompiledExpression)) \
+            else compile_expression(syntax)
+        self.syntax = self.compiled.syntax
         self.key = None
         self.value = None
 
-        self.operator = self.get_operator_key()
+        self.operator = self.compiled.operator
         self.final_match_operation = None
         self.is_match = None
 
@@ -69,8 +877,11 @@ class HarvestMatch:
             dict: A dictionary representing the MongoDB match operation.
         """
 
+        if isinstance(self.compiled, HarvestCompiledExpression):
+            return self.compiled.as_mongo_match()
+
         if self.key is None and self.value is None:
-            self.key, self.value = self.syntax.split(self.operator, maxsplit=1)
+            self.key, self.value = self.compiled.key, self.compiled.value
 
             # strip whitespace from the key, value, and operator
             for v in ['key', 'value', 'operator']:
@@ -167,41 +978,15 @@ class HarvestMatch:
             bool: The result of the matching operation.
         """
 
-        self.key, self.value = self.syntax.split(self.operator, maxsplit=1)
+        self.key, self.value = self.compiled.key, self.compiled.value
 
-        from .functions import is_bool, is_datetime, is_null, is_number
-        matching_value = self.value
-        record_key_value = self._record.get(self.key)
-
-        # convert types if they do not match
-        if type(matching_value) is not type(record_key_value):
-            if is_bool(matching_value):
-                cast_variables_as = 'bool'
-
-            elif is_datetime(matching_value):
-                cast_variables_as = 'datetime'
-
-            elif is_null(matching_value):
-                cast_variables_as = 'null'
-
-            elif is_number(matching_value):
-                cast_variables_as = 'float'
-
-            else:
-                cast_variables_as = 'str'
+        result, record_key_value, matching_value = self.compiled.compare(self._record)
 
-            from .functions import cast
-            matching_value = cast(matching_value, cast_variables_as)
-            record_key_value = cast(record_key_value, cast_variables_as)
-
-        from re import findall, IGNORECASE
-        if self.operator == '=':
-            result = findall(pattern=matching_value, string=record_key_value, flags=IGNORECASE)
+        if isinstance(self.compiled, HarvestCompiledExpression):
+            self.final_match_operation = self.syntax
 
         else:
-            result = _MATCH_OPERATIONS[self.operator](record_key_value, matching_value)
-
-        self.final_match_operation = f'{record_key_value}{self.operator}{matching_value}'
+            self.final_match_operation = f'{record_key_value}{self.operator}{matching_value}'
 
         self.is_match = result
 
@@ -218,11 +1003,7 @@ class HarvestMatch:
             ValueError: If no valid operator is found in the syntax.
         """
 
-        for op in _MATCH_OPERATIONS.keys():
-            if op in self.syntax:
-                return op
-
-        raise ValueError('No valid operator found in syntax. Valid operators are: ' + ', '.join(_MATCH_OPERATIONS.keys()))
+        return get_operator_key(self.syntax)
 
 
 class HarvestMatchSet(list):
@@ -230,28 +1011,43 @@ class HarvestMatchSet(list):
     The HarvestMatchSet class is a list of HarvestMatch instances. It is used to perform matching operations on a record
     based on a list of provided syntaxes.
 
+    Records are evaluated against the syntaxes in the order given by a HarvestMatchStatistics, cheapest and most
+    selective first, and each record stops at the first syntax it does not match. filter() collects the selectivity of
+    each syntax, which orders the syntaxes of later match sets given the same statistics.
+
     Attributes:
         matches (List[HarvestMatch]): The list of HarvestMatch instances.
+        statistics (HarvestMatchStatistics): The statistics which order the syntaxes.
 
     Methods:
         as_mongo_match() -> dict:
             Converts the matching operations of all HarvestMatch instances into MongoDB match operations.
+
+        evaluate(record) -> bool:
+            Returns whether a record satisfies every matching syntax in the set.
+
+        filter(records) -> list:
+            Returns the records which satisfy every matching syntax in the set.
     """
 
-    def __init__(self, matches: List[str], record: OrderedDict = None):
+    def __init__(self, matches: List[str], record: OrderedDict = None, statistics: HarvestMatchStatistics = None):
         """
         Constructs a new HarvestMatchSet instance.
 
         Args:
-            matches (List[str]): The list of matching syntaxes to be used.
+            matches (List[str]): The list of matching syntaxes or expressions (see HarvestCompiledExpression).
             record (OrderedDict, optional): The record to be matched. Defaults to an empty dictionary.
+            statistics (HarvestMatchStatistics, optional): The statistics which order the syntaxes. Defaults to new
+                statistics, which order the syntaxes by their estimated cost.
         """
 
         super().__init__()
 
         self._record = record
 
-        self.matches = [HarvestMatch(record=record, syntax=match) for match in matches]
+        self.matches = [HarvestMatch(record=record, syntax=compile_expression(match)) for match in matches]
+        self.statistics = HarvestMatchStatistics() if statistics is None else statistics
+        self._evaluation_order = self.statistics.order([match.compiled for match in self.matches])
 
     def as_mongo_match(self) -> dict:
         """
@@ -265,9 +1061,17 @@ class HarvestMatchSet(list):
         expr = {'$expr': {'$and': []}}
         non_expr = {}
 
+        queries = []
+
         for match in self.matches:
             match_syntax = match.as_mongo_match()
-            if list(match_syntax.keys())[0].startswith('$'):
+            operator = list(match_syntax.keys())[0]
+
+            # Expressions are combined queries, such as $or, which are kept apart from the aggregation expressions
+            if operator in _MONGO_QUERY_OPERATORS:
+                queries.append(match_syntax)
+
+            elif operator.startswith('$'):
                 expr['$expr']['$and'].append(match_syntax)
 
             else:
@@ -279,4 +1083,53 @@ class HarvestMatchSet(list):
         if non_expr:
             result.update(non_expr)
 
+        if queries:
+            result['$and'] = queries
+
         return result
+
+    def evaluate(self, record: dict = None) -> bool:
+        """
+        Returns whether a record satisfies every matching syntax in the set. The compiled matches are evaluated directly,
+        so the set can be reused for many records.
+
+        Args:
+            record (dict, optional): The record to be matched. Defaults to the record provided to the constructor.
+
+        Returns:
+            bool: True if every matching syntax is a match, False otherwise.
+        """
+
+        record = self._record if record is None else record
+
+        for match in self._evaluation_order:
+            if not match.evaluate(record):
+                return False
+
+        return True
+
+    def filter(self, records: Iterable[dict]) -> List[dict]:
+        """
+        Returns the records which satisfy every matching syntax in the set, in their original order. Each syntax is
+        evaluated against the records which matched the syntaxes before it, and the share of those records which matched
+        is recorded in the statistics.
+
+        Args:
+            records (Iterable[dict]): The records to be matched.
+
+        Returns:
+            List[dict]: The records which satisfy every matching syntax.
+        """
+
+        records = list(records)
+
+        for match in self._evaluation_order:
+            if not records:
+                break
+
+            evaluated = len(records)
+            records = list(compress(records, match.evaluate_records(records, self.statistics)))
+
+            self.statistics.record(match, evaluated, len(records))
+
+        return records
@@ -0,0 +1,489 @@
+from operator import methodcaller
+from typing import Iterable, Iterator, List, Literal, Tuple
+
+from .matching import HarvestMatchStatistics
+from .record import HarvestRecord
+from .recordset import HarvestRecordSet
+
+# Record functions which change state that is not sent to worker processes, such as the match results of a record
+LOCAL_RECORD_FUNCTIONS = ('clear_matches', 'match', 'reset_matches')
+
+# Record set functions which give the same results when applied to each chunk of a stream. Every other record set
+# function is a pipeline breaker: it needs the whole record set, so the stream is collected before it runs.
+STREAMING_RECORDSET_FUNCTIONS = ('add_freshness', 'add_match', 'clear_matches', 'modify_records', 'remove_duplicates',
+                                 'remove_unmatched_records', 'unwind')
+
+# Record set functions which apply the HarvestRecord function of the same name to each record. They are planned as
+# record stages, so they are fused with the record stages around them instead of acting as barriers.
+RECORD_WISE_RECORDSET_FUNCTIONS = ('flatten', 'unflatten')
+
+
+class HarvestRecordSetPipeline:
+    """
+    Applies a list of stages to a record set. Consecutive HarvestRecord stages are fused into a single pass which applies
+    the whole chain to each record before moving on to the next record. HarvestRecordSet stages are barriers: every
+    record-level stage before them completes before they run. When a HarvestRecordSet stage returns a new record set,
+    such as group_by, the stages after it are applied to the new record set. A run of add_match stages is added at once,
+    so its syntaxes are evaluated cheapest and most selective first (see merge_matches()), and a run followed by
+    remove_unmatched_records and limit stops evaluating records once enough records match (see push_down_limits()).
+
+    When workers is greater than one, record sets larger than chunk_size are partitioned into chunks and each fused
+    chain of record stages is applied to the chunks in a process pool. The results are written back to the original
+    records in order, so the record set, its match bitmaps, and its indexes keep referring to the same records.
+
+    stream() applies the stages to an iterable of records chunk_size records at a time, so only one chunk is held in
+    memory until the first pipeline breaker (see STREAMING_RECORDSET_FUNCTIONS). The stream is collected into a single
+    record set before a pipeline breaker runs.
+
+    Attributes:
+        stages (List[dict]): A list of dictionaries containing the function name and arguments of each stage.
+        plan (List[Tuple[str, List[Tuple[str, dict]]]]): The stages grouped by plan_stages() and rewritten by
+            push_down_limits() and merge_matches().
+        position (int): The number of stages started by run().
+        workers (int): The number of worker processes used for record stages. None or 1 runs them in this process.
+        chunk_size (int): The number of records sent to a worker process at a time, and the number of records in each
+            chunk of a stream.
+
+    Methods:
+        run(recordset): Applies the stages to the record set.
+        stream(records): Applies the stages to an iterable of records one chunk at a time and yields the results.
+    """
+
+    def __init__(self, stages: List[dict], workers: int = None, chunk_size: int = 10000):
+        """
+        Constructs a new HarvestRecordSetPipeline instance.
+
+        Args:
+            stages (List[dict]): A list of dictionaries containing the function name and arguments of each stage.
+            workers (int, optional): The number of worker processes used for record stages. Defaults to None, which
+                runs every stage in this process.
+            chunk_size (int, optional): The number of records sent to a worker process at a time, and the number of
+                records in each chunk of a stream. Defaults to 10000.
+        """
+
+        if chunk_size < 1:
+            raise ValueError('chunk_size must be greater than zero')
+
+        self.stages = stages
+        self.plan = merge_matches(push_down_limits(plan_stages(stages)))
+        self.position = 0
+        self.workers = workers
+        self.chunk_size = chunk_size
+
+    def run(self, recordset: HarvestRecordSet) -> HarvestRecordSet:
+        """
+        Applies the stages to the record set.
+
+        Args:
+            recordset (HarvestRecordSet): The record set to modify.
+
+        Returns:
+            HarvestRecordSet: The record set, or the record set produced by the last stage which returned a new one.
+        """
+
+        return self._run(recordset, self.plan)
+
+    def stream(self, records: Iterable[dict or HarvestRecord]) -> Iterator[HarvestRecord]:
+        """
+        Applies the stages to an iterable of records chunk_size records at a time and yields the resulting records.
+        Stages before the first pipeline breaker are applied to each chunk as it is read. When the plan contains a
+        pipeline breaker, every chunk is collected into a single record set before the breaker and the stages after it
+        run.
+
+        Args:
+            records (Iterable[dict or HarvestRecord]): The records to modify, such as a generator or a HarvestRecordSet.
+
+        Yields:
+            HarvestRecord: The resulting records, in order.
+        """
+
+        streamed, remaining = split_plan(self.plan)
+        streamed = _stream_plan(streamed)
+        start = self.position
+
+        # The chunks share their match statistics, so each chunk orders its matches by the results of the earlier chunks
+        statistics = HarvestMatchStatistics()
+
+        def new_chunk(chunk: list) -> HarvestRecordSet:
+            recordset = HarvestRecordSet(data=chunk)
+            recordset.match_statistics = statistics
+
+            return recordset
+
+        chunks = map(new_chunk, iter_chunks(records, self.chunk_size))
+
+        if not remaining:
+            for chunk in chunks:
+                self.position = start
+                yield from self._run(chunk, streamed)
+
+            return
+
+        recordset = concatenate_recordsets([self._run(chunk, streamed) for chunk in chunks])
+
+        self.position = start + sum(len(functions) for target, functions in streamed)
+        yield from self._run(recordset, remaining)
+
+    def _run(self, recordset: HarvestRecordSet, plan: list) -> HarvestRecordSet:
+        """
+        Applies the stages of a plan to the record set.
+        """
+
+        executor = None
+
+        try:
+            for target, functions in plan:
+                # Record the position of stages started
+                self.position += len(functions)
+
+                if target == 'recordset':
+                    function, arguments = functions[0]
+                    result = getattr(recordset, function)(**arguments)
+
+                    # Stages which produce a new record set, such as group_by, hand it to the stages after them
+                    if isinstance(result, HarvestRecordSet):
+                        recordset = result
+
+                elif target == 'matches':
+                    # Consecutive matches are added at once, and stop once enough records match when followed by limit
+                    syntaxes = []
+                    for function, arguments in functions:
+                        syntax = arguments['syntax']
+                        syntaxes.extend([syntax] if isinstance(syntax, str) else syntax)
+
+                    recordset.add_match(syntax=syntaxes, limit=functions[0][1].get('limit'))
+
+                elif self._is_parallel(recordset, functions):
+                    # The pool is started once and reused by every record stage chain in the plan
+                    if executor is None:
+                        from concurrent.futures import ProcessPoolExecutor
+                        from gc import freeze
+
+                        # Forked workers inherit the record set; freezing it keeps the garbage collector from scanning it
+                        executor = ProcessPoolExecutor(max_workers=self.workers, initializer=freeze)
+
+                    apply_record_stages_parallel(recordset, functions, executor, self.chunk_size)
+
+                else:
+                    apply_record_stages(recordset, functions)
+
+        finally:
+            if executor is not None:
+                executor.shutdown()
+
+        return recordset
+
+    def _is_parallel(self, recordset: HarvestRecordSet, functions: List[Tuple[str, dict]]) -> bool:
+        """
+        Returns True when a chain of record stages should be applied in worker processes.
+        """
+
+        return bool(self.workers and self.workers > 1
+                    and len(recordset) > self.chunk_size
+                    and not any(function in LOCAL_RECORD_FUNCTIONS for function, arguments in functions))
+
+
+def apply_record_stages(recordset: HarvestRecordSet, functions: List[Tuple[str, dict]]) -> HarvestRecordSet:
+    """
+    Applies a chain of HarvestRecord functions to each record in a single pass over the record set.
+
+    Args:
+        recordset (HarvestRecordSet): The record set to modify.
+        functions (List[Tuple[str, dict]]): The function names and arguments, in the order they are applied.
+
+    Returns:
+        HarvestRecordSet: The record set.
+    """
+
+    callers = [methodcaller(function, **arguments) for function, arguments in functions]
+
+    if len(callers) == 1:
+        caller = callers[0]
+        for record in recordset:
+            caller(record)
+
+    else:
+        for record in recordset:
+            for caller in callers:
+                caller(record)
+
+    # Indexes and the key catalog are updated for the modified records
+    return recordset.records_modified()
+
+
+def apply_record_stages_parallel(recordset: HarvestRecordSet,
+                                 functions: List[Tuple[str, dict]],
+                                 executor,
+                                 chunk_size: int) -> HarvestRecordSet:
+    """
+    Applies a chain of HarvestRecord functions to each record by sending chunks of records to worker processes. The
+    results replace the contents of the original records in order, then indexes and the key catalog are updated once.
+
+    Args:
+        recordset (HarvestRecordSet): The record set to modify.
+        functions (List[Tuple[str, dict]]): The function names and arguments, in the order they are applied.
+        executor (concurrent.futures.Executor): The pool the chunks are sent to.
+        chunk_size (int): The number of records sent to a worker process at a time.
+
+    Returns:
+        HarvestRecordSet: The record set.
+    """
+
+    from itertools import repeat
+
+    # Records are sent as plain dictionaries, which pickle much faster than HarvestRecord and leave the record set behind
+    chunks = (
+        [(dict(record), record.is_flat) for record in recordset[start:start + chunk_size]]
+        for start in range(0, len(recordset), chunk_size)
+    )
+
+    results = executor.map(_apply_record_stages_to_chunk, repeat(functions), chunks)
+
+    records = iter(recordset)
+    for chunk in results:
+        for (data, is_flat), record in zip(chunk, records):
+            record.clear()
+            record.update(data)
+            record.is_flat = is_flat
+
+    return recordset.records_modified()
+
+
+def _apply_record_stages_to_chunk(functions: List[Tuple[str, dict]], chunk: List[Tuple[dict, bool]]) -> List[Tuple[dict, bool]]:
+    """
+    Applies a chain of HarvestRecord functions to a chunk of (data, is_flat) tuples in a worker process.
+    """
+
+    callers = [methodcaller(function, **arguments) for function, arguments in functions]
+
+    results = []
+    for data, is_flat in chunk:
+        record = HarvestRecord(is_flat=is_flat)
+        record.update(data)
+
+        for caller in callers:
+            caller(record)
+
+        results.append((dict(record), record.is_flat))
+
+    return results
+
+
+def concatenate_recordsets(recordsets: List[HarvestRecordSet]) -> HarvestRecordSet:
+    """
+    Combines the record sets produced from the chunks of a stream into a single record set. Each chunk went through the
+    same stages, so the match bitmaps of the chunks are concatenated under the same match expressions.
+
+    Args:
+        recordsets (List[HarvestRecordSet]): The record sets to combine, in order.
+
+    Returns:
+        HarvestRecordSet: A new record set containing every record.
+    """
+
+    result = HarvestRecordSet()
+    result.add_many(record for recordset in recordsets for record in recordset)
+
+    if recordsets and recordsets[0].match_expressions:
+        result.match_expressions = list(recordsets[0].match_expressions)
+        result.match_bitmaps = [
+            bytearray(b''.join(recordset.match_bitmaps[i] for recordset in recordsets))
+            for i in range(len(result.match_expressions))
+        ]
+
+    if any(recordset.limit_bitmap is not None for recordset in recordsets):
+        result.limit_bitmap = bytearray(b''.join(bytearray(b'\x01') * len(recordset) if recordset.limit_bitmap is None
+                                                 else recordset.limit_bitmap for recordset in recordsets))
+
+    return result
+
+
+def iter_chunks(records: Iterable, chunk_size: int) -> Iterator[list]:
+    """
+    Yields lists of up to chunk_size records read from an iterable.
+
+    Args:
+        records (Iterable): The records to read.
+        chunk_size (int): The maximum number of records in each list.
+    """
+
+    from itertools import islice
+
+    iterator = iter(records)
+    while chunk := list(islice(iterator, chunk_size)):
+        yield chunk
+
+
+def _stream_plan(plan: list) -> list:
+    """
+    Returns a copy of a plan in which each remove_duplicates stage shares one deduplicator across every chunk of the
+    stream, so only the first copy of a record in the whole stream is kept, and each add_freshness stage measures every
+    chunk from the same reference time.
+    """
+
+    from datetime import datetime, timezone
+    from .deduplication import HarvestDeduplicator
+
+    now = datetime.now(tz=timezone.utc)
+
+    result = []
+    for target, functions in plan:
+        if target == 'recordset' and functions[0][0] == 'remove_duplicates':
+            function, arguments = functions[0]
+            deduplicator = HarvestDeduplicator(keys=arguments.get('keys'))
+            functions = [(function, {**arguments, 'deduplicator': deduplicator})]
+
+        elif target == 'recordset' and functions[0][0] == 'add_freshness':
+            function, arguments = functions[0]
+            functions = [(function, {'now': now, **arguments})]
+
+        result.append((target, functions))
+
+    return result
+
+
+def push_down_limits(plan: list) -> list:
+    """
+    Returns a copy of a plan in which each run of add_match stages followed by remove_unmatched_records, any skip stages,
+    and a limit stage is replaced by a single 'matches' step. The step adds the same matches, but stops evaluating records
+    once enough records match to fill the limit, since the records after them would be removed anyway.
+
+    Args:
+        plan (list): A plan produced by plan_stages().
+
+    Returns:
+        A list of ('recordset', 'record', or 'matches', [(function, arguments), ...]) tuples. The functions of a 'matches'
+        step are its add_match stages, each with the number of matching records needed as 'limit'.
+    """
+
+    def function_of(step: tuple) -> Tuple[str, dict] or Tuple[None, None]:
+        target, functions = step
+
+        return functions[0] if target == 'recordset' else (None, None)
+
+    result = []
+    position = 0
+    while position < len(plan):
+        end = position
+        while end < len(plan) and function_of(plan[end])[0] == 'add_match':
+            end += 1
+
+        needed = None
+        if position < end < len(plan) and function_of(plan[end])[0] == 'remove_unmatched_records':
+            skipped = 0
+            for step in plan[end + 1:]:
+                function, arguments = function_of(step)
+
+                if function == 'skip':
+                    skipped += arguments['count']
+                    continue
+
+                if function == 'limit':
+                    needed = skipped + arguments['count']
+
+                break
+
+        if needed is None:
+            result.append(plan[position])
+            position += 1
+            continue
+
+        result.append(('matches', [(function, {**arguments, 'limit': needed})
+                                   for target, functions in plan[position:end] for function, arguments in functions]))
+        position = end
+
+    return result
+
+
+def merge_matches(plan: list) -> list:
+    """
+    Returns a copy of a plan in which each run of two or more add_match stages is replaced by a single 'matches' step,
+    so that HarvestRecordSet.add_match() receives every syntax of the run at once and evaluates them in the order of
+    their cost and selectivity rather than in the order of the stages.
+
+    Args:
+        plan (list): A plan produced by plan_stages() or push_down_limits().
+
+    Returns:
+        A list of ('recordset', 'record', or 'matches', [(function, arguments), ...]) tuples.
+    """
+
+    result = []
+    for step in plan:
+        target, functions = step
+
+        if target == 'recordset' and functions[0][0] == 'add_match':
+            previous = result[-1] if result else (None, None)
+
+            if previous[0] == 'recordset' and previous[1][0][0] == 'add_match':
+                result[-1] = ('matches', previous[1] + functions)
+                continue
+
+            if previous[0] == 'matches' and 'limit' not in previous[1][0][1]:
+                result[-1] = ('matches', previous[1] + functions)
+                continue
+
+        result.append(step)
+
+    return result
+
+
+def split_plan(plan: list) -> Tuple[list, list]:
+    """
+    Splits a plan produced by plan_stages() before its first pipeline breaker.
+
+    Args:
+        plan (list): The plan to split.
+
+    Returns:
+        A tuple of the stages which can be applied to each chunk of a stream, and the stages from the first pipeline
+        breaker onwards.
+    """
+
+    for position, (target, functions) in enumerate(plan):
+        if target == 'recordset' and functions[0][0] not in STREAMING_RECORDSET_FUNCTIONS:
+            return plan[:position], plan[position:]
+
+    return plan, []
+
+
+def plan_stages(stages: List[dict]) -> List[Tuple[Literal['recordset', 'record'], List[Tuple[str, dict]]]]:
+    """
+    Groups stages into HarvestRecordSet stages, which run alone, and runs of consecutive HarvestRecord stages, which are
+    fused into a single pass over the records. As with HarvestRecordSetTask before fusion, a function name is resolved
+    against HarvestRecordSet first, except for RECORD_WISE_RECORDSET_FUNCTIONS, which are HarvestRecord stages.
+
+    Args:
+        stages (List[dict]): A list of dictionaries containing the function name and arguments of each stage.
+
+    Returns:
+        A list of ('recordset' or 'record', [(function, arguments), ...]) tuples.
+
+    Raises:
+        AttributeError: When neither HarvestRecordSet nor HarvestRecord has a method named after a stage. No stage is
+        run when the plan is invalid.
+    """
+
+    plan = []
+
+    for stage in stages:
+        # Each dictionary should only contain one key-value pair
+        for function, arguments in stage.items():
+            arguments = arguments or {}
+
+            if hasattr(HarvestRecordSet, function) and function not in RECORD_WISE_RECORDSET_FUNCTIONS:
+                plan.append(('recordset', [(function, arguments)]))
+
+            elif hasattr(HarvestRecord, function):
+                if plan and plan[-1][0] == 'record':
+                    plan[-1][1].append((function, arguments))
+
+                else:
+                    plan.append(('record', [(function, arguments)]))
+
+            else:
+                raise AttributeError(f"Neither HarvestRecordSet nor HarvestRecord has a method named '{function}'")
+
+            break
+
+    return plan
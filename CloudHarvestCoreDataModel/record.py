@@ -1,66 +1,156 @@
+from collections.abc import ItemsView, KeysView, ValuesView
+from itertools import chain
 from typing import List, Literal
-from collections import OrderedDict
-from .matching import HarvestMatch
+from .matching import HarvestCompiledExpression, HarvestCompiledMatch, HarvestMatch
 
 
-class HarvestRecord(OrderedDict):
+class HarvestRecord(dict):
+    # Records are created by the hundreds of thousands, so they use slots instead of an instance __dict__ and only
+    # allocate their match lists once a match has been recorded. Plain dict preserves insertion order without the
+    # linked list OrderedDict maintains for every key.
+    __slots__ = ('recordset', 'is_flat', '_matching_expressions', '_non_matching_expressions', '_last_seen')
+
     def __init__(self, recordset=False, is_flat: bool = False, **kwargs):
         super().__init__(**kwargs)
 
         self.recordset = recordset
         self.is_flat = is_flat
-        self.matching_expressions = []
-        self.non_matching_expressions = []
+        self._matching_expressions = None
+        self._non_matching_expressions = None
+        self._last_seen = None
+
+    def __reduce__(self):
+        # Records are pickled without their recordset, which would otherwise pickle every record in the set
+        return self.__class__._unpickle, (dict(self), self.is_flat)
+
+    @classmethod
+    def _unpickle(cls, data: dict, is_flat: bool) -> 'HarvestRecord':
+        record = cls(is_flat=is_flat)
+        record.update(data)
+
+        return record
 
     @property
     def is_matched_record(self) -> bool:
         """
-        Check if the record is a match.
+        Check if the record is a match. Both the matches called on the record with match() and the matches added to its
+        record set with HarvestRecordSet.add_match() are considered.
 
         :return: True if the record is a match, False otherwise
         """
 
-        return len(self.non_matching_expressions) == 0
+        if self._non_matching_expressions:
+            return False
+
+        is_matched = getattr(self.recordset, 'is_matched', None)
+
+        return is_matched(self) if is_matched else True
+
+    @property
+    def matching_expressions(self) -> List[HarvestMatch]:
+        """
+        The matches this record satisfied. Matches added to the record set are explained on demand.
+        """
+
+        if self._matching_expressions is None:
+            self._matching_expressions = []
+
+        explained = self._explain_record_matches()
+        if explained:
+            return self._matching_expressions + [match for match in explained if match.is_match]
+
+        return self._matching_expressions
+
+    @property
+    def non_matching_expressions(self) -> List[HarvestMatch]:
+        """
+        The matches this record did not satisfy. Matches added to the record set are explained on demand.
+        """
+
+        if self._non_matching_expressions is None:
+            self._non_matching_expressions = []
+
+        explained = self._explain_record_matches()
+        if explained:
+            return self._non_matching_expressions + [match for match in explained if not match.is_match]
+
+        return self._non_matching_expressions
+
+    def _explain_record_matches(self) -> List[HarvestMatch]:
+        """
+        Returns the explanations of the matches added to the record set of this record.
+        """
+
+        if not getattr(self.recordset, 'match_expressions', None):
+            return []
+
+        explain_record = getattr(self.recordset, 'explain_record', None)
+
+        return explain_record(self) if explain_record else []
+
+    def copy(self) -> 'HarvestRecord':
+        """
+        Return a shallow copy of the record which belongs to the same record set.
+        """
+
+        record = self.__class__(recordset=self.recordset, is_flat=self.is_flat)
+        record.update(self)
+        record._last_seen = self._last_seen
 
-    def add_freshness(self, fresh_range: int = 3600, aging_range: int = 43200) -> 'HarvestRecord':
+        return record
+
+    def add_freshness(self, fresh_range: int = 3600, aging_range: int = 43200, now=None, cache_dates: bool = False) -> 'HarvestRecord':
         """
         Add the freshness key to the record. Freshness is determined by the time since the record was last seen and whether the record is active.
+        Use HarvestRecordSet.add_freshness() to add the freshness key to every record in a record set.
 
         :param fresh_range: lower bound of the freshness range, defaults to 3600
         :param aging_range: middle and upper bound of the freshness range, defaults to 43200
+        :param now: the timezone-aware datetime the age of the record is measured from, defaults to the current time
+        :param cache_dates: keep the parsed LastSeen datetime on the record so it is not parsed again while LastSeen is unchanged, defaults to False
         """
 
-        from .functions import cast
+        from .functions import cast, freshness
         from datetime import datetime, timezone
 
-        active = self.get('Harvest', {}).get('Dates', {}).get('Active') or self.get('Active')
-        last_seen = cast(value=self.get('Harvest', {}).get('Dates', {}).get('LastSeen') or self.get('LastSeen'),
-                         typeof='datetime.fromisoformat')
+        source = self._freshness_source()
+        cached = self._cached_last_seen(source)
 
-        result = 'I'
-        if active and last_seen:
-            now = datetime.now(tz=timezone.utc)
-            age = (now - last_seen).total_seconds()
+        last_seen = cached[1] if cached else cast(value=source, typeof='datetime')
 
-            # Fresh: one hour
-            if age <= fresh_range:
-                result = 'F'
+        if cache_dates:
+            self._last_seen = (source, last_seen)
 
-            # Aging: twelve hours
-            elif fresh_range > age > aging_range:
-                result = 'A'
+        self['f'] = freshness(last_seen=last_seen,
+                              now=now or datetime.now(tz=timezone.utc),
+                              fresh_range=fresh_range,
+                              aging_range=aging_range)
 
-            # Stale: older than twelve hours
-            elif age > aging_range:
-                result = 'S'
+        return self
 
-            # Error: unknown state
-            else:
-                result = 'E'
+    def _freshness_source(self):
+        """
+        Returns the LastSeen value of an active record, or None when the record is inactive.
+        """
 
-        self['f'] = result
+        dates = self.get('Harvest', {}).get('Dates', {})
 
-        return self
+        if dates.get('Active') or self.get('Active'):
+            return dates.get('LastSeen') or self.get('LastSeen')
+
+        return None
+
+    def _cached_last_seen(self, source) -> tuple or None:
+        """
+        Returns the (LastSeen, datetime) pair kept by add_freshness(cache_dates=True) while LastSeen is unchanged.
+        """
+
+        cached = self._last_seen
+
+        if cached is not None and cached[0] == source:
+            return cached
+
+        return None
 
     def add_key_from_keys(self, new_key: str, sequence: List[str], delimiter: str = ' ', abort_on_none: bool = False) -> 'HarvestRecord':
         """
@@ -193,17 +283,26 @@ class HarvestRecord(OrderedDict):
         """
 
         if self.is_flat:
-            return
+            return self
 
-        from flatten_json import flatten
-        flat = flatten(self, separator=separator)
-        self.clear()
-        self.update(flat)
+        from .flattening import get_flattener
+        get_flattener(separator).flatten_record(self)
 
         self.is_flat = True
 
         return self
 
+    def flat_view(self, separator: str = '.'):
+        """
+        Return a read-only flattened view of the record which resolves flattened keys such as 'Tags.0.Value' when they
+        are read, without flattening the record. See flattening.HarvestFlatView.
+
+        :param separator: the separator used by the flattened keys, defaults to '.'
+        """
+
+        from .flattening import HarvestFlatView
+        return HarvestFlatView(self, separator=separator)
+
     def key_value_list_to_dict(self, source_key: str, name_key: str = 'Key',
                                value_key: str = 'Value', preserve_original: bool = False, target_key: str = None) -> 'HarvestRecord':
         """
@@ -241,30 +340,42 @@ class HarvestRecord(OrderedDict):
 
     def clear_matches(self) -> 'HarvestRecord':
         """
-        Clear the matches of the record.
+        Clear the matches of the record, including its results for the matches added to its record set.
         """
 
-        self.matching_expressions.clear()
-        self.non_matching_expressions.clear()
+        self._matching_expressions = None
+        self._non_matching_expressions = None
+
+        clear_record_matches = getattr(self.recordset, 'clear_record_matches', None)
+        if clear_record_matches and (self.recordset.match_bitmaps or self.recordset.limit_bitmap is not None):
+            clear_record_matches(self)
 
         return self
 
-    def match(self, syntax: str) -> bool:
+    def match(self, syntax: str or HarvestCompiledMatch or HarvestCompiledExpression) -> bool:
         """
         Check if the record matches a statement.
 
-        :param syntax: the match statement
+        :param syntax: the match statement or expression, either as a string or compiled with
+        matching.compile_expression()
         :return: True if the record matches the statement, False otherwise
         """
 
         match = HarvestMatch(record=self, syntax=syntax)
         match.match()
 
+        # The local lists are used because the properties also return the explanations of record set matches
         if match.is_match:
-            self.matching_expressions.append(match)
+            if self._matching_expressions is None:
+                self._matching_expressions = []
+
+            self._matching_expressions.append(match)
 
         else:
-            self.non_matching_expressions.append(match)
+            if self._non_matching_expressions is None:
+                self._non_matching_expressions = []
+
+            self._non_matching_expressions.append(match)
 
         return match.is_match
 
@@ -296,10 +407,7 @@ class HarvestRecord(OrderedDict):
         Reset the matches of the record.
         """
 
-        self.matching_expressions.clear()
-        self.non_matching_expressions.clear()
-
-        return self
+        return self.clear_matches()
 
     def split_key(self, source_key: str, target_key: str = None, delimiter: str = ' ') -> 'HarvestRecord':
         """
@@ -336,13 +444,145 @@ class HarvestRecord(OrderedDict):
         """
 
         if self.is_flat is False:
-            return
+            return self
 
-        from flatten_json import unflatten_list
-        unflat = unflatten_list(self, separator=separator)
-        self.clear()
-        self.update(unflat)
+        from .flattening import get_flattener
+        get_flattener(separator).unflatten_record(self)
 
         self.is_flat = False
 
         return self
+
+
+class HarvestOverlayRecord(HarvestRecord):
+    """
+    A record which reads the keys it has not set itself from a base dictionary shared with other records, such as the
+    records unwound from the same record. Setting a key stores it on the record, where it shadows the base (copy on
+    write), so each record only holds the keys which differ from the base. The base must not be modified once records
+    share it.
+
+    Removing a key or clearing the record first copies the base into the record (materialize()), after which the record
+    behaves like any other HarvestRecord.
+    """
+
+    __slots__ = ('_base', )
+
+    def __init__(self, base: dict, recordset=False, is_flat: bool = False, **kwargs):
+        super().__init__(recordset=recordset, is_flat=is_flat, **kwargs)
+
+        self._base = base
+
+    def __reduce__(self):
+        # Overlays are pickled as complete records
+        return HarvestRecord._unpickle, (dict(self.items()), self.is_flat)
+
+    def __getitem__(self, key):
+        base = self._base
+
+        if base is None or dict.__contains__(self, key):
+            return dict.__getitem__(self, key)
+
+        return base[key]
+
+    def __contains__(self, key) -> bool:
+        return dict.__contains__(self, key) or (self._base is not None and key in self._base)
+
+    def __iter__(self):
+        base = self._base
+
+        if base is None:
+            return dict.__iter__(self)
+
+        # The keys of the base keep their order; keys which are only set on the record follow them
+        return chain(base, (key for key in dict.keys(self) if key not in base))
+
+    def __len__(self) -> int:
+        base = self._base
+
+        if base is None:
+            return dict.__len__(self)
+
+        return len(base) + sum(1 for key in dict.keys(self) if key not in base)
+
+    def __eq__(self, other) -> bool:
+        if self._base is None:
+            return dict.__eq__(self, other)
+
+        return dict(self.items()) == other
+
+    def __ne__(self, other) -> bool:
+        return not self == other
+
+    def __repr__(self) -> str:
+        return repr(dict(self.items()))
+
+    def __delitem__(self, key) -> None:
+        self.materialize()
+        dict.__delitem__(self, key)
+
+    def clear(self) -> None:
+        self._base = None
+        dict.clear(self)
+
+    def copy(self) -> 'HarvestOverlayRecord':
+        """
+        Return a shallow copy of the record which shares the same base and belongs to the same record set.
+        """
+
+        record = HarvestOverlayRecord(self._base, recordset=self.recordset, is_flat=self.is_flat)
+        dict.update(record, dict.items(self))
+        record._last_seen = self._last_seen
+
+        return record
+
+    def get(self, key, default=None):
+        base = self._base
+
+        if base is None or dict.__contains__(self, key):
+            return dict.get(self, key, default)
+
+        return base.get(key, default)
+
+    def items(self):
+        return dict.items(self) if self._base is None else ItemsView(self)
+
+    def keys(self):
+        return dict.keys(self) if self._base is None else KeysView(self)
+
+    def materialize(self) -> 'HarvestOverlayRecord':
+        """
+        Copy the base into the record so that it no longer depends on the base. Keys set on the record keep their value.
+        """
+
+        base = self._base
+
+        if base is not None:
+            own = list(dict.items(self))
+
+            self._base = None
+            dict.clear(self)
+            dict.update(self, base)
+            dict.update(self, own)
+
+        return self
+
+    def pop(self, key, *default):
+        self.materialize()
+
+        return dict.pop(self, key, *default)
+
+    def popitem(self) -> tuple:
+        self.materialize()
+
+        return dict.popitem(self)
+
+    def setdefault(self, key, default=None):
+        if key in self:
+            return self[key]
+
+        self[key] = default
+
+        return default
+
+    def values(self):
+        return dict.values(self) if self._base is None else ValuesView(self)
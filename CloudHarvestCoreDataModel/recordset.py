@@ -1,5 +1,9 @@
-from typing import Dict, List, Literal
-from .record import HarvestRecord
+from collections import Counter
+from itertools import chain, compress, product
+from typing import Dict, Iterable, Iterator, List, Literal, Tuple
+from .indexes import HarvestIndex, HarvestSortedIndex
+from .matching import HarvestMatch, HarvestMatchStatistics, compile_expression
+from .record import HarvestOverlayRecord, HarvestRecord
 
 
 class HarvestRecordSet(List[HarvestRecord]):
@@ -18,8 +22,30 @@ class HarvestRecordSet(List[HarvestRecord]):
 
         self.indexes = {}
         self.index_fields = {}
+        self.last_match_plan = None
 
-        if data:
+        # Match state is kept here rather than on each record: one compiled match and one bitmap per add_match() call,
+        # where 1 marks a matching record. Explanations of a record's matches are built on demand by explain_record().
+        self.match_expressions = []
+        self.match_bitmaps = []
+
+        # Set by add_match() with a limit, where 0 marks a record which was not evaluated because the limit was reached.
+        # Those records are not matched, but did not fail any of the matches.
+        self.limit_bitmap = None
+
+        # The selectivity of the syntaxes added with add_match(), which orders the syntaxes of later calls. Record sets
+        # may share statistics by assigning the same instance.
+        self.match_statistics = HarvestMatchStatistics()
+
+        # Maps id(record) to its position in the record set; built on demand and discarded when records are reordered
+        self._positions = None
+
+        # Maps each key to the number of records which have it. Counts are updated as records are added and removed, and
+        # recounted on the next read after records were modified in place (see records_modified()).
+        self._key_catalog = Counter()
+        self._key_catalog_stale = False
+
+        if data is not None:
             self.add(data=data)
 
     def __enter__(self) -> 'HarvestRecordSet':
@@ -33,9 +59,151 @@ class HarvestRecordSet(List[HarvestRecord]):
 
         return self
 
+    # Match results, indexes, and the key catalog refer to records by position, so the list methods which add, remove,
+    # or move records are overridden to keep them in sync. Records added this way are considered matched until the next
+    # add_match(), as records added with add() are.
+
+    def __delitem__(self, key: int or slice) -> None:
+        positions = range(len(self))
+        removed = set(positions[key]) if isinstance(key, slice) else {positions[key]}
+
+        self._keep_positions([position for position in positions if position not in removed])
+
+    def __iadd__(self, other: Iterable[dict or HarvestRecord]) -> 'HarvestRecordSet':
+        return self.add_many(data=other)
+
+    def __setitem__(self, key: int or slice, value) -> None:
+        length = len(self)
+        positions = list(range(length))
+
+        # New records take the position after the last record, which no match bitmap covers, so they are matched
+        if isinstance(key, slice):
+            records = list(self._iter_records(value))
+            positions[key] = [length] * len(records)
+
+        else:
+            records = list(self._iter_records((value, )))
+            positions[key] = length
+
+        kept = set(positions)
+        removed = [record for position, record in enumerate(self) if position not in kept]
+
+        new_records = iter(records)
+        super().__setitem__(slice(None), [next(new_records) if position == length else self[position]
+                                          for position in positions])
+        self._reorder_matches(positions)
+
+        self._uncount_keys(removed)
+
+        if not self._key_catalog_stale:
+            self._key_catalog.update(chain.from_iterable(records))
+
+        for index in self.indexes.values():
+            index.evict_records(removed)
+            index.insert_records(records)
+
+    def append(self, record: dict or HarvestRecord) -> None:
+        self.add_many(data=(record, ))
+
+    def clear(self) -> None:
+        """
+        Remove every record, along with the match results, the contents of the indexes, and the key catalog.
+        """
+
+        super().clear()
+
+        self.match_expressions.clear()
+        self.match_bitmaps.clear()
+        self.limit_bitmap = None
+        self._positions = None
+        self._key_catalog.clear()
+        self._key_catalog_stale = False
+
+        for index in self.indexes.values():
+            index.clear()
+
+    def extend(self, records: Iterable[dict or HarvestRecord]) -> None:
+        self.add_many(data=records)
+
+    def insert(self, position: int, record: dict or HarvestRecord) -> None:
+        self[position:position] = [record]
+
+    def pop(self, position: int = -1) -> HarvestRecord:
+        record = self[position]
+        del self[position]
+
+        return record
+
+    def remove(self, record: dict or HarvestRecord) -> None:
+        del self[self.index(record)]
+
+    def reverse(self) -> None:
+        self._keep_positions(list(range(len(self) - 1, -1, -1)))
+
     @property
     def keys(self) -> List[str]:
-        return sorted(list(set([key for record in self for key in record.keys()])))
+        return sorted(self.key_catalog)
+
+    @property
+    def key_catalog(self) -> Dict[str, int]:
+        """
+        The number of records which have each key.
+        """
+
+        if self._key_catalog_stale:
+            self.rebuild_key_catalog()
+
+        return self._key_catalog
+
+    def key_fill_rates(self) -> Dict[str, float]:
+        """
+        Returns the fraction of records which have each key.
+        """
+
+        total = len(self)
+
+        return {key: count / total for key, count in self.key_catalog.items()}
+
+    def rebuild_key_catalog(self) -> 'HarvestRecordSet':
+        """
+        Recount the keys of every record. This is only needed after records were modified without going through the
+        record set, such as by calling HarvestRecord methods directly.
+        """
+
+        self._key_catalog = Counter(chain.from_iterable(self))
+        self._key_catalog_stale = False
+
+        return self
+
+    def records_modified(self) -> 'HarvestRecordSet':
+        """
+        Update the indexes and key catalog after records were modified in place.
+        """
+
+        # Only records whose indexed field values changed are moved to a new bucket
+        for index in self.indexes.values():
+            index.reindex_records(self)
+
+        # Keys are recounted on the next read, so several modifications in a row only recount once
+        self._key_catalog_stale = True
+
+        return self
+
+    def _uncount_keys(self, records: List[HarvestRecord]) -> None:
+        """
+        Removes records from the key catalog.
+        """
+
+        if self._key_catalog_stale:
+            return
+
+        # When most records were removed, the remaining records are recounted on the next read instead
+        if len(records) > len(self):
+            self._key_catalog_stale = True
+
+        else:
+            self._key_catalog.subtract(chain.from_iterable(records))
+            self._key_catalog = +self._key_catalog
 
     def add(self, data: (List[dict or HarvestRecord]) or dict or HarvestRecord) -> 'HarvestRecordSet':
         """
@@ -43,10 +211,12 @@ class HarvestRecordSet(List[HarvestRecord]):
 
         This method accepts a list of dictionaries or HarvestRecord objects, a single dictionary, or a single HarvestRecord object.
         If the input is a dictionary, it will be automatically converted to a HarvestRecord.
-        If the input is a HarvestRecord, it will be directly appended to the record set.
-        If the input is a list, each element in the list will be appended to the record set. If an element is a dictionary, it will be converted to a HarvestRecord.
+        If the input is a HarvestRecord, it will be directly appended to the record set, or copied when it belongs to
+        another record set.
+        If the input is a list (or any other iterable), it is loaded through add_many().
+        If the input is None, nothing is added.
 
-        After adding the new data, the indexes of the record set are rebuilt.
+        After adding the new data, the new records are inserted into the indexes of the record set.
 
         Args:
             data (Union[List[Union[dict, 'HarvestRecord']], dict, 'HarvestRecord']): A list of dictionaries or HarvestRecord objects to add to the record set. If the object is a dictionary, it will automatically be converted to a HarvestRecord.
@@ -55,31 +225,292 @@ class HarvestRecordSet(List[HarvestRecord]):
             HarvestRecordSet: The current HarvestRecordSet instance.
         """
 
+        if data is None:
+            return self
+
         if isinstance(data, dict):
-            self.append(HarvestRecord(recordset=self, **data))
+            data = (data, )
 
-        elif isinstance(data, HarvestRecord):
-            data.recordset = self
-            self.append(data)
+        return self.add_many(data)
 
-        elif isinstance(data, list):
-            [
-                self.add(item)
-                for item in data
-            ]
+    def add_many(self, data: Iterable[dict or HarvestRecord]) -> 'HarvestRecordSet':
+        """
+        Bulk load records into the record set.
 
-        self.rebuild_indexes()
+        Records are converted and appended in a single pass and then inserted into each index once, which keeps large
+        loads linear regardless of how many indexes are registered.
+
+        Args:
+            data (Iterable[Union[dict, 'HarvestRecord']]): A list, generator, or other iterable of dictionaries or
+            HarvestRecord objects. Nested lists and tuples are flattened.
+
+        Returns:
+            HarvestRecordSet: The current HarvestRecordSet instance.
+        """
+
+        start = len(self)
+        super().extend(self._iter_records(data))
+
+        # Records added after a match was evaluated are considered matched until the next add_match()
+        for bitmap in self.match_bitmaps:
+            bitmap.extend(b'\x01' * (len(self) - start))
+
+        if self.limit_bitmap is not None:
+            self.limit_bitmap.extend(b'\x01' * (len(self) - start))
+
+        new_records = self[start:]
+
+        if not self._key_catalog_stale:
+            self._key_catalog.update(chain.from_iterable(new_records))
+
+        for index in self.indexes.values():
+            index.insert_records(new_records)
 
         return self
 
-    def add_match(self, syntax: str) -> 'HarvestRecordSet':
+    def _iter_records(self, data: Iterable) -> Iterable[HarvestRecord]:
+        """
+        Yield HarvestRecords attached to this record set from an iterable of dictionaries, HarvestRecords, or nested lists.
+        HarvestRecords which belong to another record set are copied, so that changing this record set, such as a union
+        of other record sets, does not change the records, indexes, or match results of the other record set.
+
+        :param data: The iterable to convert
+        """
+
+        for item in data:
+            if isinstance(item, HarvestRecord):
+                owner = item.recordset
+
+                if owner is not self and owner is not None and owner is not False:
+                    item = item.copy()
+
+                item.recordset = self
+                yield item
+
+            elif isinstance(item, dict):
+                yield HarvestRecord(recordset=self, **item)
+
+            elif isinstance(item, (list, tuple)):
+                yield from self._iter_records(item)
+
+    def add_freshness(self, fresh_range: int = 3600, aging_range: int = 43200, now=None,
+                      cache_dates: bool = False) -> 'HarvestRecordSet':
+        """
+        Add the freshness key ('f') to every record. Freshness is measured from a single reference time for the whole
+        record set and each distinct LastSeen value is parsed once, so records from the same harvest share one parse.
+        See HarvestRecord.add_freshness().
+
+        :param fresh_range: lower bound of the freshness range, defaults to 3600
+        :param aging_range: middle and upper bound of the freshness range, defaults to 43200
+        :param now: the timezone-aware datetime the age of the records is measured from, defaults to the current time
+        :param cache_dates: keep the parsed LastSeen datetime on each record so it is not parsed again while LastSeen is
+        unchanged, defaults to False
+        """
+
+        from datetime import datetime, timezone
+        from .functions import cast_many, freshness
+
+        now = now or datetime.now(tz=timezone.utc)
+        sources = [record._freshness_source() for record in self]
+        cached = [record._last_seen for record in self]
+
+        # Records from the same harvest share a LastSeen value, so each distinct value is parsed and coded once
+        pending = list({source for source, pair in zip(sources, cached)
+                        if isinstance(source, str) and (pair is None or pair[0] != source)})
+        parsed = dict(zip(pending, cast_many(pending, 'datetime')))
+        codes = {}
+
+        added = 0
+        for record, source, pair in zip(self, sources, cached):
+            if pair is not None and pair[0] == source:
+                last_seen = pair[1]
+
+            elif isinstance(source, str):
+                last_seen = parsed[source]
+
+            else:
+                last_seen = source if isinstance(source, datetime) else None
+
+            if cache_dates:
+                record._last_seen = (source, last_seen)
+
+            if 'f' not in record:
+                added += 1
+
+            code = codes.get(last_seen)
+            if code is None:
+                code = codes[last_seen] = freshness(last_seen, now, fresh_range, aging_range)
+
+            record['f'] = code
+
+        if added and not self._key_catalog_stale:
+            self._key_catalog['f'] += added
+
+        for index in self.indexes.values():
+            if 'f' in index.fields:
+                index.reindex_records(self)
+
+        return self
+
+    def add_match(self, syntax: List[str] or str, limit: int = None) -> 'HarvestRecordSet':
         """
         Add a match to the record set.
 
-        :param syntax: The match syntax to add
+        When an index can answer the match (see explain_match()), the matching records are retrieved from the index
+        instead of evaluating every record. The plan which was used is stored in last_match_plan.
+
+        Only records which matched the matches added before, and every syntax answered by an index, are evaluated. The
+        other syntaxes are evaluated in the order given by match_statistics, cheapest and most selective first, and each
+        record stops at the first syntax it does not match. A record which is not evaluated against a syntax because it
+        failed another is not marked as failing it.
+
+        When a limit is provided, records are evaluated in order against every syntax and evaluation stops once limit
+        records match, which is all remove_unmatched_records() followed by limit() needs. Only records which matched the
+        matches added before are evaluated. Records after the last matching record are not evaluated: they are marked as
+        not matching in limit_bitmap rather than as failing any of the matches.
+
+        :param syntax: The match syntax or expression to add (see matching.HarvestCompiledExpression), or a list of them
+        which are added in order
+        :param limit: The number of matching records after which evaluation stops, defaults to None
         """
 
-        [record.match(syntax) for record in self]
+        syntaxes = [syntax] if isinstance(syntax, str) else list(syntax)
+
+        if limit is not None:
+            return self._add_matches_until(syntaxes, limit)
+
+        # Each syntax is parsed once and evaluated against every record
+        compiled = [compile_expression(syntax) for syntax in syntaxes]
+        plans = [self.explain_match(syntax) for syntax in syntaxes]
+        bitmaps = [None] * len(compiled)
+
+        for position, plan in enumerate(plans):
+            if plan['path'] == 'index':
+                bitmap = bitmaps[position] = bytearray(len(self))
+
+                for record in self.indexes[plan['index_name']].lookup(compiled[position]):
+                    bitmap[self._position(record)] = 1
+
+        scanned = [position for position, plan in enumerate(plans) if plan['path'] == 'scan']
+        if scanned:
+            mask = self._matched_mask(bitmap for bitmap in bitmaps if bitmap is not None)
+            results = self._scan_matches([compiled[position] for position in scanned], mask)
+
+            for position, (bitmap, evaluated) in zip(scanned, results):
+                bitmaps[position] = bitmap
+                plans[position]['evaluated'] = evaluated
+
+        self.match_expressions.extend(compiled)
+        self.match_bitmaps.extend(bitmaps)
+
+        if plans:
+            self.last_match_plan = plans[-1]
+
+        return self
+
+    def _scan_matches(self, matches: list, mask: bytearray) -> List[Tuple[bytearray, int]]:
+        """
+        Evaluate matches against the records selected by a mask. Matches are evaluated in the order given by
+        match_statistics, each against the records which satisfied the matches before it, and their selectivity is
+        recorded.
+
+        :param matches: The compiled matches to evaluate
+        :param mask: A bitmap of the records to evaluate
+        :return: For each match, a bitmap in which the records which did not satisfy it are 0, and the number of records
+        evaluated against it
+        """
+
+        from operator import not_
+
+        statistics = self.match_statistics
+        length = len(self)
+
+        results = [None] * len(matches)
+        positions = list(compress(range(length), mask))
+        records = list(compress(self, mask))
+
+        for match_position in sorted(range(len(matches)), key=lambda position: statistics.rank(matches[position])):
+            match = matches[match_position]
+            evaluated = match.evaluate_records(records, statistics)
+
+            if len(records) == length:
+                bitmap = evaluated
+
+            else:
+                bitmap = bytearray(b'\x01') * length
+
+                for position in compress(positions, map(not_, evaluated)):
+                    bitmap[position] = 0
+
+            results[match_position] = bitmap, len(records)
+            statistics.record(match, len(records), evaluated.count(1))
+
+            # The next matches are only evaluated against the records which satisfied this one
+            if None in results:
+                positions = list(compress(positions, evaluated))
+                records = list(compress(records, evaluated))
+
+        return results
+
+    def _add_matches_until(self, syntaxes: List[str], limit: int) -> 'HarvestRecordSet':
+        """
+        Add matches which are evaluated together, record by record, until limit records match all of them. As with a
+        scan, a record is only marked as failing the match it failed; the records after the last matching record are
+        marked in limit_bitmap.
+
+        :param syntaxes: The match syntaxes to add
+        :param limit: The number of matching records after which evaluation stops
+        """
+
+        compiled = [compile_expression(syntax) for syntax in syntaxes]
+        bitmaps = [bytearray(b'\x01') * len(self) for syntax in syntaxes]
+
+        # The cheapest and most selective matches are evaluated first
+        statistics = self.match_statistics
+        evaluation_order = sorted(zip(compiled, bitmaps), key=lambda match_bitmap: statistics.rank(match_bitmap[0]))
+
+        # Every record is excluded when no record is needed
+        end = 0
+        matched = 0
+        evaluated = 0
+        if limit > 0:
+            end = len(self)
+
+            for position in compress(range(len(self)), self._matched_mask()):
+                record = self[position]
+
+                # Records which failed a match called on the record directly are never part of the matched records
+                if record._non_matching_expressions:
+                    continue
+
+                evaluated += 1
+
+                for match, bitmap in evaluation_order:
+                    if not match.evaluate(record):
+                        bitmap[position] = 0
+                        break
+
+                else:
+                    matched += 1
+
+                    if matched == limit:
+                        end = position + 1
+                        break
+
+        if end < len(self):
+            limit_bitmap = bytearray(b'\x01') * end + bytearray(len(self) - end)
+
+            # Records appended to the list directly are within the earlier limit
+            if self.limit_bitmap is not None:
+                padded = self.limit_bitmap + b'\x01' * (len(self) - len(self.limit_bitmap))
+                limit_bitmap = bytearray(map(min, padded, limit_bitmap))
+
+            self.limit_bitmap = limit_bitmap
+
+        self.match_expressions.extend(compiled)
+        self.match_bitmaps.extend(bitmaps)
+        self.last_match_plan = {'syntax': syntaxes[-1] if syntaxes else None, 'path': 'limit', 'index_name': None,
+                                'evaluated': evaluated}
 
         return self
 
@@ -88,29 +519,59 @@ class HarvestRecordSet(List[HarvestRecord]):
         Clear all matches from the record set.
         """
 
+        self.match_expressions.clear()
+        self.match_bitmaps.clear()
+        self.limit_bitmap = None
+
         [record.clear_matches() for record in self]
 
         return self
 
-    def create_index(self, index_name: str, *fields) -> 'HarvestRecordSet':
+    def clear_record_matches(self, record: HarvestRecord) -> 'HarvestRecordSet':
+        """
+        Clear the matches of a single record, which is then considered matched.
+
+        :param record: The record to clear
+        """
+
+        position = self._position(record)
+
+        if position is not None:
+            for bitmap in self._match_bitmaps():
+                if position < len(bitmap):
+                    bitmap[position] = 1
+
+        return self
+
+    def count_matched_records(self) -> int:
+        """
+        Count the records in the record set that are a match.
+
+        :return: The number of matched records
+        """
+
+        return len(self._matched_records())
+
+    def create_index(self, index_name: str, *fields, index_type: Literal['hash', 'sorted'] = 'hash') -> 'HarvestRecordSet':
         """
         Create an index for the record set.
 
         :param index_name: The name of the index
         :param fields: The fields to include in the index
+        :param index_type: 'hash' (the default) answers equality matches and joins on one or more fields. 'sorted' answers
+        range matches ('<', '>', '<=', '>=') on a single field.
 
         """
 
-        index = {}
-        for record in self:
-            # Sometimes a dictionary may not have the associated field. In this case, we will use None as the value.
-            key = tuple(record.get(field) for field in fields)
+        match index_type:
+            case 'hash':
+                index = HarvestIndex(*fields, records=self)
 
-            if key in index:
-                index[key].append(record)
+            case 'sorted':
+                index = HarvestSortedIndex(*fields, records=self)
 
-            else:
-                index[key] = [record]
+            case _:
+                raise ValueError(f'Invalid index type: {index_type}')
 
         self.indexes[index_name] = index
         self.index_fields[index_name] = fields
@@ -125,9 +586,61 @@ class HarvestRecordSet(List[HarvestRecord]):
         """
 
         self.indexes.pop(index_name)
+        self.index_fields.pop(index_name, None)
 
         return self
 
+    def explain_match(self, syntax: str) -> dict:
+        """
+        Describe how add_match() will evaluate a match syntax.
+
+        :param syntax: The match syntax
+        :return: A dictionary containing the syntax, the path ('index' or 'scan'), and the name of the index used, if any
+        """
+
+        compiled = compile_expression(syntax)
+
+        for index_name, index in self.indexes.items():
+            if index.supports(compiled):
+                return {'syntax': syntax, 'path': 'index', 'index_name': index_name}
+
+        return {'syntax': syntax, 'path': 'scan', 'index_name': None}
+
+    def explain_record(self, record: HarvestRecord) -> List:
+        """
+        Explain how a record was evaluated by each match added to the record set. The explanations are built when this
+        method is called, so final_match_operation reflects the record's current values.
+
+        :param record: The record to explain
+        :return: A list of HarvestMatch objects, one per match, whose is_match reflects the stored match result
+        """
+
+        position = self._position(record)
+
+        if position is None:
+            return []
+
+        result = []
+        for compiled, bitmap in zip(self.match_expressions, self.match_bitmaps):
+            match = HarvestMatch(record=record, syntax=compiled)
+            match.match()
+            match.is_match = bool(bitmap[position]) if position < len(bitmap) else True
+
+            result.append(match)
+
+        return result
+
+    def flatten(self, separator: str = '.') -> 'HarvestRecordSet':
+        """
+        Flatten every record which is not already flat. The records share a flattening.HarvestFlattener, so records with
+        the same shape reuse the same flattened keys instead of discovering them again. HarvestRecord.flatten() uses the
+        same flattener, so the flatten stage is fused with the record stages around it (see pipeline.plan_stages()).
+
+        :param separator: the separator to use when flattening, defaults to '.'
+        """
+
+        return self._reshape_records(separator=separator, flat=True)
+
     def get_matched_records(self) -> 'HarvestRecordSet':
         """
         Get all records in the record set that are a match.
@@ -135,7 +648,303 @@ class HarvestRecordSet(List[HarvestRecord]):
         :return: A HarvestRecordSet object containing all matched records
         """
 
-        return HarvestRecordSet(data=[record for record in self if record.is_matched_record])
+        result = HarvestRecordSet()
+
+        # The records keep their place in this record set, which holds their match state, so they are not added with
+        # add(), which would assign them to the result. Their keys are counted here instead.
+        list.extend(result, self._matched_records())
+        result.rebuild_key_catalog()
+
+        return result
+
+    def group_by(self, fields: List[str] or str, aggregations: Dict[str, str or dict] = None) -> 'HarvestRecordSet':
+        """
+        Group the records by the values of one or more fields in a hash table and aggregate each group. Records missing a
+        field are grouped under None. A hash index created with create_index() on the same fields already holds the
+        groups, so it is used instead of reading the records.
+
+        Each aggregation maps an output key to 'count', which counts the records of the group, or to a dictionary of one
+        operator and the field it applies to:
+            count: the number of values which are not None
+            count_distinct: the number of distinct values which are not None
+            sum, avg: the sum and mean of the numeric values
+            min, max: the smallest and largest values which are not None
+            first, last: the value of the first and last record of the group
+
+        :param fields: The field or fields to group by
+        :param aggregations: The aggregations to include in each group, defaults to {'count': 'count'}
+        :return: A new record set containing one record per group, with the group fields and the aggregations. Groups are
+        in the order their first record appears in the record set, or in the order of the index when one is used.
+        """
+
+        from .aggregation import aggregate_groups, compile_aggregations
+
+        fields = (fields, ) if isinstance(fields, str) else tuple(fields)
+        compiled = compile_aggregations(aggregations or {'count': 'count'})
+
+        index = next((index for index in self.indexes.values()
+                      if index.index_type == 'hash' and index.fields == fields), None)
+
+        if index is not None:
+            # The index buckets are the groups. Records moved between buckets after they were modified are appended to
+            # their new bucket, so buckets are only put back in record set order when first or last is used.
+            if any(operator in ('first', 'last') for name, operator, field, function in compiled):
+                from itertools import count
+
+                positions = dict(zip(map(id, self), count()))
+                groups = [(key, sorted(records, key=lambda record: positions[id(record)])) for key, records in index.items()]
+
+            else:
+                groups = index.items()
+
+            return HarvestRecordSet(data=aggregate_groups(groups, fields, compiled))
+
+        from .flattening import field_values
+
+        # The values of each field are read in a single pass per field
+        keys = zip(*(field_values(self, field) for field in fields))
+
+        # When only records are counted, the positions of the records of each group are not needed and ranges of the
+        # same length stand in for them
+        if all(field is None for name, operator, field, function in compiled):
+            groups = ((key, range(size)) for key, size in Counter(keys).items())
+
+            return HarvestRecordSet(data=aggregate_groups(groups, fields, compiled, records=self))
+
+        groups = {}
+        for position, key in enumerate(keys):
+            group = groups.get(key)
+
+            if group is None:
+                groups[key] = [position]
+
+            else:
+                group.append(position)
+
+        return HarvestRecordSet(data=aggregate_groups(groups.items(), fields, compiled, records=self))
+
+    def is_matched(self, record: HarvestRecord) -> bool:
+        """
+        Check whether a record of the record set satisfied every match added to the record set.
+
+        :param record: The record to check
+        :return: True if the record is a match or is not part of the record set, False otherwise
+        """
+
+        if not self.match_bitmaps and self.limit_bitmap is None:
+            return True
+
+        position = self._position(record)
+
+        if position is None:
+            return True
+
+        return all(bitmap[position] for bitmap in self._match_bitmaps() if position < len(bitmap))
+
+    def _match_bitmaps(self) -> List[bytearray]:
+        """
+        Returns the match bitmaps and, when add_match() stopped at a limit, limit_bitmap.
+        """
+
+        return self.match_bitmaps if self.limit_bitmap is None else self.match_bitmaps + [self.limit_bitmap]
+
+    def _matched_mask(self, bitmaps: Iterable[bytearray] = ()) -> bytearray:
+        """
+        Returns a bitmap of the records which satisfied every match added to the record set.
+
+        :param bitmaps: Other bitmaps the records must also satisfy, defaults to none
+        """
+
+        length = len(self)
+        bitmaps = list(chain(self._match_bitmaps(), bitmaps))
+
+        if not bitmaps:
+            return bytearray(b'\x01') * length
+
+        # Each byte is 0 or 1, so a bitwise AND of the bitmaps as integers is a record-wise AND. Bitmaps are padded with
+        # ones in case records were appended to the list directly.
+        mask = -1
+        for bitmap in bitmaps:
+            mask &= int.from_bytes(bitmap + b'\x01' * (length - len(bitmap)), 'little')
+
+        return bytearray(mask.to_bytes(length, 'little'))
+
+    def _matched_records(self) -> List[HarvestRecord]:
+        """
+        Returns the records which satisfied every match added to the record set and every match called on the record
+        directly with HarvestRecord.match().
+        """
+
+        return [record for record in compress(self, self._matched_mask()) if not record._non_matching_expressions]
+
+    def _position(self, record: HarvestRecord) -> int or None:
+        """
+        Returns the position of a record in the record set, or None if the record is not part of it.
+
+        :param record: The record to find
+        """
+
+        positions = self._positions
+        position = positions.get(id(record)) if positions is not None else None
+
+        # The cached positions are rebuilt if they are missing or stale, such as after the list was modified directly
+        if position is None or position >= len(self) or self[position] is not record:
+            self._positions = positions = {id(r): p for p, r in enumerate(self)}
+            position = positions.get(id(record))
+
+        return position
+
+    def _reorder_matches(self, positions: List[int]) -> None:
+        """
+        Rearranges the match bitmaps after the records were reordered, removed, or repeated.
+
+        :param positions: For each new record, the position of the record it came from
+        """
+
+        self.match_bitmaps = [
+            bytearray(bitmap[position] if position < len(bitmap) else 1 for position in positions)
+            for bitmap in self._match_bitmaps()
+        ]
+
+        if self.limit_bitmap is not None:
+            self.limit_bitmap = self.match_bitmaps.pop()
+
+        self._positions = None
+
+    def join(self, other: 'HarvestRecordSet', fields: List[str] or str,
+             join_type: Literal['inner', 'left', 'right', 'outer'] = 'inner') -> 'HarvestRecordSet':
+        """
+        Join this record set (the left side) with another record set (the right side) on one or more fields. A hash
+        table is built over the smaller side and probed with the records of the larger side, so the join takes
+        O(n + m) rather than comparing every pair of records. A hash index created with create_index() on the same
+        fields is used as the hash table instead of building one.
+
+        Joined records contain the keys of both records; the values of the right record are kept when both records have
+        the same key. Records with a missing or None join field do not match any record. Join fields with values which
+        cannot be hashed, such as lists and dictionaries, are joined with sorting.merge_join() instead, which compares
+        them by their repr() and produces the joined records in the order of the join fields.
+
+        :param other: The record set on the right side of the join
+        :param fields: The field or fields to join on
+        :param join_type: 'inner' (the default) keeps joined records only, 'left' and 'right' also keep the unmatched
+        records of that side, and 'outer' keeps the unmatched records of both sides
+        :return: A new record set containing the joined records
+        """
+
+        if join_type not in ('inner', 'left', 'right', 'outer'):
+            raise ValueError(f'Invalid join type: {join_type}')
+
+        from .flattening import field_getter
+
+        fields = (fields, ) if isinstance(fields, str) else tuple(fields)
+        getters = [field_getter(field) for field in fields]
+
+        # The hash table is built over the smaller side
+        build_left = len(self) < len(other)
+        build, probe = (self, other) if build_left else (other, self)
+
+        keep_build = join_type in ('outer', 'left' if build_left else 'right')
+        keep_probe = join_type in ('outer', 'right' if build_left else 'left')
+
+        records = []
+        matched = set()
+
+        try:
+            table = build._join_table(fields)
+
+            for record in probe:
+                key = tuple(get_value(record) for get_value in getters)
+                bucket = table.get(key) if None not in key else None
+
+                if bucket:
+                    if build_left:
+                        records.extend({**build_record, **record} for build_record in bucket)
+
+                    else:
+                        records.extend({**record, **build_record} for build_record in bucket)
+
+                    if keep_build:
+                        matched.update(map(id, bucket))
+
+                elif keep_probe:
+                    records.append(dict(record))
+
+        except TypeError:
+            # A join field value cannot be hashed, so the records are joined by their sort keys as they are when a
+            # join is spilled (see HarvestRecordSets.join())
+            from .sorting import merge_join
+
+            return HarvestRecordSet(data=merge_join(self, other, fields=fields, join_type=join_type,
+                                                    run_size=len(self) + len(other) + 1))
+
+        if keep_build:
+            records.extend(dict(record) for record in build if id(record) not in matched)
+
+        return HarvestRecordSet(data=records)
+
+    def _join_table(self, fields: tuple) -> dict:
+        """
+        Returns a hash table mapping the values of fields to the records with those values, reusing a hash index over
+        the same fields when there is one.
+
+        :param fields: The fields to build the table on
+        """
+
+        for index in self.indexes.values():
+            if index.index_type == 'hash' and index.fields == fields:
+                return index
+
+        from .flattening import field_getter
+
+        getters = [field_getter(field) for field in fields]
+
+        table = {}
+        for record in self:
+            key = tuple(get_value(record) for get_value in getters)
+
+            if None not in key:
+                table.setdefault(key, []).append(record)
+
+        return table
+
+    def limit(self, count: int) -> 'HarvestRecordSet':
+        """
+        Keep the first count records of the record set. See add_match() for stopping matches early when only the first
+        matched records are kept.
+
+        :param count: The number of records to keep
+        """
+
+        if count < 0:
+            raise ValueError('count must not be negative')
+
+        return self._keep_positions(list(range(min(count, len(self)))))
+
+    def _keep_positions(self, positions: List[int]) -> 'HarvestRecordSet':
+        """
+        Keep the records at the given positions, in the given order, and remove every other record. Match results move
+        with their records.
+
+        :param positions: The positions of the records to keep, each at most once
+        """
+
+        if len(positions) < len(self):
+            kept = set(positions)
+            removed = [record for position, record in enumerate(self) if position not in kept]
+
+        else:
+            removed = []
+
+        super().__setitem__(slice(None), [self[position] for position in positions])
+        self._reorder_matches(positions)
+
+        if removed:
+            self._uncount_keys(removed)
+
+            for index in self.indexes.values():
+                index.evict_records(removed)
+
+        return self
 
     def modify_records(self, function: str, arguments: dict) -> 'HarvestRecordSet':
         """
@@ -147,35 +956,50 @@ class HarvestRecordSet(List[HarvestRecord]):
 
         [getattr(record, function)(**arguments) for record in self]
 
-        self.rebuild_indexes()
-
-        return self
+        return self.records_modified()
 
     def rebuild_indexes(self):
         """
         Rebuild all indexes for the record set.
         """
 
+        index_types = {index_name: index.index_type for index_name, index in self.indexes.items()}
+
         self.indexes.clear()
         for index_name, fields in self.index_fields.items():
-            self.create_index(index_name, *fields)
+            self.create_index(index_name, *fields, index_type=index_types.get(index_name, 'hash'))
 
         return self
 
-    def remove_duplicates(self) -> 'HarvestRecordSet':
+    def remove_duplicates(self, keys: List[str] = None, deduplicator=None) -> 'HarvestRecordSet':
         """
-        Remove duplicate records from the record set.
+        Remove duplicate records from the record set, keeping the first copy of each record. Records are compared by a
+        fingerprint of their nested structure and values (see deduplication.fingerprint()), so records containing lists
+        and dictionaries are supported.
+
+        :param keys: When provided, records are compared on these keys only
+        :param deduplicator: A deduplication.HarvestDeduplicator which remembers the records seen by earlier calls, such
+        as when deduplicating the chunks of a stream; keys is ignored when provided
         """
 
-        unique_records = {
-            frozenset(record.items()): record
-            for record in self
-        }
+        from .deduplication import HarvestDeduplicator
 
-        self.clear()
-        self.add(data=list(unique_records.values()))
+        if deduplicator is None:
+            deduplicator = HarvestDeduplicator(keys=keys)
+
+        is_duplicate = deduplicator.is_duplicate
 
-        self.rebuild_indexes()
+        unique_positions = []
+        duplicate_records = []
+        for position, record in enumerate(self):
+            if is_duplicate(record):
+                duplicate_records.append(record)
+
+            else:
+                unique_positions.append(position)
+
+        if duplicate_records:
+            self._keep_positions(unique_positions)
 
         return self
 
@@ -184,44 +1008,227 @@ class HarvestRecordSet(List[HarvestRecord]):
         Remove all records in the record set that are not a match.
         """
 
-        self[:] = [
-            record for record in self
-            if record.is_matched_record
-        ]
+        matched_records = self._matched_records()
+
+        matched_ids = {id(record) for record in matched_records}
+        unmatched_records = [record for record in self if id(record) not in matched_ids]
+
+        super().__setitem__(slice(None), matched_records)
+        self._uncount_keys(unmatched_records)
+
+        # Every remaining record satisfied the matches
+        self.match_bitmaps = [bytearray(b'\x01') * len(self) for bitmap in self.match_bitmaps]
+        self.limit_bitmap = None
+        self._positions = None
 
-        self.rebuild_indexes()
+        for index in self.indexes.values():
+            index.evict_records(unmatched_records)
 
         return self
 
-    def unwind(self, source_key: str, preserve_null_and_empty_keys: bool = True) -> 'HarvestRecordSet':
+    def skip(self, count: int) -> 'HarvestRecordSet':
         """
-        Unwind a list of records in the record set into separate records.
+        Remove the first count records of the record set.
 
-        :param source_key: The key of the list to unwind
-        :param preserve_null_and_empty_keys: Whether to preserve keys with null or empty values, defaults to True
+        :param count: The number of records to remove
         """
 
-        new_records = []
+        if count < 0:
+            raise ValueError('count must not be negative')
+
+        return self._keep_positions(list(range(min(count, len(self)), len(self))))
+
+    def sort(self, fields: List[str or dict] or str or dict = None, key=None, reverse: bool = False) -> 'HarvestRecordSet':
+        """
+        Sort the records by one or more fields. Each field is sorted in ascending order unless it is given as a
+        dictionary of the field and its direction, such as {'Size': 'desc'}. The sort key of each field is computed once
+        per record and values of different types are ordered by sorting.sort_key(), so records with missing fields sort
+        first. The sort is stable and match results move with their records.
+
+        Without fields, the records are sorted like a list, by key.
+
+        :param fields: The field or fields to sort by, defaults to None
+        :param key: A function which returns the value to sort a record by when no fields are provided, defaults to None
+        :param reverse: When True, the direction of every field is reversed, defaults to False
+        """
+
+        from .sorting import sort_positions
+
+        if fields is None:
+            get_key = self.__getitem__ if key is None else lambda position: key(self[position])
+            positions = sorted(range(len(self)), key=get_key, reverse=reverse)
+
+        else:
+            positions = sort_positions(self, fields, reverse=reverse)
+
+        return self._keep_positions(positions)
+
+    def to_flat_records(self, keys: List[str] = None, separator: str = '.') -> List[dict]:
+        """
+        Returns a flattened copy of each record without modifying the records. When keys are provided, only those
+        flattened keys are read from each record (see flattening.HarvestFlatView), so the rest of a wide record is never
+        flattened.
+
+        :param keys: The flattened keys to include; missing keys are None, defaults to every key
+        :param separator: the separator to use when flattening, defaults to '.'
+        """
+
+        from .flattening import field_getter, get_flattener
+
+        if keys is None:
+            flatten = get_flattener(separator).flatten
+
+            return [dict(record) if record.is_flat else flatten(record) for record in self]
+
+        getters = [(key, field_getter(key, separator)) for key in keys]
+
+        return [{key: get_value(record) for key, get_value in getters} for record in self]
+
+    def top_k(self, fields: List[str or dict] or str or dict, count: int, reverse: bool = False) -> 'HarvestRecordSet':
+        """
+        Keep the first count records in the order sort() would produce and remove every other record. Only the records which
+        can be among the first count records, found with a heap on the first field, are sorted.
+
+        :param fields: The field or fields to sort by, as accepted by sort()
+        :param count: The number of records to keep
+        :param reverse: When True, the direction of every field is reversed, defaults to False
+        """
+
+        from .sorting import top_positions
+
+        if count < 0:
+            raise ValueError('count must not be negative')
+
+        return self._keep_positions(top_positions(self, fields, count, reverse=reverse))
+
+    def unflatten(self, separator: str = '.') -> 'HarvestRecordSet':
+        """
+        Unflatten every flat record. See flatten().
+
+        :param separator: the separator to use when unflattening, defaults to '.'
+        """
+
+        return self._reshape_records(separator=separator, flat=False)
+
+    def _reshape_records(self, separator: str, flat: bool) -> 'HarvestRecordSet':
+        """
+        Flattens or unflattens each record in place whose is_flat is not already flat.
+        """
+
+        from .flattening import get_flattener
+
+        flattener = get_flattener(separator)
+        reshape = flattener.flatten_record if flat else flattener.unflatten_record
+
+        modified = False
         for record in self:
-            if source_key not in record and preserve_null_and_empty_keys is False:
-                continue
+            if record.is_flat is not flat:
+                reshape(record)
+
+                record.is_flat = flat
+                modified = True
+
+        return self.records_modified() if modified else self
+
+    def iter_unwind(self, source_keys: List[str] or str, preserve_null_and_empty_keys: bool = True) -> Iterator[HarvestRecord]:
+        """
+        Yield the records unwind() would produce, one at a time, without modifying the record set. See unwind().
 
-            elif isinstance(record[source_key], (list or tuple)):
-                for item in record[source_key]:
-                    new_record = record.copy()
-                    new_record[source_key] = item
-                    new_records.append(new_record)
+        :param source_keys: The key, or keys, of the lists to unwind
+        :param preserve_null_and_empty_keys: Whether to preserve records which do not contain a key, defaults to True
+        """
+
+        return (record for position, record in self._unwind_records(source_keys, preserve_null_and_empty_keys))
+
+    def _unwind_records(self, source_keys: List[str] or str, preserve_null_and_empty_keys: bool) -> Iterator[Tuple[int, HarvestRecord]]:
+        """
+        Yield the position of each record and the records unwound from it.
+        """
+
+        source_keys = (source_keys, ) if isinstance(source_keys, str) else tuple(source_keys)
+
+        for position, record in enumerate(self):
+            lists = []
+            for source_key in source_keys:
+                if source_key not in record:
+                    if not preserve_null_and_empty_keys:
+                        break
+
+                    continue
+
+                value = record[source_key]
+                if isinstance(value, (list, tuple)):
+                    lists.append([(source_key, item) for item in value])
 
             else:
-                new_records.append(record)
+                if not lists:
+                    yield position, record
+                    continue
 
-        self.clear()
-        self.add(data=new_records)
+                # Unwound records share one copy of the record's other keys and only store the unwound values. Records
+                # which were already unwound share the copy they were unwound from.
+                if isinstance(record, HarvestOverlayRecord) and record._base is not None:
+                    base, own = record._base, list(dict.items(record))
+
+                else:
+                    base, own = dict(record.items()), ()
+
+                for values in product(*lists):
+                    child = HarvestOverlayRecord(base, recordset=self, is_flat=record.is_flat)
+                    dict.update(child, own)
+                    dict.update(child, values)
+
+                    yield position, child
+
+    def unwind(self, source_key: List[str] or str, preserve_null_and_empty_keys: bool = True) -> 'HarvestRecordSet':
+        """
+        Unwind a list of records in the record set into separate records. When several keys are provided, they are
+        unwound in a single pass and each combination of their values becomes a record, as if each key was unwound in
+        turn.
+
+        Unwound records are HarvestOverlayRecords: the records unwound from the same record share a single copy of its
+        other keys and only store the unwound values.
+
+        :param source_key: The key, or keys, of the lists to unwind
+        :param preserve_null_and_empty_keys: Whether to preserve records which do not contain a key, defaults to True
+        """
+
+        new_records = []
+        new_positions = []
+        for position, record in self._unwind_records(source_key, preserve_null_and_empty_keys):
+            new_records.append(record)
+            new_positions.append(position)
+
+        # Unwound records have the same keys as the record they came from, so keys are counted once per record
+        key_catalog = Counter()
+        for position, count in Counter(new_positions).items():
+            for key in self[position]:
+                key_catalog[key] += count
+
+        # Unwound records inherit the match results of the record they came from
+        self._reorder_matches(new_positions)
+        bitmaps, limit_bitmap = self.match_bitmaps, self.limit_bitmap
+        self.match_bitmaps, self.limit_bitmap = [], None
+
+        super().clear()
+        self._key_catalog_stale = True
+
+        for index in self.indexes.values():
+            index.clear()
+
+        self.add_many(data=new_records)
+        self.match_bitmaps, self.limit_bitmap = bitmaps, limit_bitmap
+
+        self._key_catalog = key_catalog
+        self._key_catalog_stale = False
 
         return self
 
 
 class HarvestRecordSets(Dict[str, HarvestRecordSet]):
+    # Joins and sorts of more records than this spill sorted runs of this many keys to temporary files and merge them,
+    # rather than building hash tables and sorting in memory. May be changed on an instance.
+    spill_threshold = 1000000
 
     def add(self, recordset_name: str, recordset: HarvestRecordSet) -> 'HarvestRecordSets':
         self[recordset_name] = recordset
@@ -233,50 +1240,57 @@ class HarvestRecordSets(Dict[str, HarvestRecordSet]):
 
         return self
 
-    # TODO: implement join() of two or more HarvestRecordSets
-    # def join(self, new_recordset_name: str, recordset_names: List[str], index_name: str,
-    #          join_type: Literal['inner', 'outer', 'left', 'right']) -> 'HarvestRecordSets':
-    #
-    #     # Retrieve the recordsets
-    #     recordsets = [self[recordset_name] for recordset_name in recordset_names]
-    #
-    #     # Retrieve the indexes
-    #     indexes = [recordset.indexes[index_name] for recordset in recordsets if recordset.indexes.get(index_name)]
-    #
-    #     # Perform the join operation
-    #     match join_type:
-    #         case 'inner':
-    #             joined_data = []
-    #             for index in indexes:
-    #                 joined_data.extend(index)
-    #
-    #
-    #         case 'outer':
-    #             joined_data = set.union(*map(set, indexes))
-    #
-    #         case 'left':
-    #             joined_data = set(indexes[0]).union(*indexes[1:])
-    #
-    #         case 'right':
-    #             joined_data = set(indexes[-1]).union(*indexes[:-1])
-    #
-    #         case _:
-    #             raise ValueError('Invalid join type')
-    #
-    #     # Create a new recordset with the joined data
-    #     new_recordset = HarvestRecordSet(data=joined_data)
-    #
-    #     # Add the new recordset to the dictionary
-    #     self[new_recordset_name] = new_recordset
-    #
-    #     return self
+    def join(self, new_recordset_name: str, recordset_names: List[str], fields: List[str] or str,
+             join_type: Literal['inner', 'left', 'right', 'outer'] = 'inner') -> 'HarvestRecordSets':
+        """
+        Join two or more record sets on one or more fields and store the result as a new record set. Record sets are
+        joined from left to right, so the first record set is the left side of the first join and each following record
+        set is the right side of a join with the result so far. See HarvestRecordSet.join().
+
+        When the two sides of a join have more than spill_threshold records combined, a sort-merge join is used instead
+        of a hash join: the records of both sides are sorted on the join fields in runs which are spilled to temporary
+        files and merged, so no hash table is built, and the joined records are ordered by the join fields. This does
+        not reduce the memory used by the records: the record sets being joined stay in this collection and the joined
+        records are collected into the new record set, so every input and output record is held in memory. To join
+        records which do not fit in memory, pass iterators of records to sorting.merge_join() and consume the joined
+        records as they are produced.
+
+        :param new_recordset_name: The name of the new record set
+        :param recordset_names: The names of the record sets to join, in order
+        :param fields: The field or fields to join on
+        :param join_type: 'inner', 'left', 'right', or 'outer'
+        """
+
+        if len(recordset_names) < 2:
+            raise ValueError('At least two record sets are required for a join')
+
+        from .sorting import merge_join
+
+        merge_fields = (fields, ) if isinstance(fields, str) else tuple(fields)
+
+        result = self[recordset_names[0]]
+        for recordset_name in recordset_names[1:]:
+            other = self[recordset_name]
+
+            if len(result) + len(other) > self.spill_threshold:
+                result = HarvestRecordSet().add_many(data=merge_join(result, other, fields=merge_fields,
+                                                                     join_type=join_type,
+                                                                     run_size=self.spill_threshold))
+
+            else:
+                result = result.join(other, fields=fields, join_type=join_type)
+
+        result.name = new_recordset_name
+        self[new_recordset_name] = result
+
+        return self
 
     def list(self) -> List[dict]:
         return [
             {
                 'Name': name,
                 'Keys': '\n'.join(recordset.keys),
-                'Matches': len(recordset.get_matched_records()),
+                'Matches': recordset.count_matched_records(),
                 'Total': len(recordset)
             }
             for name, recordset in self.items()
@@ -299,9 +1313,37 @@ class HarvestRecordSets(Dict[str, HarvestRecordSet]):
 
         return self
 
+    def sort(self, recordset_name: str, fields: List[str] or str, reverse: bool = False) -> 'HarvestRecordSets':
+        """
+        Sort a record set in place by one or more fields. Values of different types are ordered by
+        sorting.sort_key(), so records with missing fields sort first. Match results move with their records.
+
+        For record sets with more than spill_threshold records, the (sort key, position) pairs are sorted in runs which
+        are spilled to temporary files and merged, which bounds the memory used by the sort keys. Only the keys are
+        spilled: the records are sorted in place, so they stay in memory.
+
+        :param recordset_name: The name of the record set to sort
+        :param fields: The field or fields to sort by
+        :param reverse: When True, records are sorted in descending order
+        """
+
+        from operator import itemgetter
+        from .sorting import external_sort, record_sort_key
+
+        recordset = self[recordset_name]
+        fields = (fields, ) if isinstance(fields, str) else tuple(fields)
+
+        keys = ((record_sort_key(record, fields), position) for position, record in enumerate(recordset))
+        positions = [position for key, position in external_sort(keys, run_size=self.spill_threshold,
+                                                                 key=itemgetter(0), reverse=reverse)]
+
+        recordset._keep_positions(positions)
+
+        return self
+
     def union(self, new_recordset_name: str, recordset_names: List[str]) -> 'HarvestRecordSets':
         new_recordset = HarvestRecordSet()
-        [new_recordset.add(data=self[recordset_name]) for recordset_name in recordset_names]
+        new_recordset.add_many(data=(record for recordset_name in recordset_names for record in self[recordset_name]))
 
         self[new_recordset_name] = new_recordset
 
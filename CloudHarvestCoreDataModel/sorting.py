@@ -0,0 +1,349 @@
+from datetime import datetime
+from typing import Any, Callable, Iterable, Iterator, List, Literal, Sequence, Tuple
+from .flattening import field_values, get_path
+
+# Values of different types are ordered by rank first so that any two values can be compared. Booleans and numbers share
+# a rank, as they do when records are matched or joined (True == 1 == 1.0).
+_RANK_NONE = 0
+_RANK_NUMBER = 1
+_RANK_NAN = 2
+_RANK_STR = 3
+_RANK_DATETIME = 4
+_RANK_DATETIME_NAIVE = 5
+_RANK_OTHER = 6
+
+# Values of these types are compared directly by sort_column(), as they order the same way as their sort_key()
+_NUMBER_TYPES = frozenset((bool, int, float))
+
+# The number of items written to a spilled run with each call to pickle.dump()
+_SPILL_BATCH_SIZE = 1024
+
+
+def sort_key(value: Any) -> tuple:
+    """
+    Returns a key which orders values of any type. None sorts first, followed by booleans and numbers, NaN, strings,
+    timezone-aware datetimes, naive datetimes, and finally every other value ordered by its repr().
+
+    Args:
+        value (Any): The value to build a key for.
+
+    Returns:
+        tuple: A (rank, value) tuple.
+    """
+
+    if value is None:
+        return _RANK_NONE, 0
+
+    if isinstance(value, (bool, int, float)):
+        # NaN is not equal to itself, so it would break the ordering of the values around it
+        if value != value:
+            return _RANK_NAN, 0
+
+        return _RANK_NUMBER, value
+
+    if isinstance(value, str):
+        return _RANK_STR, value
+
+    if isinstance(value, datetime):
+        return (_RANK_DATETIME_NAIVE, value) if value.tzinfo is None else (_RANK_DATETIME, value)
+
+    return _RANK_OTHER, repr(value)
+
+
+def record_sort_key(record: dict, fields: Sequence[str]) -> tuple:
+    """
+    Returns the sort_key() of each field of a record. Missing fields are treated as None and flattened fields are resolved
+    against nested records (see flattening.get_path()).
+
+    Args:
+        record (dict): The record to build a key for.
+        fields (Sequence[str]): The fields to include in the key.
+    """
+
+    return tuple(sort_key(get_path(record, field)) for field in fields)
+
+
+def parse_sort_fields(fields: Any) -> List[Tuple[str, bool]]:
+    """
+    Returns the field and direction of each sort field. A field is either a field name, which is sorted in ascending
+    order, or a dictionary of field names and their direction ('asc' or 'desc'), such as {'Size': 'desc'}.
+
+    Args:
+        fields (Any): A field, or a list of fields, to sort by.
+
+    Returns:
+        List[Tuple[str, bool]]: (field, descending) tuples, from the most to the least significant field.
+
+    Raises:
+        ValueError: When a direction is not 'asc' or 'desc'.
+    """
+
+    if isinstance(fields, (str, dict)):
+        fields = [fields]
+
+    result = []
+    for field in fields:
+        if isinstance(field, dict):
+            for name, direction in field.items():
+                if direction not in ('asc', 'desc'):
+                    raise ValueError(f"Invalid sort direction for '{name}': {direction}. Expected 'asc' or 'desc'")
+
+                result.append((name, direction == 'desc'))
+
+        else:
+            result.append((field, False))
+
+    return result
+
+
+def sort_positions(records: Sequence[dict], fields: Any, reverse: bool = False) -> List[int]:
+    """
+    Returns the positions of records in sorted order. The sort key of each field is computed once per record, then the
+    positions are sorted by each field in turn, from the least to the most significant field. Each sort is stable, so
+    fields may be sorted in different directions and records which are equal on every field keep their order.
+
+    Args:
+        records (Sequence[dict]): The records to sort.
+        fields (Any): The fields to sort by, as accepted by parse_sort_fields().
+        reverse (bool, optional): When True, the direction of every field is reversed. Defaults to False.
+
+    Returns:
+        List[int]: The positions of the records, in sorted order.
+    """
+
+    positions = list(range(len(records)))
+
+    for field, descending in reversed(parse_sort_fields(fields)):
+        positions.sort(key=sort_column(records, field).__getitem__, reverse=descending != reverse)
+
+    return positions
+
+
+def top_positions(records: Sequence[dict], fields: Any, count: int, reverse: bool = False) -> List[int]:
+    """
+    Returns the positions of the first count records in sorted order, as sort_positions()[:count] would, without
+    sorting every record. A heap of count values finds the count-th value of the most significant field, and only the
+    records which do not sort after that value are sorted.
+
+    Args:
+        records (Sequence[dict]): The records to sort.
+        fields (Any): The fields to sort by, as accepted by parse_sort_fields().
+        count (int): The number of positions to return.
+        reverse (bool, optional): When True, the direction of every field is reversed. Defaults to False.
+
+    Returns:
+        List[int]: The positions of the first count records, in sorted order.
+    """
+
+    from heapq import nlargest, nsmallest
+    from itertools import compress, repeat
+    from operator import ge, le
+
+    if count <= 0:
+        return []
+
+    if count >= len(records):
+        return sort_positions(records, fields, reverse=reverse)
+
+    field, descending = parse_sort_fields(fields)[0]
+    descending = descending != reverse
+
+    column = sort_column(records, field)
+    threshold = (nlargest if descending else nsmallest)(count, column)[-1]
+
+    # Every record in the result is a candidate, including every record tied with the threshold
+    candidates = list(compress(range(len(records)), map(ge if descending else le, column, repeat(threshold))))
+    subset = [records[position] for position in candidates]
+
+    return [candidates[position] for position in sort_positions(subset, fields, reverse=reverse)[:count]]
+
+
+def sort_column(records: Sequence[dict], field: str) -> list:
+    """
+    Returns a value for each record which orders the records by a field. When every value is a string, or every value
+    is a number other than NaN, the values are compared directly. Otherwise, the values are converted with sort_key().
+
+    Args:
+        records (Sequence[dict]): The records to read.
+        field (str): The field to read. Flattened fields are resolved against nested records.
+    """
+
+    values = field_values(records, field)
+    types = set(map(type, values))
+
+    if types == {str}:
+        return values
+
+    if types and types <= _NUMBER_TYPES and (float not in types or all(value == value for value in values)):
+        return values
+
+    return list(map(sort_key, values))
+
+
+def external_sort(items: Iterable, run_size: int, key: Callable = None, reverse: bool = False) -> Iterator:
+    """
+    Sorts items which may not fit in memory. Items are read run_size at a time; when there is more than one run, each
+    sorted run is spilled to a temporary file and the runs are combined with a k-way merge. When every item fits in a
+    single run, the items are sorted in memory. The sort is stable.
+
+    Args:
+        items (Iterable): The items to sort. Items must be picklable when more than run_size items are sorted.
+        run_size (int): The largest number of items sorted in memory at once.
+        key (Callable, optional): A function which returns the value to sort an item by. Defaults to None.
+        reverse (bool, optional): When True, items are sorted in descending order. Defaults to False.
+
+    Yields:
+        The items in sorted order.
+    """
+
+    from heapq import merge
+    from itertools import islice
+
+    if run_size < 1:
+        raise ValueError('run_size must be greater than zero')
+
+    iterator = iter(items)
+
+    run = list(islice(iterator, run_size))
+    if len(run) < run_size:
+        run.sort(key=key, reverse=reverse)
+        yield from run
+
+        return
+
+    runs = []
+    try:
+        while run:
+            run.sort(key=key, reverse=reverse)
+            runs.append(_spill(run))
+
+            run = list(islice(iterator, run_size))
+
+        yield from merge(*map(_read_run, runs), key=key, reverse=reverse)
+
+    finally:
+        for file in runs:
+            file.close()
+
+
+def _spill(items: list):
+    """
+    Writes items to a temporary file, which is removed when it is closed.
+    """
+
+    from pickle import dump, HIGHEST_PROTOCOL
+    from tempfile import TemporaryFile
+
+    file = TemporaryFile()
+
+    for start in range(0, len(items), _SPILL_BATCH_SIZE):
+        dump(items[start:start + _SPILL_BATCH_SIZE], file, protocol=HIGHEST_PROTOCOL)
+
+    return file
+
+
+def _read_run(file) -> Iterator:
+    """
+    Yields the items written to a temporary file by _spill().
+    """
+
+    from pickle import load
+
+    file.seek(0)
+
+    while True:
+        try:
+            batch = load(file)
+
+        except EOFError:
+            return
+
+        yield from batch
+
+
+def merge_join(left: Iterable[dict],
+               right: Iterable[dict],
+               fields: Sequence[str],
+               join_type: Literal['inner', 'left', 'right', 'outer'] = 'inner',
+               run_size: int = 1000000) -> Iterator[dict]:
+    """
+    Joins two iterables of records with a sort-merge join. Each side is read once and its (key, record) pairs are sorted
+    on the join fields with external_sort(), which spills runs of run_size records to temporary files, then the sorted
+    sides are merged and the joined records are produced lazily.
+
+    Memory is only bounded when both sides are iterators, such as generators reading from a file, and the joined
+    records are consumed as they are produced rather than collected. Then at most run_size records are held while a
+    side is sorted and, while the sides are merged, one batch of records per spilled run and the records of the current
+    join key on each side. Sequences such as record sets are held in memory by their owner regardless.
+
+    Joined records are produced in the order of the join fields and follow the same rules as HarvestRecordSet.join():
+    the values of the right record are kept when both records have the same key, and missing or None join fields do not
+    match any record. Values which cannot be hashed, such as lists and dictionaries, are compared by their repr(), as
+    sort_key() orders them.
+
+    Args:
+        left (Iterable[dict]): The records on the left side of the join.
+        right (Iterable[dict]): The records on the right side of the join.
+        fields (Sequence[str]): The fields to join on.
+        join_type (str, optional): 'inner' (the default), 'left', 'right', or 'outer'.
+        run_size (int, optional): The largest number of records of each side sorted in memory at once. Records must be
+            picklable when a side has more than run_size records. Defaults to 1000000.
+
+    Yields:
+        dict: The joined records.
+    """
+
+    from itertools import groupby
+    from operator import itemgetter
+
+    if join_type not in ('inner', 'left', 'right', 'outer'):
+        raise ValueError(f'Invalid join type: {join_type}')
+
+    keep_left = join_type in ('left', 'outer')
+    keep_right = join_type in ('right', 'outer')
+
+    first = itemgetter(0)
+
+    def sorted_groups(records: Iterable[dict]) -> Iterator[Tuple[tuple, List[dict]]]:
+        keyed = ((record_sort_key(record, fields), record) for record in records)
+
+        for key, group in groupby(external_sort(keyed, run_size=run_size, key=first), key=first):
+            yield key, [record for key, record in group]
+
+    def joinable(key: tuple) -> bool:
+        return all(rank != _RANK_NONE for rank, value in key)
+
+    left_groups = sorted_groups(left)
+    right_groups = sorted_groups(right)
+
+    left_group = next(left_groups, None)
+    right_group = next(right_groups, None)
+
+    while left_group is not None or right_group is not None:
+        if right_group is None or (left_group is not None and left_group[0] < right_group[0]):
+            if keep_left:
+                yield from map(dict, left_group[1])
+
+            left_group = next(left_groups, None)
+
+        elif left_group is None or right_group[0] < left_group[0]:
+            if keep_right:
+                yield from map(dict, right_group[1])
+
+            right_group = next(right_groups, None)
+
+        else:
+            if joinable(left_group[0]):
+                for left_record in left_group[1]:
+                    for right_record in right_group[1]:
+                        yield {**left_record, **right_record}
+
+            else:
+                if keep_left:
+                    yield from map(dict, left_group[1])
+
+                if keep_right:
+                    yield from map(dict, right_group[1])
+
+            left_group = next(left_groups, None)
+            right_group = next(right_groups, None)
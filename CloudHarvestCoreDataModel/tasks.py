@@ -20,18 +20,24 @@ class HarvestRecordSetTask(BaseTask):
         >>>         }
         >>>     }
         >>> ]
+        workers (int): The number of worker processes used for record stages. None or 1 runs them in this process.
+        chunk_size (int): The number of records sent to a worker process at a time, and the number of records in each chunk when streaming.
+        streaming (bool): When True, records are read from the task chain variable in chunks and the result is a generator of records.
 
     Methods:
         method(): Executes the function on the record set with the provided arguments and stores the result in the data attribute.
     """
 
-    def __init__(self, recordset_name: HarvestRecordSet, stages: List[dict], *args, **kwargs):
+    def __init__(self, recordset_name: HarvestRecordSet, stages: List[dict], *args, workers: int = None, chunk_size: int = 10000, streaming: bool = False, **kwargs):
         """
         Constructs a new HarvestRecordSetTask instance.
 
         Args:
             recordset_name (HarvestRecordSet): The name of the record set this task operates on.
             stages (List[dict]): A list of dictionaries containing the function name and arguments to be applied to the recordset.
+            workers (int, optional): The number of worker processes used for record stages. Defaults to None, which runs every stage in this process.
+            chunk_size (int, optional): The number of records sent to a worker process at a time, and the number of records in each chunk when streaming. Defaults to 10000.
+            streaming (bool, optional): When True, records are read from the task chain variable, which may be any iterable such as a generator, in chunks of chunk_size records. Defaults to False.
             *args: Variable length argument list.
             **kwargs: Arbitrary keyword arguments.
         """
@@ -39,6 +45,9 @@ class HarvestRecordSetTask(BaseTask):
 
         self.recordset_name = recordset_name
         self.stages = stages
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.streaming = streaming
         self.position = 0
 
     def method(self):
@@ -47,43 +56,47 @@ class HarvestRecordSetTask(BaseTask):
 
         This method iterates over the `stages` defined for this task. For each stage, it retrieves the function and its arguments.
         It then checks if the function is a method of the HarvestRecordSet or HarvestRecord class. If it is, it applies the function to the record set or each record in the record set, respectively.
-        If the function is not a method of either class, it raises an AttributeError.
+        Consecutive HarvestRecord stages are fused so the whole chain is applied to each record in a single pass; HarvestRecordSet stages run once every stage before them has completed.
+        If the function is not a method of either class, it raises an AttributeError before any stage is run.
 
         The result of applying the function is stored in the data attribute of the HarvestRecordSetTask instance.
+        When streaming, the data attribute is a generator which applies the stages to each chunk of records as it is consumed. Stages which need the whole record set, such as create_index, collect the stream before they run.
 
         Returns:
             self: Returns the instance of the HarvestRecordSetTask.
         """
 
-        from .record import HarvestRecord
-        from .recordset import HarvestRecordSet
+        from .pipeline import HarvestRecordSetPipeline
 
         # Get the recordset from the task chain variables
         recordset = self.task_chain.get_variables_by_names(self.recordset_name).get(self.recordset_name)
 
-        for stage in self.stages:
-            # Record the position of stages completed
-            self.position += 1
-
-            # Each dictionary should only contain one key-value pair
-            for function, arguments in stage.items():
+        # Consecutive HarvestRecord stages are applied to each record in a single pass
+        pipeline = HarvestRecordSetPipeline(stages=self.stages, workers=self.workers, chunk_size=self.chunk_size)
 
-                # This is a HarvestRecordSet command
-                if hasattr(HarvestRecordSet, function):
-                    getattr(recordset, function)(**arguments or {})
+        if self.streaming:
+            self.data = self._stream(pipeline, recordset)
 
-                # This is a HarvestRecord command
-                elif hasattr(HarvestRecord, function):
-                    [
-                        getattr(record, function)(**arguments or {})
-                        for record in recordset
-                    ]
+            return self
 
-                else:
-                    raise AttributeError(f"Neither HarvestRecordSet nor HarvestRecord has a method named '{function}'")
+        try:
+            recordset = pipeline.run(recordset)
 
-                break
+        finally:
+            # Record the position of stages completed
+            self.position += pipeline.position
 
         self.data = recordset
 
         return self
+
+    def _stream(self, pipeline, records):
+        """
+        Yields the records produced by the pipeline and records the position of stages completed once the stream ends.
+        """
+
+        try:
+            yield from pipeline.stream(records)
+
+        finally:
+            self.position += pipeline.position
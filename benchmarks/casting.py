@@ -0,0 +1,119 @@
+"""
+Compares the casting and type inference functions in functions.py with the implementations they replaced.
+
+Usage:
+    PYTHONPATH=. python benchmarks/casting.py [count]
+"""
+
+import sys
+from datetime import datetime
+from timeit import timeit
+
+from CloudHarvestCoreDataModel import functions
+
+
+def legacy_cast(value, typeof):
+    """
+    cast() before version 0.3.0, which built its type mapping on every call.
+    """
+
+    type_mapping = {
+        'int': int,
+        'float': float,
+        'str': str,
+        'bool': bool,
+        'list': list,
+        'dict': dict,
+        'datetime.fromtimestamp': datetime.fromtimestamp,
+        'datetime.fromisoformat': datetime.fromisoformat
+    }
+
+    if typeof in type_mapping:
+        try:
+            if typeof == 'bool':
+                if value in (False, None, 'False', 'false', 'No', 'no'):
+                    result = False
+                else:
+                    result = True
+            else:
+                result = type_mapping[typeof](value)
+
+            return result
+
+        except (TypeError, ValueError):
+            return None
+
+    else:
+        return None
+
+
+def legacy_is_datetime(value):
+    try:
+        datetime.fromisoformat(value)
+        return True
+
+    except ValueError:
+        return False
+
+
+def legacy_is_number(value):
+    try:
+        int(value)
+        return True
+
+    except ValueError:
+        return False
+
+
+def legacy_infer_type(value):
+    """
+    The inference chain used by HarvestMatch before version 0.3.0.
+    """
+
+    if value in ('False', 'false', 'No', 'no', 'True', 'true', 'Yes', 'yes'):
+        return 'bool'
+
+    elif legacy_is_datetime(value):
+        return 'datetime'
+
+    elif value in (None, 'None', 'null'):
+        return 'null'
+
+    elif legacy_is_number(value):
+        return 'number'
+
+    return 'str'
+
+
+# Typical record values and match literals: identifiers, states, sizes, timestamps, and flags
+VALUES = ['i-0123456789abcdef0', 'running', '500', '2024-01-01T10:00:00+00:00', 'true', 'us-east-1', '12.5', 'null']
+
+
+def main(count: int):
+    column = [str(i % 1000) for i in range(count)]
+    values = VALUES * (count // len(VALUES))
+
+    cases = [
+        ('cast str->int', lambda: [legacy_cast(value, 'int') for value in column],
+                          lambda: [functions.cast(value, 'int') for value in column]),
+        ('cast column str->float', lambda: [legacy_cast(value, 'float') for value in column],
+                                   lambda: functions.cast_many(column, 'float')),
+        ('infer type', lambda: [legacy_infer_type(value) for value in values],
+                       lambda: [functions.infer_type(value) for value in values]),
+        ('is_datetime', lambda: [legacy_is_datetime(value) for value in values],
+                        lambda: [functions.is_datetime(value) for value in values]),
+        ('is_number', lambda: [legacy_is_number(value) for value in values],
+                      lambda: [functions.is_number(value) for value in values]),
+    ]
+
+    print(f'{"case":<24} {"legacy ms":>10} {"current ms":>11} {"speedup":>8}')
+
+    for name, legacy, current in cases:
+        legacy_time = timeit(legacy, number=3) / 3 * 1000
+        current_time = timeit(current, number=3) / 3 * 1000
+
+        print(f'{name:<24} {legacy_time:>10.1f} {current_time:>11.1f} {legacy_time / current_time:>7.2f}x')
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
@@ -0,0 +1,147 @@
+"""
+Compares HarvestRecordSet.flatten() and unflatten() with flattening each record through flatten_json, which
+HarvestRecord.flatten() and unflatten() used before version 0.3.0, and reading a few flattened keys with
+HarvestRecordSet.to_flat_records() with flattening every record first. The flatten_json functions are reproduced below
+so that the benchmark does not depend on the package.
+
+Usage:
+    PYTHONPATH=. python benchmarks/flattening.py [count ...]
+"""
+
+import sys
+from time import perf_counter
+
+from CloudHarvestCoreDataModel.recordset import HarvestRecordSet
+
+
+def legacy_flatten(nested_dict: dict, separator: str = '.') -> dict:
+    """
+    flatten_json.flatten(), which formats every key path of every record.
+    """
+
+    flattened_dict = dict()
+
+    def _construct_key(previous_key, new_key):
+        return f'{previous_key}{separator}{new_key}' if previous_key else new_key
+
+    def _flatten(object_, key):
+        if not object_:
+            flattened_dict[key] = object_
+
+        elif isinstance(object_, dict):
+            for object_key in object_:
+                _flatten(object_[object_key], _construct_key(key, object_key))
+
+        elif isinstance(object_, (list, set, tuple)):
+            for index, item in enumerate(object_):
+                _flatten(item, _construct_key(key, index))
+
+        else:
+            flattened_dict[key] = object_
+
+    _flatten(nested_dict, None)
+
+    return flattened_dict
+
+
+def legacy_unflatten_list(flat_dict: dict, separator: str = '.') -> dict:
+    """
+    flatten_json.unflatten_list(), which sorts the keys, splits each key twice, and then looks for list-like levels.
+    """
+
+    unflattened_dict = dict()
+
+    def _unflatten(dic, keys, value):
+        for key in keys[:-1]:
+            dic = dic.setdefault(key, {})
+
+        dic[keys[-1]] = value
+
+    list_keys = sorted(flat_dict.keys())
+    for i, item in enumerate(list_keys):
+        if i != len(list_keys) - 1:
+            split_key = item.split(separator)
+            next_split_key = list_keys[i + 1].split(separator)
+
+            if not split_key == next_split_key[:-1]:
+                _unflatten(unflattened_dict, item.split(separator), flat_dict[item])
+
+        else:
+            _unflatten(unflattened_dict, item.split(separator), flat_dict[item])
+
+    def _convert_dict_to_list(object_, parent_object, parent_object_key):
+        if isinstance(object_, dict):
+            for key in object_:
+                if isinstance(object_[key], dict):
+                    _convert_dict_to_list(object_[key], object_, key)
+
+            try:
+                keys = [int(key) for key in object_]
+                keys.sort()
+
+            except (ValueError, TypeError):
+                keys = []
+
+            keys_len = len(keys)
+
+            if keys_len > 0 and keys[0] == 0 and keys[-1] == keys_len - 1 and len(set(keys)) == keys_len:
+                parent_object[parent_object_key] = []
+
+                for key_index, key in enumerate(keys):
+                    parent_object[parent_object_key].append(object_[str(key)])
+                    _convert_dict_to_list(parent_object[parent_object_key][-1], parent_object[parent_object_key],
+                                          key_index)
+
+    _convert_dict_to_list(unflattened_dict, None, None)
+
+    return unflattened_dict
+
+
+def make_records(count: int) -> list:
+    # Records from a single describe_instances() response share a shape
+    return [
+        {'InstanceId': f'i-{i:017x}', 'State': {'Code': 16, 'Name': 'running'},
+         'Placement': {'AvailabilityZone': 'us-east-1a', 'Tenancy': 'default'},
+         'SecurityGroups': [{'GroupId': f'sg-{g}', 'GroupName': f'group-{g}'} for g in range(2)],
+         'Tags': [{'Key': f'Tag{t}', 'Value': f'value-{i}-{t}'} for t in range(5)]}
+        for i in range(count)
+    ]
+
+
+# The columns of a typical inventory listing
+SELECTED_KEYS = ['InstanceId', 'State.Name', 'Tags.0.Value']
+
+
+def measure(function, records) -> float:
+    start = perf_counter()
+    function(records)
+
+    return perf_counter() - start
+
+
+def main(counts: list):
+    print(f'{"records":>10} {"case":<10} {"legacy s":>9} {"current s":>10} {"speedup":>8}')
+
+    for count in counts:
+        legacy_records = make_records(count)
+        recordset = HarvestRecordSet(data=make_records(count))
+
+        legacy = measure(lambda records: [{key: flat.get(key) for key in SELECTED_KEYS}
+                                          for flat in map(legacy_flatten, records)], legacy_records)
+        current = measure(lambda records: records.to_flat_records(keys=SELECTED_KEYS), recordset)
+        print(f'{count:>10} {"select":<10} {legacy:>9.3f} {current:>10.3f} {legacy / current:>7.2f}x')
+
+        legacy = measure(lambda records: [legacy_flatten(record) for record in records], legacy_records)
+        current = measure(lambda records: records.flatten(), recordset)
+        print(f'{count:>10} {"flatten":<10} {legacy:>9.3f} {current:>10.3f} {legacy / current:>7.2f}x')
+
+        flat_records = [legacy_flatten(record) for record in legacy_records]
+        legacy = measure(lambda records: [legacy_unflatten_list(record) for record in records], flat_records)
+        current = measure(lambda records: records.unflatten(), recordset)
+
+        assert [dict(record) for record in recordset] == [legacy_unflatten_list(record) for record in flat_records]
+        print(f'{count:>10} {"unflatten":<10} {legacy:>9.3f} {current:>10.3f} {legacy / current:>7.2f}x')
+
+
+if __name__ == '__main__':
+    main([int(arg) for arg in sys.argv[1:]] or [20_000, 100_000])
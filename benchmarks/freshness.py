@@ -0,0 +1,79 @@
+"""
+Compares adding freshness record by record with HarvestRecordSet.add_freshness().
+
+Usage:
+    PYTHONPATH=. python benchmarks/freshness.py [count ...]
+"""
+
+import sys
+from datetime import datetime, timedelta, timezone
+from time import perf_counter
+
+from CloudHarvestCoreDataModel.functions import cast
+from CloudHarvestCoreDataModel.recordset import HarvestRecordSet
+
+
+def legacy_add_freshness(record: dict, fresh_range: int = 3600, aging_range: int = 43200) -> dict:
+    """
+    HarvestRecord.add_freshness() before version 0.3.0, which read the clock and parsed LastSeen for every record.
+    """
+
+    active = record.get('Harvest', {}).get('Dates', {}).get('Active') or record.get('Active')
+    last_seen = cast(value=record.get('Harvest', {}).get('Dates', {}).get('LastSeen') or record.get('LastSeen'),
+                     typeof='datetime.fromisoformat')
+
+    result = 'I'
+    if active and last_seen:
+        now = datetime.now(tz=timezone.utc)
+        age = (now - last_seen).total_seconds()
+
+        if age <= fresh_range:
+            result = 'F'
+
+        elif fresh_range > age > aging_range:
+            result = 'A'
+
+        elif age > aging_range:
+            result = 'S'
+
+        else:
+            result = 'E'
+
+    record['f'] = result
+
+    return record
+
+
+def make_recordset(count: int) -> HarvestRecordSet:
+    # Records from the same harvest share a LastSeen value
+    now = datetime.now(tz=timezone.utc)
+    harvests = [(now - timedelta(hours=hours)).isoformat() for hours in range(48)]
+
+    return HarvestRecordSet(data=[
+        {'Harvest': {'Dates': {'Active': i % 10 != 0, 'LastSeen': harvests[i % len(harvests)]}}, 'Id': i}
+        for i in range(count)
+    ])
+
+
+def measure(function, recordset: HarvestRecordSet) -> float:
+    start = perf_counter()
+    function(recordset)
+
+    return perf_counter() - start
+
+
+def main(counts: list):
+    print(f'{"records":>10} {"legacy s":>9} {"recordset s":>12} {"cached s":>9} {"speedup":>8}')
+
+    for count in counts:
+        recordset = make_recordset(count)
+
+        legacy = measure(lambda records: [legacy_add_freshness(record) for record in records], recordset)
+        current = measure(lambda records: records.add_freshness(cache_dates=True), recordset)
+        cached = measure(lambda records: records.add_freshness(), recordset)
+
+        print(f'{count:>10} {legacy:>9.3f} {current:>12.3f} {cached:>9.3f} {legacy / current:>7.2f}x')
+
+
+if __name__ == '__main__':
+    main([int(arg) for arg in sys.argv[1:]] or [100_000, 500_000])
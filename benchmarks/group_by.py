@@ -0,0 +1,116 @@
+"""
+Compares aggregating resources per account, region, and type with a loop over the records, which is how record sets
+were aggregated before HarvestRecordSet.group_by() was added, with group_by() reading the records and with group_by()
+reusing a hash index on the same fields. The 'count' case only counts the resources of each group and the 'summary' case
+also sums, averages, and finds the largest size and counts the distinct zones of each group.
+
+Usage:
+    PYTHONPATH=. python benchmarks/group_by.py [count ...]
+"""
+
+import sys
+from time import perf_counter
+
+from CloudHarvestCoreDataModel.recordset import HarvestRecordSet
+
+FIELDS = ['Account', 'Region', 'Type']
+
+AGGREGATIONS = {
+    'Resources': 'count',
+    'TotalSize': {'sum': 'Size'},
+    'AverageSize': {'avg': 'Size'},
+    'Largest': {'max': 'Size'},
+    'Zones': {'count_distinct': 'Zone'},
+}
+
+
+def legacy_count(records: list) -> list:
+    """
+    A loop which counts the records of each group.
+    """
+
+    groups = {}
+    for record in records:
+        key = (record.get('Account'), record.get('Region'), record.get('Type'))
+        groups[key] = groups.get(key, 0) + 1
+
+    return [{'Account': key[0], 'Region': key[1], 'Type': key[2], 'Resources': count} for key, count in groups.items()]
+
+
+def legacy_group_by(records: list) -> list:
+    """
+    A loop which updates one set of accumulators per group for every record.
+    """
+
+    groups = {}
+    for record in records:
+        key = (record.get('Account'), record.get('Region'), record.get('Type'))
+        group = groups.get(key)
+
+        if group is None:
+            group = groups[key] = {'Resources': 0, 'TotalSize': 0, 'Sized': 0, 'Largest': None, 'Zones': set()}
+
+        group['Resources'] += 1
+
+        size = record.get('Size')
+        if type(size) in (int, float):
+            group['TotalSize'] += size
+            group['Sized'] += 1
+
+        if size is not None and (group['Largest'] is None or size > group['Largest']):
+            group['Largest'] = size
+
+        zone = record.get('Zone')
+        if zone is not None:
+            group['Zones'].add(zone)
+
+    return [
+        {'Account': key[0], 'Region': key[1], 'Type': key[2], 'Resources': group['Resources'],
+         'TotalSize': group['TotalSize'], 'AverageSize': group['TotalSize'] / group['Sized'] if group['Sized'] else None,
+         'Largest': group['Largest'], 'Zones': len(group['Zones'])}
+        for key, group in groups.items()
+    ]
+
+
+def make_recordset(count: int) -> HarvestRecordSet:
+    return HarvestRecordSet(data=[
+        {'Account': f'{i % 20:012d}', 'Region': f'region-{i % 7}', 'Type': f'type-{i % 11}', 'Zone': f'zone-{i % 3}',
+         'Size': i % 500, 'Id': i}
+        for i in range(count)
+    ])
+
+
+def measure(function, recordset: HarvestRecordSet, repeat: int = 3) -> (float, list):
+    # The best of several runs, since a single run is easily skewed by garbage collections
+    timings = []
+    for attempt in range(repeat):
+        start = perf_counter()
+        result = function(recordset)
+        timings.append(perf_counter() - start)
+
+    return min(timings), result
+
+
+def main(counts: list):
+    print(f'{"records":>10} {"case":<8} {"legacy s":>9} {"group_by s":>11} {"indexed s":>10} {"speedup":>8} {"indexed":>8}')
+
+    for count in counts:
+        for case, legacy_function, aggregations in (('count', legacy_count, {'Resources': 'count'}),
+                                                    ('summary', legacy_group_by, AGGREGATIONS)):
+            recordset = make_recordset(count)
+
+            legacy, expected = measure(legacy_function, recordset)
+            current, result = measure(lambda records: records.group_by(FIELDS, aggregations), recordset)
+
+            recordset.create_index('resources', *FIELDS)
+            indexed, indexed_result = measure(lambda records: records.group_by(FIELDS, aggregations), recordset)
+
+            assert [dict(record) for record in result] == expected
+            assert [dict(record) for record in indexed_result] == expected
+
+            print(f'{count:>10} {case:<8} {legacy:>9.3f} {current:>11.3f} {indexed:>10.3f} {legacy / current:>7.2f}x '
+                  f'{legacy / indexed:>7.2f}x')
+
+
+if __name__ == '__main__':
+    main([int(arg) for arg in sys.argv[1:]] or [100_000, 500_000])
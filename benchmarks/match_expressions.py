@@ -0,0 +1,67 @@
+"""
+Compares filtering a record set with "State is running OR stopped" by matching each state in its own pass over the
+records and merging the results, which is how OR filters were built before version 0.3.0, with a single
+HarvestRecordSet.add_match() of the expression 'State==running OR State==stopped', which evaluates each record once and
+stops at the first state it matches.
+
+Usage:
+    PYTHONPATH=. python benchmarks/match_expressions.py [count ...]
+"""
+
+import sys
+from itertools import compress
+from time import perf_counter
+
+from CloudHarvestCoreDataModel.matching import compile_match
+from CloudHarvestCoreDataModel.recordset import HarvestRecordSet
+
+STATES = ['running', 'stopped', 'pending', 'terminated']
+
+SYNTAXES = ['State==running', 'State==stopped']
+
+
+def make_recordset(count: int) -> HarvestRecordSet:
+    return HarvestRecordSet(data=[
+        {'InstanceId': f'i-{i:017x}', 'State': STATES[i % 7 % 4], 'Size': i % 64}
+        for i in range(count)
+    ])
+
+
+def legacy_filter(records: list, syntaxes: list) -> list:
+    """
+    Matches each syntax in its own pass and merges the matched records, keeping their order.
+    """
+
+    matched = set()
+    for syntax in syntaxes:
+        matched.update(compress(range(len(records)), map(compile_match(syntax).evaluate, records)))
+
+    return [records[position] for position in sorted(matched)]
+
+
+def measure(function, count: int, repeat: int = 3) -> (float, list):
+    # The best of several runs on a fresh record set, since a single run is easily skewed by garbage collections
+    timings = []
+    for attempt in range(repeat):
+        recordset = make_recordset(count)
+
+        start = perf_counter()
+        result = function(recordset)
+        timings.append(perf_counter() - start)
+
+    return min(timings), [record['InstanceId'] for record in result]
+
+
+def main(counts: list):
+    print(f'{"records":>10} {"legacy s":>9} {"current s":>10} {"speedup":>8}')
+
+    for count in counts:
+        legacy, expected = measure(lambda records: legacy_filter(records, SYNTAXES), count)
+        current, result = measure(lambda records: records.add_match(' OR '.join(SYNTAXES)).get_matched_records(), count)
+
+        assert result == expected
+        print(f'{count:>10} {legacy:>9.3f} {current:>10.3f} {legacy / current:>7.2f}x')
+
+
+if __name__ == '__main__':
+    main([int(arg) for arg in sys.argv[1:]] or [100_000, 500_000])
@@ -0,0 +1,73 @@
+"""
+Compares adding several matches to a record set by evaluating every syntax against every record, which is how
+HarvestRecordSet.add_match() evaluated matches before version 0.3.0, with add_match(), which evaluates the cheapest and
+most selective syntax first and only evaluates each syntax against the records which satisfied the syntaxes before it.
+The syntaxes are listed with the most expensive and least selective first, as they often are in a hand-written query.
+
+The 'first run' case gives every run a record set with new match statistics, so the syntaxes are ordered by their
+estimated cost and default selectivity. The 'repeated' case shares the statistics of the runs before it.
+
+Usage:
+    PYTHONPATH=. python benchmarks/match_order.py [count ...]
+"""
+
+import sys
+from itertools import compress
+from time import perf_counter
+
+from CloudHarvestCoreDataModel.matching import HarvestMatchStatistics, compile_match
+from CloudHarvestCoreDataModel.recordset import HarvestRecordSet
+
+SYNTAXES = ['Tags.0.Value=prod', 'Name=web', 'Size>=8', 'Account==000000000007']
+
+
+def make_recordset(count: int) -> HarvestRecordSet:
+    return HarvestRecordSet(data=[
+        {'Account': f'{i % 40:012d}', 'Name': f'web-{i}' if i % 4 else f'db-{i}', 'Size': i % 64,
+         'Tags': [{'Key': 'Env', 'Value': 'prod' if i % 5 else 'dev'}]}
+        for i in range(count)
+    ])
+
+
+def legacy_add_matches(records: list, syntaxes: list) -> list:
+    """
+    Evaluates every syntax against every record and keeps the records which satisfied all of them.
+    """
+
+    bitmaps = [bytearray(map(compile_match(syntax).evaluate, records)) for syntax in syntaxes]
+
+    return list(compress(records, map(all, zip(*bitmaps))))
+
+
+def measure(function, count: int, repeat: int = 3, statistics: HarvestMatchStatistics = None) -> (float, list):
+    # The best of several runs on a fresh record set, since a single run is easily skewed by garbage collections
+    timings = []
+    for attempt in range(repeat):
+        recordset = make_recordset(count)
+
+        if statistics is not None:
+            recordset.match_statistics = statistics
+
+        start = perf_counter()
+        result = function(recordset)
+        timings.append(perf_counter() - start)
+
+    return min(timings), [record['Name'] for record in result]
+
+
+def main(counts: list):
+    print(f'{"records":>10} {"case":<10} {"legacy s":>9} {"current s":>10} {"speedup":>8}')
+
+    for count in counts:
+        legacy, expected = measure(lambda records: legacy_add_matches(records, SYNTAXES), count)
+
+        for case, statistics in (('first run', None), ('repeated', HarvestMatchStatistics())):
+            current, result = measure(lambda records: records.add_match(SYNTAXES).get_matched_records(), count,
+                                      statistics=statistics)
+
+            assert result == expected
+            print(f'{count:>10} {case:<10} {legacy:>9.3f} {current:>10.3f} {legacy / current:>7.2f}x')
+
+
+if __name__ == '__main__':
+    main([int(arg) for arg in sys.argv[1:]] or [100_000, 500_000])
@@ -0,0 +1,75 @@
+"""
+Compares serving the first page of a listing by matching, sorting, and slicing every record, which is how listings were
+paginated before version 0.3.0, with HarvestRecordSet.sort(), top_k(), and a pipeline whose add_match stages stop once
+the page is filled (see pipeline.push_down_limits()).
+
+Usage:
+    PYTHONPATH=. python benchmarks/pagination.py [count ...]
+"""
+
+import sys
+from time import perf_counter
+
+from CloudHarvestCoreDataModel.pipeline import HarvestRecordSetPipeline
+from CloudHarvestCoreDataModel.recordset import HarvestRecordSet
+from CloudHarvestCoreDataModel.sorting import record_sort_key
+
+PAGE_SIZE = 50
+
+FIELDS = ['Account', 'LaunchTime']
+
+
+def make_recordset(count: int) -> HarvestRecordSet:
+    return HarvestRecordSet(data=[
+        {'Account': f'{i % 40:012d}', 'LaunchTime': f'2024-{i % 12 + 1:02d}-{i % 28 + 1:02d}T00:00:00',
+         'State': 'running' if i % 3 else 'stopped', 'Id': i}
+        for i in range(count)
+    ])
+
+
+def legacy_sort(records: list, fields: list) -> list:
+    """
+    Sorting with a key built by calling record_sort_key() for every comparison key.
+    """
+
+    return sorted(records, key=lambda record: record_sort_key(record, fields))
+
+
+def measure(function, count: int, repeat: int = 3) -> (float, list):
+    # The best of several runs on a fresh record set, since a single run is easily skewed by garbage collections
+    timings = []
+    for attempt in range(repeat):
+        recordset = make_recordset(count)
+
+        start = perf_counter()
+        result = function(recordset)
+        timings.append(perf_counter() - start)
+
+    return min(timings), [record['Id'] for record in result]
+
+
+def main(counts: list):
+    print(f'{"records":>10} {"case":<8} {"legacy s":>9} {"current s":>10} {"speedup":>8}')
+
+    page_stages = [{'add_match': {'syntax': 'State==running'}}, {'remove_unmatched_records': None},
+                   {'limit': {'count': PAGE_SIZE}}]
+
+    for count in counts:
+        cases = (
+            ('sort', lambda records: legacy_sort(records, FIELDS), lambda records: records.sort(FIELDS)),
+            ('top_k', lambda records: legacy_sort(records, FIELDS)[:PAGE_SIZE],
+             lambda records: records.top_k(FIELDS, PAGE_SIZE)),
+            ('page', lambda records: records.add_match('State==running').remove_unmatched_records()[:PAGE_SIZE],
+             lambda records: HarvestRecordSetPipeline(stages=page_stages).run(records)),
+        )
+
+        for case, legacy_function, current_function in cases:
+            legacy, expected = measure(legacy_function, count)
+            current, result = measure(current_function, count)
+
+            assert result == expected
+            print(f'{count:>10} {case:<8} {legacy:>9.3f} {current:>10.3f} {legacy / current:>7.2f}x')
+
+
+if __name__ == '__main__':
+    main([int(arg) for arg in sys.argv[1:]] or [100_000, 500_000])
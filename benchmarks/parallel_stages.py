@@ -0,0 +1,61 @@
+"""
+Compares applying record stages in this process with applying them in a process pool.
+
+Usage:
+    PYTHONPATH=. python benchmarks/parallel_stages.py [count ...]
+
+The number of workers defaults to the number of CPUs and can be set with the WORKERS environment variable.
+"""
+
+import json
+import os
+import sys
+from time import perf_counter
+
+from CloudHarvestCoreDataModel.pipeline import HarvestRecordSetPipeline
+from CloudHarvestCoreDataModel.recordset import HarvestRecordSet
+
+STAGES = [
+    {'dict_from_json_string': {'source_key': 'Document', 'operation': 'key', 'new_key': 'Policy'}},
+    {'key_value_list_to_dict': {'source_key': 'Tags', 'target_key': 'TagsDict'}},
+    {'cast': {'source_key': 'Size', 'format_string': 'str', 'target_key': 'SizeText'}},
+    {'add_key_from_keys': {'new_key': 'Label', 'sequence': [{'key': 'Region'}, {'key': 'InstanceId'}], 'delimiter': '/'}},
+    {'split_key': {'source_key': 'Label', 'target_key': 'LabelParts', 'delimiter': '/'}},
+]
+
+
+def make_recordset(count: int) -> HarvestRecordSet:
+    document = json.dumps({'Version': '2012-10-17', 'Statement': [{'Effect': 'Allow', 'Action': f'ec2:{i}'} for i in range(3)]})
+
+    return HarvestRecordSet(data=[
+        {'InstanceId': f'i-{i:017x}', 'Region': 'us-east-1', 'Size': i % 500, 'Document': document,
+         'Tags': [{'Key': f'Tag{t}', 'Value': f'value-{i}-{t}'} for t in range(10)]}
+        for i in range(count)
+    ])
+
+
+def measure(pipeline: HarvestRecordSetPipeline, count: int) -> (float, HarvestRecordSet):
+    recordset = make_recordset(count)
+
+    start = perf_counter()
+    pipeline.run(recordset)
+
+    return perf_counter() - start, recordset
+
+
+def main(counts: list):
+    workers = int(os.environ.get('WORKERS') or os.cpu_count())
+
+    print(f'{"records":>10} {"workers":>8} {"serial s":>9} {"parallel s":>11} {"speedup":>8}')
+
+    for count in counts:
+        serial, expected = measure(HarvestRecordSetPipeline(stages=STAGES), count)
+        parallel, result = measure(HarvestRecordSetPipeline(stages=STAGES, workers=workers, chunk_size=5000), count)
+
+        assert result == expected
+
+        print(f'{count:>10} {workers:>8} {serial:>9.3f} {parallel:>11.3f} {serial / parallel:>7.2f}x')
+
+
+if __name__ == '__main__':
+    main([int(arg) for arg in sys.argv[1:]] or [100_000, 500_000])
@@ -0,0 +1,60 @@
+"""
+Compares the memory used by HarvestRecord with the OrderedDict based layout it replaced.
+
+Usage:
+    PYTHONPATH=. python benchmarks/record_memory.py [count ...]
+"""
+
+import sys
+import tracemalloc
+from collections import OrderedDict
+
+from CloudHarvestCoreDataModel.record import HarvestRecord
+
+
+class LegacyHarvestRecord(OrderedDict):
+    """
+    The layout of HarvestRecord before version 0.3.0: an OrderedDict with an instance __dict__ and two match lists
+    allocated for every record.
+    """
+
+    def __init__(self, recordset=False, is_flat: bool = False, **kwargs):
+        super().__init__(**kwargs)
+
+        self.recordset = recordset
+        self.is_flat = is_flat
+        self.matching_expressions = []
+        self.non_matching_expressions = []
+
+
+def measure(record_class: type, count: int) -> int:
+    """
+    Returns the number of bytes allocated to create count records of record_class.
+    """
+
+    tracemalloc.start()
+    records = [
+        record_class(recordset=None, InstanceId=f'i-{i:017x}', Region='us-east-1', State='running', Size=i % 500, Active=True)
+        for i in range(count)
+    ]
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    del records
+
+    return size
+
+
+def main(counts: list):
+    print(f'{"records":>10} {"legacy MiB":>12} {"current MiB":>12} {"bytes/record":>24} {"saved":>7}')
+
+    for count in counts:
+        legacy = measure(LegacyHarvestRecord, count)
+        current = measure(HarvestRecord, count)
+
+        print(f'{count:>10} {legacy / 2 ** 20:>12.1f} {current / 2 ** 20:>12.1f} '
+              f'{f"{legacy // count} -> {current // count}":>24} {1 - current / legacy:>7.0%}')
+
+
+if __name__ == '__main__':
+    main([int(arg) for arg in sys.argv[1:]] or [100_000, 1_000_000])
@@ -0,0 +1,81 @@
+"""
+Compares applying HarvestRecordSetTask stages one full pass at a time with the fused passes of HarvestRecordSetPipeline.
+
+Usage:
+    PYTHONPATH=. python benchmarks/stage_fusion.py [count ...]
+"""
+
+import sys
+from time import perf_counter
+
+from CloudHarvestCoreDataModel.pipeline import HarvestRecordSetPipeline
+from CloudHarvestCoreDataModel.record import HarvestRecord
+from CloudHarvestCoreDataModel.recordset import HarvestRecordSet
+
+# Ten record stages with a record set barrier in the middle
+STAGES = [
+    {'copy_key': {'source_key': 'InstanceId', 'target_key': 'Id'}},
+    {'key_value_list_to_dict': {'source_key': 'Tags', 'target_key': 'TagsDict'}},
+    {'add_key_from_keys': {'new_key': 'Label', 'sequence': [{'key': 'Region'}, {'key': 'Id'}], 'delimiter': '/'}},
+    {'cast': {'source_key': 'Size', 'format_string': 'str', 'target_key': 'SizeText'}},
+    {'split_key': {'source_key': 'Label', 'target_key': 'LabelParts', 'delimiter': '/'}},
+    {'add_match': {'syntax': 'Size>10'}},
+    {'substring': {'source_key': 'Id', 'start': 2, 'target_key': 'ShortId'}},
+    {'rename_key': {'old_key': 'SizeText', 'new_key': 'SizeLabel'}},
+    {'list_to_str': {'source_key': 'LabelParts', 'target_key': 'LabelText', 'delimiter': ','}},
+    {'remove_key': {'key': 'TagsDict'}},
+    {'copy_key': {'source_key': 'State', 'target_key': 'Status'}},
+]
+
+
+def make_recordset(count: int) -> HarvestRecordSet:
+    return HarvestRecordSet(data=[
+        {'InstanceId': f'i-{i:017x}', 'Region': 'us-east-1', 'State': 'running', 'Size': i % 500,
+         'Tags': [{'Key': 'Name', 'Value': f'instance-{i}'}, {'Key': 'Team', 'Value': 'harvest'}]}
+        for i in range(count)
+    ])
+
+
+def run_sequential(recordset: HarvestRecordSet) -> HarvestRecordSet:
+    """
+    The behavior of HarvestRecordSetTask.method() before stage fusion: one full pass per record stage.
+    """
+
+    for stage in STAGES:
+        for function, arguments in stage.items():
+            if hasattr(HarvestRecordSet, function):
+                getattr(recordset, function)(**arguments or {})
+
+            elif hasattr(HarvestRecord, function):
+                [getattr(record, function)(**arguments or {}) for record in recordset]
+
+    return recordset
+
+
+def run_fused(recordset: HarvestRecordSet) -> HarvestRecordSet:
+    return HarvestRecordSetPipeline(stages=STAGES).run(recordset)
+
+
+def measure(function, count: int) -> (float, HarvestRecordSet):
+    recordset = make_recordset(count)
+
+    start = perf_counter()
+    function(recordset)
+
+    return perf_counter() - start, recordset
+
+
+def main(counts: list):
+    print(f'{"records":>10} {"sequential s":>13} {"fused s":>9} {"speedup":>8}')
+
+    for count in counts:
+        sequential, expected = measure(run_sequential, count)
+        fused, result = measure(run_fused, count)
+
+        assert result == expected and result.match_bitmaps == expected.match_bitmaps
+
+        print(f'{count:>10} {sequential:>13.3f} {fused:>9.3f} {sequential / fused:>7.2f}x')
+
+
+if __name__ == '__main__':
+    main([int(arg) for arg in sys.argv[1:]] or [100_000, 500_000])
@@ -0,0 +1,75 @@
+"""
+Compares the memory and time used by HarvestRecordSet.unwind() with the implementation it replaced, which copied the
+whole record for every list item.
+
+Usage:
+    PYTHONPATH=. python benchmarks/unwind.py [count ...]
+"""
+
+import sys
+import tracemalloc
+from time import perf_counter
+
+from CloudHarvestCoreDataModel.recordset import HarvestRecordSet
+
+
+def legacy_unwind(recordset: HarvestRecordSet, source_key: str) -> HarvestRecordSet:
+    """
+    HarvestRecordSet.unwind() before version 0.3.0.
+    """
+
+    new_records = []
+    for record in recordset:
+        if isinstance(record[source_key], list):
+            for item in record[source_key]:
+                new_record = record.copy()
+                new_record[source_key] = item
+                new_records.append(new_record)
+
+        else:
+            new_records.append(record)
+
+    recordset.clear()
+    recordset.add_many(data=new_records)
+
+    return recordset
+
+
+def make_recordset(count: int) -> HarvestRecordSet:
+    # A security group with its attributes and 20 rules
+    return HarvestRecordSet(data=[
+        {**{f'Attribute{a}': f'value-{i}-{a}' for a in range(40)},
+         'Rules': [{'Port': port, 'Cidr': '10.0.0.0/8'} for port in range(20)]}
+        for i in range(count)
+    ])
+
+
+def measure(function, count: int) -> (float, float):
+    recordset = make_recordset(count)
+    start = perf_counter()
+    function(recordset)
+    elapsed = perf_counter() - start
+
+    # Memory is measured separately since tracing allocations slows them down
+    recordset = make_recordset(count)
+    tracemalloc.start()
+    function(recordset)
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    return elapsed, size / 1024 / 1024
+
+
+def main(counts: list):
+    print(f'{"records":>10} {"legacy s":>9} {"current s":>10} {"legacy MiB":>11} {"current MiB":>12} {"memory":>7}')
+
+    for count in counts:
+        legacy_time, legacy_size = measure(lambda records: legacy_unwind(records, 'Rules'), count)
+        current_time, current_size = measure(lambda records: records.unwind('Rules'), count)
+
+        print(f'{count:>10} {legacy_time:>9.3f} {current_time:>10.3f} {legacy_size:>11.1f} {current_size:>12.1f} '
+              f'{legacy_size / current_size:>6.1f}x')
+
+
+if __name__ == '__main__':
+    main([int(arg) for arg in sys.argv[1:]] or [1_000, 10_000])
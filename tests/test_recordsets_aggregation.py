@@ -0,0 +1,50 @@
+import unittest
+from CloudHarvestCoreDataModel.aggregation import AGGREGATE_FUNCTIONS, aggregate_groups, compile_aggregations
+
+
+class TestAggregation(unittest.TestCase):
+    def setUp(self):
+        self.records = [
+            {'Size': 3, 'Tags': ['a'], 'State': {'Name': 'running'}},
+            {'Size': 1.5, 'Tags': ['a'], 'State': {'Name': 'stopped'}},
+            {'Size': True, 'Tags': ['b'], 'State': {'Name': 'running'}},
+            {'Size': 'n/a'},
+        ]
+
+    def test_aggregate_functions(self):
+        values = [record.get('Size') for record in self.records]
+        results = {operator: function(values) for operator, function in AGGREGATE_FUNCTIONS.items()}
+
+        self.assertEqual(results, {'avg': 2.25, 'count': 4, 'count_distinct': 4, 'first': 3, 'last': 'n/a',
+                                   'max': 'n/a', 'min': True, 'sum': 4.5})
+
+        # None is not counted, and unhashable values are compared by their fingerprint
+        self.assertEqual(AGGREGATE_FUNCTIONS['count']([1, None, 'a']), 2)
+        self.assertEqual(AGGREGATE_FUNCTIONS['count_distinct']([['a'], ['a'], ['b'], None]), 2)
+        self.assertIsNone(AGGREGATE_FUNCTIONS['min']([None]))
+
+    def test_compile_aggregations(self):
+        self.assertEqual([(name, operator, field) for name, operator, field, function in compile_aggregations({
+            'records': 'count', 'states': {'count_distinct': 'State.Name'}
+        })], [('records', 'count', None), ('states', 'count_distinct', 'State.Name')])
+
+        for aggregations in ({'a': 'sum'}, {'a': {'sum': None}}, {'a': {'median': 'Size'}}, {'a': {'sum': 'x', 'max': 'y'}}):
+            with self.subTest(aggregations=aggregations):
+                with self.assertRaises(ValueError):
+                    compile_aggregations(aggregations)
+
+    def test_aggregate_groups(self):
+        # Flattened fields are resolved against nested records
+        compiled = compile_aggregations({'records': 'count', 'states': {'count_distinct': 'State.Name'}})
+        expected = [{'Tag': 'a', 'records': 2, 'states': 2}, {'Tag': 'b', 'records': 2, 'states': 1}]
+
+        # Groups of positions into the records, or groups of records
+        groups = [(('a', ), [0, 1]), (('b', ), [2, 3])]
+        self.assertEqual(aggregate_groups(groups, ('Tag', ), compiled, records=self.records), expected)
+
+        groups = [(('a', ), self.records[:2]), (('b', ), self.records[2:])]
+        self.assertEqual(aggregate_groups(groups, ('Tag', ), compiled), expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,150 @@
+import unittest
+from importlib.util import find_spec
+from CloudHarvestCoreDataModel.columnar import HarvestColumnarRecordSet
+from CloudHarvestCoreDataModel.recordset import HarvestRecordSet
+
+
+class TestHarvestColumnarRecordSet(unittest.TestCase):
+    def setUp(self):
+        self.data = [{'index': i, 'value': f'value_{i}'} for i in range(5)] + [{'index': '5', 'tags': ['a', 'b']}]
+        self.recordset = HarvestColumnarRecordSet(data=self.data)
+
+    def test_add(self):
+        self.recordset.add(data={'index': 6, 'other': True})
+        self.assertEqual(len(self.recordset), 7)
+        self.assertEqual(self.recordset.keys, ['index', 'other', 'tags', 'value'])
+
+        # Rows only contain the keys they were added with
+        self.assertEqual(dict(self.recordset[-1]), {'index': 6, 'other': True})
+        self.assertEqual(self.recordset.column('other'), [None] * 6 + [True])
+
+    def test_iteration(self):
+        self.assertEqual([dict(record) for record in self.recordset], self.data)
+
+    def test_add_match(self):
+        # Results are the same as HarvestRecordSet for each kind of column
+        for syntax in ('index>=2', 'index==5', 'value=VALUE_[12]', 'value!=value_1', 'tags==None',
+                       'index>=2 AND NOT value=VALUE_3', 'index==1 OR index==5',
+                       '(index<1 OR index>3) AND value=value'):
+            recordset = HarvestRecordSet(data=[dict(record) for record in self.data])
+            recordset.add_match(syntax)
+
+            columnar = HarvestColumnarRecordSet(data=self.data)
+            columnar.add_match(syntax)
+
+            self.assertEqual(list(columnar.match_bitmaps[0]), [record.is_matched_record for record in recordset], syntax)
+
+    def test_add_match_flattened_keys(self):
+        data = [{'Name': f'web-{i}', 'Tags': [{'Key': 'Env', 'Value': 'prod' if i % 2 else 'dev'}],
+                 'State': {'Name': 'running' if i % 3 else 'stopped', 'Code': 16 * (i % 3)}} for i in range(6)]
+        data += [{'Name': 'flat', 'State.Name': 'running', 'Tags.0.Value': 'prod'}, {'Name': 'no-state', 'State': None}]
+
+        # Flattened keys are resolved against nested values and flat keys, as they are by HarvestRecordSet
+        for syntax in ('State.Name==running', 'State.Code>=16', 'Tags.0.Value==prod', 'Tags.0.Key=env', 'Tags.1.Key==None',
+                       'State.Name!=running', 'State.Name==running AND Tags.0.Value==prod', 'Missing.Key==None'):
+            with self.subTest(syntax=syntax):
+                recordset = HarvestRecordSet(data=[dict(record) for record in data]).add_match(syntax)
+                columnar = HarvestColumnarRecordSet(data=data).add_match(syntax)
+
+                self.assertEqual(list(columnar.match_bitmaps[0]), [record.is_matched_record for record in recordset])
+
+        columnar = HarvestColumnarRecordSet(data=data)
+        self.assertEqual(columnar.column('State.Name')[:3], ['stopped', 'running', 'running'])
+        self.assertEqual(columnar.get_value(6, 'Tags.0.Value'), 'prod')
+        self.assertEqual(columnar.get_value(7, 'State.Name', default='none'), 'none')
+
+        # Indexes read flattened keys the same way
+        columnar.create_index('state', 'State.Name')
+        columnar.add_match('State.Name==stopped')
+        self.assertEqual(columnar.last_match_plan['path'], 'index')
+        self.assertEqual([record['Name'] for record in columnar.get_matched_records()], ['web-0', 'web-3'])
+
+    def test_add_match_limit(self):
+        data = [{'index': i, 'parity': i % 2} for i in range(10)]
+
+        # Lists of syntaxes and limits select the same rows as HarvestRecordSet
+        for syntax, limit in ((['parity==0', 'index<9'], 2), ('index>1', 0), ('index>1', 20), (['index>0', 'index<3'], None)):
+            with self.subTest(syntax=syntax, limit=limit):
+                recordset = HarvestRecordSet(data=data).add_match('index>1').add_match(syntax, limit=limit)
+                columnar = HarvestColumnarRecordSet(data=data).add_match('index>1').add_match(syntax, limit=limit)
+
+                self.assertEqual([record['index'] for record in columnar.get_matched_records()],
+                                 [record['index'] for record in recordset.get_matched_records()])
+                self.assertEqual(len(columnar.match_expressions), len(recordset.match_expressions))
+
+        columnar = HarvestColumnarRecordSet(data=data).add_match('parity==0', limit=2)
+        self.assertEqual(list(columnar.limit_bitmap), [1] * 3 + [0] * 7)
+
+        # Rows added afterwards are matched, and removing unmatched rows removes the limit
+        columnar.add({'index': 10, 'parity': 1})
+        self.assertEqual([record['index'] for record in columnar.remove_unmatched_records()], [0, 2, 10])
+        self.assertIsNone(columnar.limit_bitmap)
+
+        columnar.clear_matches()
+        self.assertEqual(len(columnar.get_matched_records()), 3)
+
+    def test_record_matches(self):
+        self.recordset.add_match('index>=2')
+        self.recordset.add_match('value=value', limit=2)
+
+        # Row copies report the match results of their row
+        self.assertEqual([record.is_matched_record for record in self.recordset], [False, False, True, True, False, False])
+        self.assertEqual([match.syntax for match in self.recordset[0].non_matching_expressions], ['index>=2'])
+        self.assertEqual(len(self.recordset[2].matching_expressions), 2)
+
+        self.recordset.clear_matches()
+        self.assertTrue(all(record.is_matched_record for record in self.recordset))
+
+    def test_add_match_with_index(self):
+        self.recordset.create_index('index1', 'index', index_type='sorted')
+        self.recordset.add_match('index>2')
+
+        self.assertEqual(self.recordset.last_match_plan['path'], 'index')
+        self.assertEqual(list(self.recordset.match_bitmaps[0]), [0, 0, 0, 1, 1, 1])
+
+    def test_get_matched_records(self):
+        self.recordset.add_match('index>=2')
+        self.recordset.add_match('value=value')
+
+        matched = self.recordset.get_matched_records()
+        self.assertEqual([record['index'] for record in matched], [2, 3, 4])
+
+        self.recordset.clear_matches()
+        self.assertEqual(len(self.recordset.get_matched_records()), 6)
+
+    def test_remove_unmatched_records(self):
+        self.recordset.create_index('index1', 'index')
+        self.recordset.add_match('index>=3')
+        self.recordset.remove_unmatched_records()
+
+        # '5' is a string and is compared with '3' as a string
+        self.assertEqual(len(self.recordset), 3)
+        self.assertEqual(list(self.recordset.indexes['index1'].keys()), [(3, ), (4, ), ('5', )])
+
+    def test_unwind(self):
+        self.recordset.unwind(source_key='tags')
+        self.assertEqual(len(self.recordset), 7)
+        self.assertEqual(dict(self.recordset[5]), {'index': '5', 'tags': 'a'})
+        self.assertEqual(dict(self.recordset[0]), {'index': 0, 'value': 'value_0'})
+
+        self.recordset.unwind(source_key='tags', preserve_null_and_empty_keys=False)
+        self.assertEqual(len(self.recordset), 2)
+
+    def test_to_recordset(self):
+        recordset = self.recordset.to_recordset()
+        self.assertIsInstance(recordset, HarvestRecordSet)
+        self.assertEqual(recordset, self.data)
+        self.assertTrue(all(record.recordset is recordset for record in recordset))
+
+    @unittest.skipUnless(find_spec('pandas'), 'pandas is not installed')
+    def test_to_dataframe(self):
+        dataframe = self.recordset.to_dataframe()
+
+        self.assertEqual(list(dataframe.columns), ['index', 'value', 'tags'])
+        self.assertEqual(len(dataframe), 6)
+        self.assertIsNone(dataframe['tags'][0])
+        self.assertEqual(dataframe['tags'][5], ['a', 'b'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+import unittest
+from datetime import datetime
+from CloudHarvestCoreDataModel.deduplication import HarvestDeduplicator, fingerprint
+
+
+class TestFingerprint(unittest.TestCase):
+    def test_fingerprint(self):
+        record = {'InstanceId': 'i-1', 'Tags': [{'Key': 'Name', 'Value': 'a'}], 'Placement': {'Zone': 'a', 'Tenancy': 'default'}}
+
+        # Key order is ignored at every level, list order is not
+        self.assertEqual(fingerprint(record),
+                         fingerprint({'Placement': {'Tenancy': 'default', 'Zone': 'a'}, 'Tags': [{'Value': 'a', 'Key': 'Name'}], 'InstanceId': 'i-1'}))
+        self.assertNotEqual(fingerprint({'a': [1, 2]}), fingerprint({'a': [2, 1]}))
+        self.assertEqual(len(fingerprint(record)), 16)
+
+        # Values are distinguished from their string form
+        self.assertNotEqual(fingerprint({'a': 1}), fingerprint({'a': '1'}))
+        self.assertNotEqual(fingerprint({'a': datetime(2024, 1, 1)}), fingerprint({'a': str(datetime(2024, 1, 1))}))
+        self.assertEqual(fingerprint({'a': {1, 2}}), fingerprint({'a': {2, 1}}))
+
+        # Equal numbers have the same fingerprint, as they did when records were compared by their items
+        self.assertEqual(len({fingerprint({'a': 1}), fingerprint({'a': 1.0}), fingerprint({'a': True})}), 1)
+        self.assertEqual(fingerprint({1.0: [False, 2.0]}), fingerprint({1: [0, 2]}))
+        self.assertEqual(fingerprint({'a': {1, 2.0}}), fingerprint({'a': {1.0, 2}}))
+        self.assertNotEqual(fingerprint({'a': 1}), fingerprint({'a': 1.5}))
+
+        # Tuples, lists, and sets are distinguished
+        self.assertEqual(len({fingerprint({'a': (1, 2)}), fingerprint({'a': [1, 2]}), fingerprint({'a': {1, 2}})}), 3)
+        self.assertEqual(fingerprint({'a': (1, 2)}), fingerprint({'a': (1.0, 2)}))
+
+        # Keys which cannot be sorted together
+        self.assertEqual(fingerprint({1: 'a', 'b': 2}), fingerprint({'b': 2, 1: 'a'}))
+        self.assertEqual(fingerprint({1: 'a', 'b': (2,)}), fingerprint({'b': (2.0,), True: 'a'}))
+        self.assertNotEqual(fingerprint({1: 'a', 'b': (2,)}), fingerprint({'b': [2], 1: 'a'}))
+
+        # Keys and values are tagged with their type, so they cannot collide with keys or values of another type
+        self.assertNotEqual(fingerprint({1: 'a'}), fingerprint({'1': 'a'}))
+        self.assertNotEqual(fingerprint({None: 'a'}), fingerprint({'null': 'a'}))
+        self.assertNotEqual(fingerprint({(1, 2): 'a'}), fingerprint({'(1, 2)': 'a'}))
+        self.assertNotEqual(fingerprint({'a': (1, 2)}), fingerprint({'a': {'__tuple__': [1, 2]}}))
+        self.assertNotEqual(fingerprint({'a': (1, 2)}), fingerprint({'a': {'#tuple': [1, 2]}}))
+        self.assertNotEqual(fingerprint({'a': {1}}), fingerprint({'a': {'__set__': ['1']}}))
+        self.assertNotEqual(fingerprint({'a': {1}}), fingerprint({'a': {'1'}}))
+        self.assertNotEqual(fingerprint({'a': datetime(2024, 1, 1)}),
+                            fingerprint({'a': {'__datetime__': repr(datetime(2024, 1, 1))}}))
+
+        # A subset of keys, where missing keys are None
+        self.assertEqual(fingerprint(record, keys=['InstanceId', 'Missing']), fingerprint({'InstanceId': 'i-1', 'Missing': None}))
+
+
+class TestHarvestDeduplicator(unittest.TestCase):
+    def test_filter(self):
+        deduplicator = HarvestDeduplicator(keys=['id'])
+        records = [{'id': i % 3, 'position': i} for i in range(7)]
+
+        self.assertEqual([record['position'] for record in deduplicator.filter(records[:4])], [0, 1, 2])
+
+        # Records seen by earlier calls are remembered
+        self.assertEqual(list(deduplicator.filter(records[4:])), [])
+        self.assertTrue(deduplicator.is_duplicate({'id': 0}))
+        self.assertFalse(deduplicator.is_duplicate({'id': 3}))
+        self.assertEqual(len(deduplicator), 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
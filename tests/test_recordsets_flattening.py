@@ -0,0 +1,114 @@
+import unittest
+from CloudHarvestCoreDataModel.flattening import HarvestFlattener, HarvestFlatView, flatten, get_flattener, get_path, unflatten
+
+
+class TestHarvestFlattener(unittest.TestCase):
+    def setUp(self):
+        self.flattener = HarvestFlattener()
+        self.record = {
+            'Id': 'i-1',
+            'State': {'Code': 16, 'Name': 'running'},
+            'Tags': [{'Key': 'Name', 'Value': 'web'}, {'Key': 'Env', 'Value': 'prod'}],
+            'Empty': {},
+            'None': None,
+            'Zero': 0,
+        }
+
+    def test_flatten(self):
+        flat = self.flattener.flatten(self.record)
+
+        self.assertEqual(flat, {
+            'Id': 'i-1',
+            'State.Code': 16,
+            'State.Name': 'running',
+            'Tags.0.Key': 'Name',
+            'Tags.0.Value': 'web',
+            'Tags.1.Key': 'Env',
+            'Tags.1.Value': 'prod',
+            'Empty': {},
+            'None': None,
+            'Zero': 0,
+        })
+
+        # Records which share a shape share their flattened keys
+        other = self.flattener.flatten({'State': {'Code': 80, 'Name': 'stopped'}})
+        self.assertIs(next(iter(other)), list(flat)[1])
+
+        self.assertEqual(HarvestFlattener(separator='_').flatten({'a': {'b': (1, 2)}}), {'a_b_0': 1, 'a_b_1': 2})
+
+    def test_unflatten(self):
+        flat = self.flattener.flatten(self.record)
+
+        # The second record with a shape is rebuilt from the compiled shape
+        for attempt in ('discovered', 'compiled'):
+            with self.subTest(attempt=attempt):
+                # Unflattening reverses flattening and keeps the original key order
+                result = self.flattener.unflatten(flat)
+                self.assertEqual(result, self.record)
+                self.assertEqual(list(result), list(self.record))
+
+                # Levels whose keys are not 0 through n-1 stay dictionaries
+                self.assertEqual(self.flattener.unflatten({'a.0': 1, 'a.2': 2, 'b.1': 3}),
+                                 {'a': {'0': 1, '2': 2}, 'b': {'1': 3}})
+
+                # Nested keys are kept when a key is also a prefix of other keys
+                self.assertEqual(self.flattener.unflatten({'a': 1, 'a.b': 2}), {'a': {'b': 2}})
+                self.assertEqual(self.flattener.unflatten({'a.b': 2, 'a': 1}), {'a': {'b': 2}})
+
+                self.assertEqual(self.flattener.unflatten({'a.0.0': 1, 'a.0.1': 2, 'a.1': []}), {'a': [[1, 2], []]})
+
+        # Flattened records are unflattened in place
+        record = dict(flat)
+        self.assertIs(self.flattener.unflatten_record(record), record)
+        self.assertEqual(record, self.record)
+
+    def test_max_paths(self):
+        flattener = HarvestFlattener(max_paths=3)
+
+        flattener.flatten({'a': {'b': 1, 'c': 2}})
+        self.assertEqual(len(flattener), 3)
+
+        # The layout is discarded once it is larger than max_paths
+        flattener.flatten({'a': {'d': 1}})
+        self.assertEqual(flattener.flatten({'x': {'y': 1}}), {'x.y': 1})
+        self.assertEqual(len(flattener), 2)
+
+    def test_HarvestFlatView(self):
+        view = HarvestFlatView(self.record)
+
+        self.assertEqual(view['Tags.1.Value'], 'prod')
+        self.assertEqual(view['Empty'], {})
+        self.assertIsNone(view['None'])
+        self.assertEqual(view.get('Tags.2.Value', 'missing'), 'missing')
+
+        # Only the values of the flattened record are keys of the view
+        self.assertNotIn('Tags.0', view)
+        self.assertNotIn('Id.0', view)
+
+        self.assertEqual(dict(view), flatten(self.record))
+        self.assertEqual(list(view), list(flatten(self.record)))
+        self.assertEqual(len(view), 10)
+        self.assertEqual(view.to_dict(), flatten(self.record))
+
+        # The view reflects changes to the record
+        self.record['State']['Name'] = 'stopped'
+        self.assertEqual(view['State.Name'], 'stopped')
+
+    def test_get_path(self):
+        self.assertEqual(get_path(self.record, 'Tags.0.Key'), 'Name')
+        self.assertEqual(get_path(self.record, 'State'), {'Code': 16, 'Name': 'running'})
+        self.assertEqual(get_path({'a': {1, 2}}, 'a.5', default=0), 0)
+        self.assertIsNone(get_path(self.record, 'Tags.Key'))
+        self.assertIsNone(get_path(self.record, 'Id.x'))
+
+        # Flat records are read directly
+        self.assertEqual(get_path(flatten(self.record), 'Tags.0.Key'), 'Name')
+        self.assertEqual(get_path({'a.b': 1, 'a': {'b': 2}}, 'a.b'), 1)
+
+    def test_shared_flattener(self):
+        self.assertIs(get_flattener('.'), get_flattener('.'))
+        self.assertEqual(unflatten(flatten(self.record)), self.record)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -31,6 +31,55 @@ class TestFunctions(unittest.TestCase):
 
         # Test casting an invalid string to an integer
         self.assertIsNone(functions.cast('invalid', 'int'))
+        self.assertIsNone(functions.cast(None, 'float'))
+
+        # Test casting to a datetime
+        from datetime import datetime
+        self.assertEqual(functions.cast('2024-01-01', 'datetime'), datetime(2024, 1, 1))
+        self.assertEqual(functions.cast(datetime(2024, 1, 1), 'datetime'), datetime(2024, 1, 1))
+
+    def test_cast_many(self):
+        """
+        Test the cast_many function with columns which can and cannot be converted
+        """
+
+        self.assertEqual(functions.cast_many(['1', '2', '3'], 'int'), [1, 2, 3])
+        self.assertEqual(functions.cast_many(('1', 'x', None), 'float'), [1.0, None, None])
+        self.assertEqual(functions.cast_many((value for value in ['No', 'Yes', [1]]), 'bool'), [False, True, True])
+        self.assertEqual(functions.cast_many([1, 2], 'unsupported'), [None, None])
+
+    def test_fuzzy_cast(self):
+        """
+        Test the fuzzy_cast function with different types of inputs
+        """
+
+        from datetime import datetime
+
+        self.assertEqual(functions.fuzzy_cast('12'), 12)
+        self.assertEqual(functions.fuzzy_cast('1.5'), 1.5)
+        self.assertIs(functions.fuzzy_cast('false'), False)
+        self.assertIsNone(functions.fuzzy_cast('null'))
+        self.assertEqual(functions.fuzzy_cast('2024-01-01'), datetime(2024, 1, 1))
+        self.assertEqual(functions.fuzzy_cast('i-123'), 'i-123')
+
+    def test_infer_type(self):
+        """
+        Test the infer_type function with different types of inputs
+        """
+
+        from datetime import datetime
+
+        self.assertEqual(functions.infer_type('Yes'), 'bool')
+        self.assertEqual(functions.infer_type(True), 'bool')
+        self.assertEqual(functions.infer_type('2024-01-01T10:00:00'), 'datetime')
+        self.assertEqual(functions.infer_type(datetime(2024, 1, 1)), 'datetime')
+        self.assertEqual(functions.infer_type('2024-13-01'), 'str')
+        self.assertEqual(functions.infer_type('None'), 'null')
+        self.assertEqual(functions.infer_type(None), 'null')
+        self.assertEqual(functions.infer_type('-1.5e3'), 'number')
+        self.assertEqual(functions.infer_type(3), 'number')
+        self.assertEqual(functions.infer_type('20241301'), 'number')
+        self.assertEqual(functions.infer_type(['list']), 'str')
 
     def test_delimiter_list_to_string(self):
         """
@@ -65,6 +114,12 @@ class TestFunctions(unittest.TestCase):
         # Test checking if a string is not a number
         self.assertFalse(functions.is_number('abc'))
 
+        # Test checking decimal numbers and values which are not strings
+        self.assertTrue(functions.is_number(' -1.5 '))
+        self.assertTrue(functions.is_number(2))
+        self.assertFalse(functions.is_number('1.2.3'))
+        self.assertFalse(functions.is_number(None))
+
 
 if __name__ == '__main__':
     unittest.main()
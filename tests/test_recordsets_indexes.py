@@ -0,0 +1,113 @@
+import unittest
+from datetime import datetime, timezone
+from CloudHarvestCoreDataModel.indexes import HarvestIndex, HarvestSortedIndex
+from CloudHarvestCoreDataModel.matching import compile_match
+
+
+class TestHarvestIndex(unittest.TestCase):
+    """
+    Test case for the HarvestIndex class in indexes.py
+    """
+
+    def setUp(self):
+        self.records = [{'index': i, 'group': i % 2} for i in range(6)]
+        self.index = HarvestIndex('group', records=self.records)
+
+    def test_insert_records(self):
+        self.assertEqual(len(self.index[(0, )]), 3)
+        self.assertEqual(len(self.index[(1, )]), 3)
+
+        self.index.insert_records([{'index': 6, 'group': 2}])
+        self.assertEqual(len(self.index[(2, )]), 1)
+
+    def test_evict_records(self):
+        self.index.evict_records(self.records[0::2])
+        self.assertNotIn((0, ), self.index)
+        self.assertEqual(len(self.index[(1, )]), 3)
+
+        # Records are evicted from the bucket they were inserted into, even if the field value has since changed
+        self.records[1]['group'] = 5
+        self.index.evict_records([self.records[1]])
+        self.assertEqual(len(self.index[(1, )]), 2)
+
+    def test_reindex_records(self):
+        unchanged_bucket = self.index[(1, )]
+
+        self.records[0]['group'] = 1
+        self.index.reindex_records(self.records)
+
+        self.assertEqual(len(self.index[(0, )]), 2)
+        self.assertEqual(len(self.index[(1, )]), 4)
+
+        # Buckets which did not lose a record are only appended to
+        self.assertIs(self.index[(1, )], unchanged_bucket)
+
+    def test_lookup(self):
+        self.index.insert_records([{'index': 6, 'group': '1'}, {'index': 7, 'group': 1.0}])
+
+        compiled = compile_match('group==1')
+        self.assertTrue(self.index.supports(compiled))
+        self.assertFalse(self.index.supports(compile_match('group>1')))
+        self.assertFalse(self.index.supports(compile_match('index==1')))
+
+        # The lookup returns the same records as evaluating every record
+        expected = [record['index'] for record in self.records + [{'index': 6, 'group': '1'}, {'index': 7, 'group': 1.0}]
+                    if compiled.evaluate(record)]
+        self.assertEqual(sorted(record['index'] for record in self.index.lookup(compiled)), sorted(expected))
+
+    def test_clear(self):
+        self.index.clear()
+        self.assertEqual(len(self.index), 0)
+
+        self.index.evict_records(self.records)
+        self.assertEqual(len(self.index), 0)
+
+
+class TestHarvestSortedIndex(unittest.TestCase):
+    """
+    Test case for the HarvestSortedIndex class in indexes.py
+    """
+
+    def setUp(self):
+        self.records = [{'index': i, 'size': i * 10} for i in range(10)]
+        self.records += [
+            {'index': 10, 'size': '95'},
+            {'index': 11},
+            {'index': 12, 'size': datetime(2024, 1, 1, tzinfo=timezone.utc)}
+        ]
+        self.index = HarvestSortedIndex('size', records=self.records)
+
+    def assertLookupMatchesScan(self, syntax: str):
+        compiled = compile_match(syntax)
+        expected = [record['index'] for record in self.records if compiled.evaluate(record)]
+
+        self.assertTrue(self.index.supports(compiled))
+        self.assertEqual(sorted(record['index'] for record in self.index.lookup(compiled)), expected)
+
+    def test_lookup(self):
+        for syntax in ('size>50', 'size>=50', 'size<50', 'size<=50', 'size==50', 'size!=50', 'size>2023-12-31T00:00:00+00:00'):
+            self.assertLookupMatchesScan(syntax)
+
+        self.assertFalse(self.index.supports(compile_match('size=5')))
+        self.assertFalse(self.index.supports(compile_match('index>5')))
+
+    def test_maintenance(self):
+        self.records.append({'index': 13, 'size': 55})
+        self.index.insert_records(self.records[-1:])
+        self.assertEqual(len(self.index), 14)
+
+        self.index.evict_records(self.records[:2])
+        self.records[2]['size'] = 500
+        self.index.reindex_records(self.records[2:])
+        self.records = self.records[2:]
+
+        self.assertEqual(len(self.index), 12)
+        self.assertLookupMatchesScan('size>50')
+
+    def test_fields(self):
+        with self.assertRaises(ValueError):
+            HarvestSortedIndex('size', 'index')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,3 +1,4 @@
+import re
 import unittest
 from collections import OrderedDict
 from CloudHarvestCoreDataModel import matching
@@ -64,6 +65,58 @@ class TestMatching(unittest.TestCase):
         self.assertEqual(match.final_match_operation, '1=1')
         self.assertTrue(match.is_match)
 
+    def test_HarvestCompiledMatch(self):
+        """
+        Test the HarvestCompiledMatch class against several records
+        """
+        compiled = matching.compile_match('key1>=2')
+
+        # Compiled matches are cached by syntax
+        self.assertIs(compiled, matching.compile_match('key1>=2'))
+
+        self.assertEqual(compiled.key, 'key1')
+        self.assertEqual(compiled.value, '2')
+        self.assertEqual(compiled.cast_as, 'float')
+        self.assertEqual(compiled.cast_value, 2.0)
+
+        # Non-string record values are cast before being compared
+        self.assertTrue(compiled.evaluate({'key1': 3}))
+        self.assertFalse(compiled.evaluate({'key1': 1}))
+
+        # String record values are compared as strings
+        self.assertTrue(compiled.evaluate({'key1': '2'}))
+        self.assertEqual(compiled.compare({'key1': 5})[1:], (5.0, 2.0))
+
+        # HarvestMatch accepts a compiled syntax
+        match = matching.HarvestMatch(record={'key1': 2}, syntax=compiled)
+        self.assertTrue(match.match())
+        self.assertEqual(match.final_match_operation, '2.0>=2.0')
+
+    def test_HarvestCompiledMatch_pattern(self):
+        """
+        Test that the '=' operator compiles its pattern once and matches case-insensitively
+        """
+        compiled = matching.compile_match('Name=web')
+
+        self.assertIs(compiled.pattern, matching.compile_pattern('web'))
+        self.assertIsNone(matching.compile_match('Name==web').pattern)
+
+        self.assertTrue(compiled.evaluate({'Name': 'WEB-01'}))
+        self.assertFalse(compiled.evaluate({'Name': 'db-01'}))
+        self.assertFalse(compiled.evaluate({}))
+
+        # Non-string values are not searched when the literal is not a string
+        self.assertFalse(matching.compile_match('Size=5').evaluate({'Size': 5}))
+
+        # HarvestMatch still reports every occurrence of the pattern
+        match = matching.HarvestMatch(record={'Name': 'web-web'}, syntax='Name=web')
+        self.assertEqual(match.match(), ['web', 'web'])
+
+        # Invalid patterns raise when they are used
+        self.assertIsNone(matching.compile_match('Name=[').pattern)
+        with self.assertRaises(re.error):
+            matching.compile_match('Name=[').evaluate({'Name': 'web'})
+
     def test_HarvestMatchSet(self):
         """
         Test the HarvestMatchSet class with different types of inputs
@@ -86,6 +139,130 @@ class TestMatching(unittest.TestCase):
         match_set = matching.HarvestMatchSet(matches=matches, record=record)
         self.assertFalse(len(match_set.matches[0].match()), 0)
 
+        # Test evaluating a HarvestMatchSet against several records
+        match_set = matching.HarvestMatchSet(matches=['key1=value', 'key2==b'])
+        self.assertTrue(match_set.evaluate(OrderedDict([('key1', 'value1'), ('key2', 'b')])))
+        self.assertFalse(match_set.evaluate(OrderedDict([('key1', 'value1'), ('key2', 'c')])))
+
+    def test_HarvestMatchSet_filter(self):
+        """
+        Test that a HarvestMatchSet filters records in the order given by its statistics and records their selectivity
+        """
+        # Records are filtered with the cheapest and most selective syntax first
+        statistics = matching.HarvestMatchStatistics()
+        match_set = matching.HarvestMatchSet(matches=['key1=value', 'key2==b'], statistics=statistics)
+        self.assertEqual([match.syntax for match in match_set._evaluation_order], ['key2==b', 'key1=value'])
+
+        records = [{'key1': f'value{i}', 'key2': 'b' if i % 4 == 0 else 'c'} for i in range(8)]
+        self.assertEqual(match_set.filter(records), [records[0], records[4]])
+        self.assertEqual(statistics.selectivity(match_set._evaluation_order[0]), 0.25)
+        self.assertEqual(statistics.selectivity(match_set._evaluation_order[1]), 1)
+
+    def test_HarvestCompiledExpression(self):
+        # AND binds more tightly than OR, and operands are written in a normalized form
+        expression = matching.compile_expression('x==1 AND y==2 OR NOT(z==3)')
+        self.assertEqual(expression.syntax, '(x==1 AND y==2) OR NOT z==3')
+        self.assertEqual(expression.operator, 'OR')
+        self.assertIs(matching.compile_expression(expression.syntax).operands[1].operands[0],
+                      matching.compile_match('z==3'))
+
+        # Parentheses which are part of a syntax are kept
+        expression = matching.compile_expression('(Name=^(web|db)$ OR Name=(api)) AND Size>1')
+        self.assertEqual(expression.operands[0].operands[1].syntax, 'Name=(api)')
+
+        # A single syntax is not an expression, and keywords must be upper case and surrounded by whitespace
+        self.assertIs(matching.compile_expression('Name=(web|db)'), matching.compile_match('Name=(web|db)'))
+        self.assertIsInstance(matching.compile_expression('Band==Rock and Roll'), matching.HarvestCompiledMatch)
+
+        # Values which contain the keywords are a single syntax unless every part between the keywords is a syntax
+        for syntax in ('Name==Salt AND Pepper', 'Name=Salt OR Pepper', 'Name==Salt AND (Pepper)', 'x==1 AND )'):
+            with self.subTest(syntax=syntax):
+                self.assertIs(matching.compile_expression(syntax), matching.compile_match(syntax))
+
+        self.assertTrue(matching.compile_expression('Name==Salt AND Pepper').evaluate({'Name': 'Salt AND Pepper'}))
+
+        # Expressions which start with a parenthesis must be valid
+        for syntax in ('(x==1 OR y==2', 'x==1 OR y==2)', '(x==1 AND )', '() OR x==1', '(Name==Salt) AND Pepper'):
+            with self.subTest(syntax=syntax), self.assertRaises(ValueError):
+                matching.compile_expression(syntax)
+
+        records = [{'State': state, 'Size': size, 'Name': f'web-{size}'}
+                   for state in ('running', 'stopped', 'pending') for size in (4, 8, '16', None)]
+
+        for syntax in ('State==running OR State==stopped', 'NOT (Name=web AND Size>4)', 'Size==8 OR Size==16',
+                       'State==pending OR Size>=8 AND NOT State==running', '(State!=stopped OR Size<8) AND Name=-4'):
+            with self.subTest(syntax=syntax):
+                expression = matching.compile_expression(syntax)
+                expected = [expression.evaluate(record) for record in records]
+
+                # Records are evaluated set by set with the same results as record by record, with or without
+                # statistics which reorder the operands
+                statistics = matching.HarvestMatchStatistics()
+                self.assertEqual(list(expression.evaluate_records(records)), expected)
+                self.assertEqual(list(expression.evaluate_records(records, statistics)), expected)
+                self.assertEqual(list(expression.evaluate_records(records, statistics)), expected)
+
+        # Values which are not strings are cast before they are compared with each literal
+        self.assertEqual([record['Size'] for record in records
+                          if matching.compile_expression('Size==8 OR Size==16').evaluate(record)], [8, '16'] * 3)
+        self.assertEqual([record['State'] for record in records
+                          if matching.compile_expression('State==running OR State==stopped').evaluate(record)],
+                         ['running'] * 4 + ['stopped'] * 4)
+        self.assertEqual(sum(matching.compile_expression('NOT (Name=web AND Size>4)').evaluate_records(records)), 9)
+
+    def test_HarvestCompiledExpression_as_mongo_match(self):
+        self.assertEqual(matching.HarvestMatch(syntax='State==running OR State==stopped').as_mongo_match(),
+                         {'$or': [{'State': 'running'}, {'State': 'stopped'}]})
+
+        # Aggregation expressions are wrapped in $expr, and NOT becomes $nor
+        self.assertEqual(matching.HarvestMatch(syntax='NOT (Name=web AND Size>8)').as_mongo_match(),
+                         {'$nor': [{'$and': [{'$expr': {'$regexMatch': {'input': {'$toString': '$Name'},
+                                                                       'regex': 'web', 'options': 'i'}}},
+                                             {'Size': {'$gt': 8}}]}]})
+
+        # Expressions are combined with the other syntaxes of a match set
+        self.assertEqual(matching.HarvestMatchSet(['State==running OR Size>3', 'Name==x']).as_mongo_match(),
+                         {'Name': 'x', '$and': [{'$or': [{'State': 'running'}, {'Size': {'$gt': 3}}]}]})
+
+    def test_HarvestMatchStatistics(self):
+        equal, contains, nested = map(matching.compile_match, ('Name==web', 'Name=web', 'State.Name!=web'))
+
+        self.assertEqual(matching.estimate_cost(equal), 1)
+        self.assertGreater(matching.estimate_cost(contains), matching.estimate_cost(equal))
+        self.assertGreater(matching.estimate_cost(nested), matching.estimate_cost(contains))
+        self.assertGreater(matching.estimate_cost(matching.compile_match('Size==5')), 1)
+
+        statistics = matching.HarvestMatchStatistics(max_syntaxes=2)
+        self.assertEqual(statistics.order([nested, contains, equal]), [equal, contains, nested])
+
+        # Observed selectivities are averaged with the latest run
+        statistics.record(equal, evaluated=10, matched=10)
+        self.assertEqual(statistics.selectivity(equal), 1)
+        statistics.record(equal, evaluated=10, matched=8)
+        self.assertEqual(statistics.selectivity(equal), 0.9)
+        self.assertEqual(statistics.order([equal, contains]), [contains, equal])
+
+        # Nothing is recorded when no record was evaluated
+        statistics.record(contains, evaluated=0, matched=0)
+        self.assertEqual(len(statistics), 1)
+
+        # The statistics are discarded once they hold more than max_syntaxes syntaxes
+        statistics.record(contains, evaluated=4, matched=1)
+        statistics.record(nested, evaluated=4, matched=1)
+        self.assertEqual(len(statistics), 1)
+        self.assertEqual(statistics.selectivity(equal), 0.1)
+
+        # Statistics order the operands of an expression for the call they are given to, and the cached expression is
+        # left unchanged
+        expression = matching.compile_expression('Name=web OR Name==db')
+        order = list(expression._order)
+        statistics = matching.HarvestMatchStatistics()
+        expression.evaluate_records([{'Name': 'web'}] * 4, statistics)
+        self.assertEqual(statistics.selectivity(expression.operands[0]), 1)
+        self.assertEqual(statistics.order(expression.operands, 'OR'), [expression.operands[0], expression.operands[1]])
+        self.assertEqual(expression._order, order)
+        self.assertIs(matching.compile_expression('Name=web OR Name==db'), expression)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,252 @@
+import unittest
+from CloudHarvestCoreDataModel.pipeline import (HarvestRecordSetPipeline, _stream_plan, merge_matches, plan_stages,
+                                                push_down_limits, split_plan)
+from CloudHarvestCoreDataModel.recordset import HarvestRecordSet
+
+test_stages = [
+    {'copy_key': {'source_key': 'name', 'target_key': 'name_copy'}},
+    {'key_value_list_to_dict': {'source_key': 'tags', 'target_key': 'tags_dict', 'name_key': 'Name'}},
+    {'add_match': {'syntax': 'age>26'}},
+    {'remove_unmatched_records': None},
+    {'rename_key': {'old_key': 'name_copy', 'new_key': 'alias'}},
+    {'add_key_from_keys': {'new_key': 'label', 'sequence': [{'key': 'alias'}, {'key': 'age'}], 'delimiter': '-'}},
+]
+
+
+def make_recordset():
+    return HarvestRecordSet(data=[
+        {'name': f'Test{i}', 'age': 20 + i, 'tags': [{'Name': 'color', 'Value': f'color{i}'}]}
+        for i in range(10)
+    ])
+
+
+class TestHarvestRecordSetPipeline(unittest.TestCase):
+    def test_plan_stages(self):
+        plan = plan_stages(test_stages)
+
+        self.assertEqual([target for target, functions in plan], ['record', 'recordset', 'recordset', 'record'])
+        self.assertEqual([function for function, arguments in plan[0][1]], ['copy_key', 'key_value_list_to_dict'])
+        self.assertEqual(plan[2][1], [('remove_unmatched_records', {})])
+
+    def test_plan_stages_flatten(self):
+        stages = [{'copy_key': {'source_key': 'name', 'target_key': 'name_copy'}}, {'flatten': None},
+                  {'rename_key': {'old_key': 'tags.0.Value', 'new_key': 'color'}}, {'unflatten': {'separator': '.'}}]
+
+        # flatten and unflatten are fused with the record stages around them
+        plan = plan_stages(stages)
+        self.assertEqual([target for target, functions in plan], ['record'])
+
+        expected = make_recordset().flatten()
+        [record.copy_key(source_key='name', target_key='name_copy').rename_key('tags.0.Value', 'color') for record in expected]
+        expected.unflatten()
+
+        for workers in (None, 2):
+            with self.subTest(workers=workers):
+                result = HarvestRecordSetPipeline(stages=stages, workers=workers, chunk_size=4).run(make_recordset())
+                self.assertEqual(result, expected)
+                self.assertEqual(result.keys, expected.keys)
+                self.assertTrue(all(record.is_flat is False for record in result))
+
+    def test_plan_stages_invalid(self):
+        with self.assertRaises(AttributeError):
+            plan_stages([{'copy_key': {'source_key': 'name', 'target_key': 'name_copy'}}, {'not_a_function': {}}])
+
+    def test_run(self):
+        from CloudHarvestCoreDataModel.record import HarvestRecord
+
+        # The stages applied one at a time over the whole record set
+        expected = make_recordset()
+        for stage in test_stages:
+            for function, arguments in stage.items():
+                if hasattr(HarvestRecordSet, function):
+                    getattr(expected, function)(**arguments or {})
+
+                else:
+                    [getattr(record, function)(**arguments or {}) for record in expected]
+
+        pipeline = HarvestRecordSetPipeline(stages=test_stages)
+        result = pipeline.run(make_recordset())
+
+        self.assertEqual(result, expected)
+        self.assertEqual(len(result), 3)
+        self.assertEqual(result[0]['label'], 'Test7-27')
+        self.assertEqual(pipeline.position, len(test_stages))
+        self.assertTrue(all(isinstance(record, HarvestRecord) for record in result))
+
+    def test_run_parallel(self):
+        expected = HarvestRecordSetPipeline(stages=test_stages).run(make_recordset())
+
+        recordset = make_recordset().create_index('alias_index', 'alias')
+        records = list(recordset)
+
+        pipeline = HarvestRecordSetPipeline(stages=test_stages, workers=2, chunk_size=1)
+        self.assertTrue(pipeline._is_parallel(recordset, pipeline.plan[0][1]))
+        self.assertFalse(pipeline._is_parallel(recordset, [('match', {'syntax': 'age>26'})]))
+
+        result = pipeline.run(recordset)
+
+        # The original records are updated in order
+        self.assertEqual([dict(record) for record in result], [dict(record) for record in expected])
+        self.assertTrue(all(record is records[7 + i] for i, record in enumerate(result)))
+        self.assertTrue(all(record.recordset is result for record in result))
+
+        # Indexes are updated after the parallel stages
+        result.add_match('alias==Test8')
+        self.assertEqual(result.last_match_plan['path'], 'index')
+        self.assertEqual(result.count_matched_records(), 1)
+
+    def test_stream(self):
+        expected = HarvestRecordSetPipeline(stages=test_stages).run(make_recordset())
+
+        consumed = []
+
+        def source():
+            for record in make_recordset():
+                consumed.append(record['name'])
+                yield dict(record)
+
+        pipeline = HarvestRecordSetPipeline(stages=test_stages, chunk_size=4)
+        stream = pipeline.stream(source())
+
+        # The first chunk has no matching records, so only the first two chunks are read to produce the first result
+        first = next(stream)
+        self.assertEqual(len(consumed), 8)
+
+        result = [first] + list(stream)
+        self.assertEqual([dict(record) for record in result], [dict(record) for record in expected])
+        self.assertEqual(pipeline.position, len(test_stages))
+
+    def test_stream_pipeline_breaker(self):
+        stages = [
+            {'add_match': {'syntax': 'age>24'}},
+            {'copy_key': {'source_key': 'age', 'target_key': 'age_copy'}},
+            {'rebuild_indexes': None},
+            {'remove_unmatched_records': None},
+        ]
+
+        streamed, remaining = split_plan(plan_stages(stages))
+        self.assertEqual([functions[0][0] for target, functions in remaining], ['rebuild_indexes', 'remove_unmatched_records'])
+
+        data = [{'name': record['name'], 'age': record['age']} for record in make_recordset()] * 2
+        expected = HarvestRecordSetPipeline(stages=stages).run(HarvestRecordSet(data=data))
+
+        pipeline = HarvestRecordSetPipeline(stages=stages, chunk_size=3)
+        result = list(pipeline.stream(iter(data)))
+
+        # Match results from each chunk are kept when the stream is collected before the breaker
+        self.assertEqual(result, expected)
+        self.assertEqual([record['age'] for record in result], [25, 26, 27, 28, 29] * 2)
+        self.assertEqual(pipeline.position, len(stages))
+
+    def test_stream_remove_duplicates(self):
+        stages = [{'remove_duplicates': {'keys': ['name']}}, {'copy_key': {'source_key': 'age', 'target_key': 'age_copy'}}]
+        data = [dict(record) for record in make_recordset()] * 3
+
+        self.assertEqual(split_plan(plan_stages(stages))[1], [])
+
+        # Duplicates are removed across chunks
+        result = list(HarvestRecordSetPipeline(stages=stages, chunk_size=4).stream(iter(data)))
+        self.assertEqual([record['name'] for record in result], [f'Test{i}' for i in range(10)])
+
+    def test_stream_add_freshness(self):
+        from datetime import datetime, timezone
+
+        stages = [{'add_freshness': {'fresh_range': 60}}, {'add_freshness': {'now': datetime(2024, 1, 1, tzinfo=timezone.utc)}}]
+        plan = _stream_plan(plan_stages(stages))
+
+        # Every chunk is measured from the same reference time, unless the stage provides one
+        first, second = (functions[0][1] for target, functions in plan)
+        self.assertEqual(first['fresh_range'], 60)
+        self.assertIsInstance(first['now'], datetime)
+        self.assertEqual(second['now'], datetime(2024, 1, 1, tzinfo=timezone.utc))
+
+        data = [{'Active': True, 'LastSeen': '2023-12-31T23:30:00+00:00'}] * 5
+        result = list(HarvestRecordSetPipeline(stages=stages[1:], chunk_size=2).stream(iter(data)))
+        self.assertEqual([record['f'] for record in result], ['F'] * 5)
+
+    def test_run_group_by(self):
+        stages = [
+            {'add_match': {'syntax': 'age>24'}},
+            {'remove_unmatched_records': None},
+            {'group_by': {'fields': 'parity', 'aggregations': {'people': 'count', 'oldest': {'max': 'age'}}}},
+            {'add_match': {'syntax': 'people>2'}},
+        ]
+
+        data = [{'name': record['name'], 'age': record['age'], 'parity': record['age'] % 2} for record in make_recordset()]
+
+        # Stages after group_by are applied to the record set it returns
+        result = HarvestRecordSetPipeline(stages=stages).run(HarvestRecordSet(data=data))
+        self.assertEqual([dict(record) for record in result], [{'parity': 1, 'people': 3, 'oldest': 29},
+                                                               {'parity': 0, 'people': 2, 'oldest': 28}])
+        self.assertEqual([dict(record) for record in result.get_matched_records()], [dict(result[0])])
+
+        streamed = list(HarvestRecordSetPipeline(stages=stages, chunk_size=3).stream(iter(data)))
+        self.assertEqual(streamed, result)
+
+    def test_push_down_limits(self):
+        stages = [
+            {'add_match': {'syntax': 'age>21'}},
+            {'add_match': {'syntax': 'age<29'}},
+            {'remove_unmatched_records': None},
+            {'skip': {'count': 1}},
+            {'limit': {'count': 2}},
+            {'copy_key': {'source_key': 'age', 'target_key': 'age_copy'}},
+        ]
+
+        plan = push_down_limits(plan_stages(stages))
+        self.assertEqual(plan[0], ('matches', [('add_match', {'syntax': 'age>21', 'limit': 3}),
+                                               ('add_match', {'syntax': 'age<29', 'limit': 3})]))
+        self.assertEqual(plan[1:], plan_stages(stages)[2:])
+
+        # Matches are not limited when the unmatched records are not removed before the limit
+        unlimited = [stages[0], stages[4]]
+        self.assertEqual(push_down_limits(plan_stages(unlimited)), plan_stages(unlimited))
+
+        pipeline = HarvestRecordSetPipeline(stages=stages)
+        result = pipeline.run(make_recordset())
+
+        self.assertEqual([record['age_copy'] for record in result], [23, 24])
+        self.assertEqual(result.last_match_plan['evaluated'], 5)
+        self.assertEqual(pipeline.position, len(stages))
+
+        # Each chunk of a stream stops matching early and the limit applies to the whole stream
+        streamed = list(HarvestRecordSetPipeline(stages=stages, chunk_size=4).stream(make_recordset()))
+        self.assertEqual([dict(record) for record in streamed], [dict(record) for record in result])
+
+    def test_merge_matches(self):
+        stages = [
+            {'add_match': {'syntax': 'age>21'}},
+            {'add_match': {'syntax': 'name==Test5'}},
+            {'add_match': {'syntax': 'age<29'}},
+            {'remove_unmatched_records': None},
+            {'add_match': {'syntax': 'age>0'}},
+        ]
+
+        plan = merge_matches(plan_stages(stages))
+        self.assertEqual(plan[0], ('matches', [('add_match', {'syntax': 'age>21'}),
+                                               ('add_match', {'syntax': 'name==Test5'}),
+                                               ('add_match', {'syntax': 'age<29'})]))
+        self.assertEqual(plan[1:], plan_stages(stages)[3:])
+
+        pipeline = HarvestRecordSetPipeline(stages=stages[:4])
+        result = pipeline.run(make_recordset())
+
+        self.assertEqual([record['name'] for record in result], ['Test5'])
+        self.assertEqual(pipeline.position, 4)
+
+        # Matches with a limit are not merged with the matches after them
+        limited = merge_matches([('matches', [('add_match', {'syntax': 'age>21', 'limit': 1})]), plan[-1]])
+        self.assertEqual(len(limited), 2)
+
+    def test_run_reindexes(self):
+        recordset = make_recordset().create_index('age_index', 'age')
+
+        HarvestRecordSetPipeline(stages=[{'cast': {'source_key': 'age', 'format_string': 'str'}}]).run(recordset)
+        recordset.add_match('age==25')
+
+        self.assertEqual(recordset.last_match_plan['path'], 'index')
+        self.assertEqual([record['name'] for record in recordset.get_matched_records()], ['Test5'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -17,7 +17,7 @@ class TestHarvestRecord(unittest.TestCase):
         """
         Test the add_freshness method
         """
-        from datetime import datetime, timezone
+        from datetime import datetime, timedelta, timezone
 
         self.record['Active'] = True
         self.record['LastSeen'] = str(datetime(2020, 1, 1, tzinfo=timezone.utc))
@@ -32,6 +32,11 @@ class TestHarvestRecord(unittest.TestCase):
         self.record.add_freshness()
         self.assertEqual(self.record['f'], 'F')
 
+        # test an aging record state, with a naive LastSeen treated as UTC
+        self.record['LastSeen'] = str(datetime.now(tz=timezone.utc).replace(tzinfo=None) - timedelta(hours=2))
+        self.record.add_freshness()
+        self.assertEqual(self.record['f'], 'A')
+
         # test an inactive record state
         self.record['Active'] = False
         self.record.add_freshness()
@@ -137,12 +142,61 @@ class TestHarvestRecord(unittest.TestCase):
         self.assertEqual(r['key1.key2.key3'], 'value')
         self.assertTrue(r.is_flat)
 
+    def test_HarvestOverlayRecord(self):
+        """
+        Test that an overlay record reads its base and only stores the keys set on it
+        """
+        import json
+        import pickle
+
+        base = {'key1': 'value1', 'key2': 'value2'}
+        overlay = record.HarvestOverlayRecord(base)
+        overlay['key2'] = 'changed'
+        overlay['key3'] = 'value3'
+
+        self.assertEqual(overlay, {'key1': 'value1', 'key2': 'changed', 'key3': 'value3'})
+        self.assertEqual(list(overlay), ['key1', 'key2', 'key3'])
+        self.assertEqual(len(overlay), 3)
+        self.assertEqual(json.loads(json.dumps(overlay)), dict(overlay))
+        self.assertEqual(pickle.loads(pickle.dumps(overlay)), overlay)
+        self.assertEqual(dict.__len__(overlay), 2)
+
+        # The base is copied into the record before a key is removed
+        copy = overlay.copy()
+        overlay.pop('key1')
+        self.assertEqual(overlay, {'key2': 'changed', 'key3': 'value3'})
+        self.assertEqual(base, {'key1': 'value1', 'key2': 'value2'})
+        self.assertEqual(copy['key1'], 'value1')
+
     def test_is_matched_record(self):
         """
         Test the is_matched_record method
         """
         self.assertTrue(self.record.is_matched_record)
 
+    def test_compact_layout(self):
+        """
+        Test that records do not carry an instance __dict__ and only allocate match state when needed
+        """
+        self.assertFalse(hasattr(self.record, '__dict__'))
+        self.assertIsNone(self.record._non_matching_expressions)
+
+        self.record.match('key1=value2')
+        self.assertEqual(len(self.record.non_matching_expressions), 1)
+
+        # copy() returns a HarvestRecord without the match state
+        copied = self.record.copy()
+        self.assertIsInstance(copied, record.HarvestRecord)
+        self.assertEqual(copied, self.record)
+        self.assertTrue(copied.is_matched_record)
+
+        # Records are pickled without their recordset
+        from pickle import dumps, loads
+        self.record.recordset = ['not', 'pickled']
+        unpickled = loads(dumps(self.record))
+        self.assertEqual(unpickled, self.record)
+        self.assertFalse(unpickled.recordset)
+
     def test_key_value_list_to_dict(self):
         """
         Test the key_value_list_to_dict method
@@ -14,10 +14,166 @@ class TestHarvestRecordSet(unittest.TestCase):
         self.recordset.add(data=[{'index': 5, 'value': 'value_5'}])
         self.assertEqual(len(self.recordset), 6)
 
+        # None is ignored
+        self.recordset.add(data=None)
+        self.assertEqual(len(self.recordset), 6)
+
+    def test_add_records_of_another_recordset(self):
+        self.recordset.add_match('index==1')
+
+        # Records of another record set are copied, so changing the new record set leaves the original unchanged
+        for recordset in (HarvestRecordSet(data=[{'index': 9}]) + self.recordset, HarvestRecordSet(data=self.recordset)):
+            with self.subTest(recordset=recordset.name):
+                recordset.modify_records('rename_key', {'old_key': 'index', 'new_key': 'position'})
+
+                self.assertEqual(self.recordset[0], {'index': 0, 'value': 'value_0'})
+                self.assertTrue(all(record.recordset is recordset for record in recordset))
+                self.assertTrue(all(record.recordset is self.recordset for record in self.recordset))
+                self.assertEqual([record.is_matched_record for record in self.recordset[:3]], [False, True, False])
+
+    def test_add_many(self):
+        self.recordset.create_index('index1', 'index')
+
+        # Generators are accepted and nested lists are flattened
+        self.recordset.add_many(data=({'index': i, 'value': f'value_{i}'} for i in range(5, 8)))
+        self.recordset.add_many(data=[[{'index': 8, 'value': 'value_8'}], HarvestRecord(index=9, value='value_9')])
+
+        self.assertEqual(len(self.recordset), 10)
+        self.assertEqual(len(self.recordset.indexes['index1']), 10)
+        self.assertTrue(all(record.recordset is self.recordset for record in self.recordset))
+
+    def test_add_freshness(self):
+        from datetime import datetime, timedelta, timezone
+
+        now = datetime.now(tz=timezone.utc)
+        seen = [now, now - timedelta(hours=2), now - timedelta(days=2)]
+
+        records = HarvestRecordSet(data=[{'Active': True, 'LastSeen': str(last_seen)} for last_seen in seen])
+        records.add(data=[{'Active': False, 'LastSeen': str(now)},
+                          {'Harvest': {'Dates': {'Active': True, 'LastSeen': now - timedelta(hours=3)}}},
+                          {'Active': True, 'LastSeen': 'not a date'}])
+        records.create_index('freshness', 'f')
+
+        records.add_freshness(cache_dates=True)
+
+        self.assertEqual([record['f'] for record in records], ['F', 'A', 'S', 'I', 'A', 'I'])
+        self.assertEqual(records.key_catalog['f'], 6)
+        self.assertEqual(len(records.indexes['freshness'][('A', )]), 2)
+
+        # The same codes are assigned record by record
+        for record in records:
+            self.assertEqual(HarvestRecord(**record).add_freshness(now=now)['f'], record['f'])
+
+        # Parsed dates are kept until LastSeen changes
+        self.assertEqual(records[0]._last_seen, (str(now), now))
+        records[0]['LastSeen'] = str(now - timedelta(days=2))
+        records.add_freshness()
+        self.assertEqual(records[0]['f'], 'S')
+
     def test_add_match(self):
         self.recordset.add_match(syntax='value==value_1')
         self.assertEqual(self.recordset[1].is_matched_record, True)
 
+    def test_add_match_limit(self):
+        recordset = HarvestRecordSet(data=[{'index': i, 'parity': i % 2} for i in range(10)])
+        recordset.add_match('index>1')
+
+        # Evaluation stops once two records match both syntaxes
+        recordset.add_match(['parity==0', 'index<9'], limit=2)
+        self.assertEqual([record['index'] for record in recordset.get_matched_records()], [2, 4])
+        self.assertEqual(recordset.last_match_plan['evaluated'], 3)
+        self.assertEqual(len(recordset.match_expressions), 3)
+
+        # Records are only marked as failing the matches they were evaluated against, as they are without a limit, and
+        # the records after the limit are marked as not evaluated
+        self.assertEqual(list(recordset.match_bitmaps[1]), [1, 1, 1, 0, 1, 1, 1, 1, 1, 1])
+        self.assertEqual(list(recordset.match_bitmaps[2]), [1] * 10)
+        self.assertEqual(list(recordset.limit_bitmap), [1] * 5 + [0] * 5)
+        self.assertEqual(recordset.count_matched_records(), 2)
+        self.assertEqual([recordset.is_matched(record) for record in recordset[3:7]], [False, True, False, False])
+        self.assertEqual([match.is_match for match in recordset.explain_record(recordset[6])], [True, True, True])
+
+        recordset.remove_unmatched_records().limit(5)
+        self.assertEqual([record['index'] for record in recordset], [2, 4])
+        self.assertIsNone(recordset.limit_bitmap)
+
+        # Several syntaxes may be added at once without a limit
+        recordset = HarvestRecordSet(data=[{'index': i} for i in range(5)]).add_match(['index>0', 'index<3'])
+        self.assertEqual(recordset.count_matched_records(), 2)
+
+    def test_add_match_order(self):
+        recordset = HarvestRecordSet(data=[{'index': i, 'value': f'value_{i}'} for i in range(10)])
+
+        # The equality match is cheaper and more selective, so the range match only evaluates the record it matched
+        recordset.add_match(['index>0', 'value==value_3'])
+        self.assertEqual(recordset.last_match_plan['evaluated'], 10)
+        self.assertEqual([record['index'] for record in recordset.get_matched_records()], [3])
+
+        # Later matches only evaluate the matched records
+        recordset.add_match('index<100')
+        self.assertEqual(recordset.last_match_plan['evaluated'], 1)
+
+        # Records are only explained as failing the matches they were evaluated against
+        self.assertEqual([match.syntax for match in recordset[4].non_matching_expressions], ['value==value_3'])
+        self.assertEqual([match.syntax for match in recordset[0].non_matching_expressions], ['value==value_3'])
+
+        # The observed selectivity orders later queries on the same record set
+        statistics = recordset.match_statistics
+        self.assertEqual(statistics.selectivity(recordset.match_expressions[1]), 0.1)
+        self.assertEqual(statistics.selectivity(recordset.match_expressions[0]), 1)
+
+        # Record sets keep their own statistics
+        self.assertEqual(len(HarvestRecordSet().match_statistics), 0)
+
+    def test_add_match_expression(self):
+        recordset = HarvestRecordSet(data=[{'State': state, 'Size': size} for state, size in
+                                           (('running', 8), ('stopped', 16), ('pending', 8), ('running', 32))])
+
+        recordset.add_match('State==running OR State==stopped')
+        self.assertEqual([record['Size'] for record in recordset.get_matched_records()], [8, 16, 32])
+
+        recordset.add_match('NOT (State==running AND Size>16)')
+        self.assertEqual([record['Size'] for record in recordset.get_matched_records()], [8, 16])
+
+        # Records explain the expressions they failed
+        self.assertEqual([match.final_match_operation for match in recordset[3].non_matching_expressions],
+                         ['NOT (State==running AND Size>16)'])
+
+        # Records may also be matched against an expression directly
+        self.assertTrue(HarvestRecord(State='stopped').match('State==running OR State==stopped'))
+
+        # Values which contain the keywords are still matched as a single syntax
+        recordset = HarvestRecordSet(data=[{'Name': 'Salt AND Pepper'}, {'Name': 'Salt'}]).add_match('Name==Salt AND Pepper')
+        self.assertEqual([record['Name'] for record in recordset.get_matched_records()], ['Salt AND Pepper'])
+
+    def test_add_match_with_index(self):
+        self.recordset.add(data=[{'index': 1, 'value': 'value_1'}, {'index': 7}])
+        self.assertEqual(self.recordset.explain_match('index==1')['path'], 'scan')
+
+        self.recordset.create_index('index1', 'index')
+        self.assertEqual(self.recordset.explain_match('index==1'),
+                         {'syntax': 'index==1', 'path': 'index', 'index_name': 'index1'})
+
+        # Only equality matches on the indexed field can use the index
+        self.assertEqual(self.recordset.explain_match('index>=1')['path'], 'scan')
+        self.assertEqual(self.recordset.explain_match('value==value_1')['path'], 'scan')
+
+        self.recordset.add_match(syntax='index==1')
+        self.assertEqual(self.recordset.last_match_plan['path'], 'index')
+        self.assertEqual([record.is_matched_record for record in self.recordset],
+                         [False, True, False, False, False, True, False])
+
+    def test_add_match_with_sorted_index(self):
+        self.recordset.create_index('index1', 'index', index_type='sorted')
+        self.assertEqual(self.recordset.explain_match('index>2')['path'], 'index')
+
+        self.recordset.add_match(syntax='index>2')
+        self.assertEqual([record.is_matched_record for record in self.recordset], [False, False, False, True, True])
+
+        # The index type is kept when indexes are rebuilt
+        self.recordset.rebuild_indexes()
+        self.assertEqual(self.recordset.indexes['index1'].index_type, 'sorted')
+
     def test_clear_matches(self):
         self.recordset.add_match(syntax='value==dummy')
         self.assertEqual(self.recordset[1].is_matched_record, False)
@@ -32,6 +188,50 @@ class TestHarvestRecordSet(unittest.TestCase):
         # Records with no records in non_matching_expressions are considered matched
         self.assertEqual(self.recordset[1].is_matched_record, True)
 
+    def test_key_catalog(self):
+        self.recordset.add(data=[{'index': 5, 'extra': True}, {'index': 5, 'extra': True}])
+        self.assertEqual(self.recordset.keys, ['extra', 'index', 'value'])
+        self.assertEqual(self.recordset.key_catalog, {'index': 7, 'value': 5, 'extra': 2})
+        self.assertEqual(self.recordset.key_fill_rates()['extra'], 2 / 7)
+
+        self.recordset.remove_duplicates()
+        self.assertEqual(self.recordset.key_catalog['extra'], 1)
+
+        self.recordset.add_match('value=value')
+        self.recordset.remove_unmatched_records()
+        self.assertEqual(self.recordset.keys, ['index', 'value'])
+
+        # Records modified through the record set are recounted
+        self.recordset.modify_records('rename_key', {'old_key': 'value', 'new_key': 'renamed'})
+        self.assertEqual(self.recordset.key_catalog, {'index': 5, 'renamed': 5})
+
+        self.recordset.add(data={'nested': {'key': 'value'}, 'list': [1, 2]})
+        self.recordset.unwind('list', preserve_null_and_empty_keys=False)
+        self.assertEqual(self.recordset.key_catalog, {'nested': 2, 'list': 2})
+
+        # Records modified directly are recounted on request
+        self.recordset[0].pop('nested')
+        self.assertEqual(self.recordset.rebuild_key_catalog().key_catalog['nested'], 1)
+
+    def test_match_bitmaps(self):
+        self.recordset.add_match(syntax='index>=1')
+        self.recordset.add_match(syntax='value!=value_3')
+        self.assertEqual([list(bitmap) for bitmap in self.recordset.match_bitmaps], [[0, 1, 1, 1, 1], [1, 1, 1, 0, 1]])
+
+        # Match results are not stored on the records
+        self.assertIsNone(self.recordset[3]._non_matching_expressions)
+        self.assertEqual(self.recordset.count_matched_records(), 3)
+
+        # Explanations are produced on demand
+        explanation = self.recordset.explain_record(self.recordset[3])
+        self.assertEqual([match.is_match for match in explanation], [True, False])
+        self.assertEqual(explanation[1].final_match_operation, 'value_3!=value_3')
+
+        # Records added after a match are matched, and matches called on a record directly are still considered
+        self.recordset.add(data={'index': 5, 'value': 'value_5'})
+        self.recordset[4].match('value==nope')
+        self.assertEqual([record['index'] for record in self.recordset.get_matched_records()], [1, 2, 5])
+
     def test_create_index(self):
         # Create a recordset with 10 records, each record has 'index' and 'value' fields
         self.recordset = HarvestRecordSet(data=[{'index': i, 'value': f'value_{i}'} for i in range(10)])
@@ -51,15 +251,179 @@ class TestHarvestRecordSet(unittest.TestCase):
         self.recordset.drop_index('index1')
         self.assertEqual('index1' in self.recordset.indexes, False)
 
+    def test_flatten(self):
+        records = HarvestRecordSet(data=[{'index': i, 'tags': {'Name': f'web-{i}'}} for i in range(3)])
+        records[2].is_flat = True
+        records.create_index('name', 'tags.Name')
+
+        records.flatten()
+
+        self.assertEqual(records[0], {'index': 0, 'tags.Name': 'web-0'})
+        self.assertIn('tags', records[2])
+        self.assertEqual(records.key_catalog, {'index': 3, 'tags.Name': 2, 'tags': 1})
+        self.assertEqual(records.indexes['name'][('web-1', )], [records[1]])
+
+        records.unflatten()
+
+        self.assertEqual([record['tags'] for record in records], [{'Name': f'web-{i}'} for i in range(3)])
+        self.assertFalse(any(record.is_flat for record in records))
+
+    def test_flattened_keys(self):
+        records = HarvestRecordSet(data=[{'id': i, 'Tags': [{'Key': 'Name', 'Value': f'web-{i % 2}'}]} for i in range(4)])
+
+        # Flattened keys are resolved against nested records by matches and indexes
+        records.add_match('Tags.0.Value==web-1')
+        self.assertEqual(records.count_matched_records(), 2)
+
+        records.create_index('name', 'Tags.0.Value')
+        self.assertEqual([record['id'] for record in records.indexes['name'][('web-0', )]], [0, 2])
+
+        self.assertEqual(records.to_flat_records(keys=['id', 'Tags.0.Value', 'Tags.1.Value'])[1],
+                         {'id': 1, 'Tags.0.Value': 'web-1', 'Tags.1.Value': None})
+        self.assertEqual(records.to_flat_records()[0], {'id': 0, 'Tags.0.Key': 'Name', 'Tags.0.Value': 'web-0'})
+        self.assertIn('Tags', records[0])
+
     def test_get_matched_records(self):
         self.recordset.add_match(syntax='value==value_1')
         matched_records = self.recordset.get_matched_records()
         self.assertEqual(len(matched_records), 1)
 
+        # The matched records keep their record set and are counted in the result's key catalog
+        self.assertEqual(matched_records.keys, ['index', 'value'])
+        self.assertIs(matched_records[0].recordset, self.recordset)
+
+    def test_group_by(self):
+        recordset = HarvestRecordSet(data=[
+            {'Account': 'a', 'Region': 'us-east-1', 'Size': 10, 'Type': 't3'},
+            {'Account': 'b', 'Region': 'us-east-1', 'Size': 5, 'Type': 'm5'},
+            {'Account': 'a', 'Region': 'us-west-2', 'Size': None, 'Type': 't3'},
+            {'Account': 'a', 'Region': 'us-east-1', 'Size': 30, 'Type': 'm5'},
+            {'Region': 'us-east-1', 'Size': 'large'},
+        ])
+
+        aggregations = {
+            'Records': 'count',
+            'Sized': {'count': 'Size'},
+            'Total': {'sum': 'Size'},
+            'Mean': {'avg': 'Size'},
+            'Smallest': {'min': 'Size'},
+            'Largest': {'max': 'Size'},
+            'FirstType': {'first': 'Type'},
+            'LastType': {'last': 'Type'},
+            'Types': {'count_distinct': 'Type'},
+        }
+
+        result = recordset.group_by('Account', aggregations)
+
+        # The result is a new record set with one record per group, in the order each group was first seen
+        self.assertIsInstance(result, HarvestRecordSet)
+        self.assertEqual(len(recordset), 5)
+        self.assertEqual([record['Account'] for record in result], ['a', 'b', None])
+        self.assertEqual(dict(result[0]), {'Account': 'a', 'Records': 3, 'Sized': 2, 'Total': 40, 'Mean': 20.0,
+                                           'Smallest': 10, 'Largest': 30, 'FirstType': 't3', 'LastType': 'm5',
+                                           'Types': 2})
+
+        # Non-numeric values are not summed
+        self.assertEqual((result[2]['Total'], result[2]['Mean'], result[2]['Largest']), (0, None, 'large'))
+
+        # A hash index on the same fields is used instead of reading the records, and first and last follow record order
+        recordset.create_index('account_region', 'Account', 'Region')
+        recordset[2]['Region'] = 'us-east-1'
+        recordset.records_modified()
+
+        scanned = HarvestRecordSet(data=[dict(record) for record in recordset])
+        self.assertEqual(recordset.group_by(['Account', 'Region'], aggregations),
+                         scanned.group_by(['Account', 'Region'], aggregations))
+
+        grouped = recordset.group_by(['Account', 'Region'], {'Count': 'count', 'LastType': {'last': 'Type'}})
+        self.assertEqual(grouped[0], {'Account': 'a', 'Region': 'us-east-1', 'Count': 3, 'LastType': 'm5'})
+        self.assertEqual(recordset.group_by('Region')[0], {'Region': 'us-east-1', 'count': 5})
+
+        with self.assertRaises(ValueError):
+            recordset.group_by('Account', {'Total': {'median': 'Size'}})
+
+    def test_limit(self):
+        self.recordset.create_index('value_index', 'value')
+        self.recordset.add_match('index>0')
+
+        self.recordset.skip(1).limit(2)
+        self.assertEqual([record['index'] for record in self.recordset], [1, 2])
+        self.assertEqual(self.recordset.keys, ['index', 'value'])
+        self.assertEqual(self.recordset.key_catalog['index'], 2)
+        self.assertEqual(len(self.recordset.indexes['value_index']), 2)
+        self.assertEqual(self.recordset.count_matched_records(), 2)
+
+        self.assertEqual(len(self.recordset.limit(10)), 2)
+        self.assertEqual(len(self.recordset.skip(10)), 0)
+
+        with self.assertRaises(ValueError):
+            self.recordset.limit(-1)
+
     def test_modify_records(self):
         self.recordset.modify_records('copy_key', {'source_key': 'value', 'target_key': 'value_copy'})
         self.assertEqual(self.recordset[1]['value_copy'], 'value_1')
 
+    def test_index_maintenance(self):
+        self.recordset.create_index('index1', 'index')
+
+        # Added records are inserted into the existing index
+        self.recordset.add(data={'index': 5, 'value': 'value_5'})
+        self.assertEqual(len(self.recordset.indexes['index1']), 6)
+
+        # Modified records are moved to their new bucket
+        self.recordset.modify_records('copy_key', {'source_key': 'value', 'target_key': 'index'})
+        self.assertEqual(self.recordset.indexes['index1'][('value_5', )][0]['index'], 'value_5')
+        self.assertNotIn((5, ), self.recordset.indexes['index1'])
+
+        # Removed records are evicted
+        self.recordset.add_match(syntax='value==value_1')
+        self.recordset.remove_unmatched_records()
+        self.assertEqual(list(self.recordset.indexes['index1'].keys()), [('value_1', )])
+
+    def test_list_operations(self):
+        def matched():
+            return [record['x'] for record in recordset if record.is_matched_record]
+
+        recordset = HarvestRecordSet(data=[{'x': 1}, {'x': 2}, {'x': 3}])
+        recordset.create_index('by_x', 'x')
+        recordset.add_match('x==1')
+
+        # Removed records take their match results, index entries, and key counts with them
+        self.assertEqual(recordset.pop(0), {'x': 1})
+        self.assertEqual(matched(), [])
+        self.assertEqual(recordset.key_catalog['x'], 2)
+        self.assertNotIn((1, ), recordset.indexes['by_x'])
+
+        recordset.clear_matches().add_match('x==2')
+        del recordset[0]
+        self.assertEqual(matched(), [])
+        self.assertEqual(recordset.key_catalog['x'], 1)
+
+        # Moved records keep their match results
+        recordset = HarvestRecordSet(data=[{'x': 1}, {'x': 2}, {'x': 3}]).add_match('x==1')
+        recordset.reverse()
+        self.assertEqual([record['x'] for record in recordset], [3, 2, 1])
+        self.assertEqual(matched(), [1])
+
+        # Added records are matched until the next add_match(), as with add()
+        recordset.create_index('by_x', 'x')
+        recordset.append({'x': 4})
+        recordset.insert(0, {'x': 0})
+        self.assertEqual(matched(), [0, 1, 4])
+        self.assertEqual(recordset.key_catalog['x'], 5)
+        self.assertEqual(recordset.indexes['by_x'][(0, )], [recordset[0]])
+        self.assertIs(recordset[-1].recordset, recordset)
+
+        recordset[1:3] = [{'x': 5}]
+        self.assertEqual([record['x'] for record in recordset], [0, 5, 1, 4])
+        self.assertEqual(matched(), [0, 5, 1, 4])
+        self.assertEqual(recordset.key_catalog['x'], 4)
+        self.assertNotIn((3, ), recordset.indexes['by_x'])
+        self.assertEqual(recordset.count_matched_records(), 4)
+
+        recordset.clear()
+        self.assertEqual((len(recordset), recordset.match_bitmaps, dict(recordset.key_catalog)), (0, [], {}))
+
     def test_rebuild_indexes(self):
         self.recordset.create_index('index1', 'index')
         self.assertEqual(len(self.recordset.indexes['index1']), 5)
@@ -73,16 +437,88 @@ class TestHarvestRecordSet(unittest.TestCase):
         self.recordset.remove_duplicates()
         self.assertEqual(len(self.recordset), 5)
 
+        # Records containing lists and dictionaries
+        self.recordset.add(data=[{'index': 5, 'tags': [{'Key': 'a'}], 'meta': {'b': 1, 'a': 2}},
+                                 {'meta': {'a': 2, 'b': 1}, 'tags': [{'Key': 'a'}], 'index': 5}])
+        self.recordset.remove_duplicates()
+        self.assertEqual(len(self.recordset), 6)
+
+        # Duplicates on a subset of keys keep the first record
+        self.recordset.remove_duplicates(keys=['index'])
+        self.assertEqual([record['index'] for record in self.recordset], [0, 1, 2, 3, 4, 5])
+
     def test_remove_unmatched_records(self):
         self.recordset.add_match(syntax='value==value_1')
         self.recordset.remove_unmatched_records()
         self.assertEqual(len(self.recordset), 1)
 
+    def test_sort(self):
+        recordset = HarvestRecordSet(data=[{'Account': f'a{i % 2}', 'Size': i} for i in range(6)] + [{'Size': 9}])
+        recordset.add_match('Size>=3')
+
+        recordset.sort(['Account', {'Size': 'desc'}])
+        self.assertEqual([record['Size'] for record in recordset], [9, 4, 2, 0, 5, 3, 1])
+
+        # Match results move with their records
+        self.assertEqual([record.is_matched_record for record in recordset], [True, True, False, False, True, True, False])
+
+        # Without fields, records are sorted like a list
+        recordset.sort(key=lambda record: record['Size'], reverse=True)
+        self.assertEqual([record['Size'] for record in recordset], [9, 5, 4, 3, 2, 1, 0])
+        self.assertEqual(recordset.count_matched_records(), 4)
+
+    def test_top_k(self):
+        recordset = HarvestRecordSet(data=[{'Size': i % 4, 'Id': i} for i in range(10)]).create_index('id_index', 'Id')
+
+        recordset.top_k({'Size': 'desc'}, 3)
+        self.assertEqual([record['Id'] for record in recordset], [3, 7, 2])
+        self.assertEqual(sorted(key for key, in recordset.indexes['id_index']), [2, 3, 7])
+        self.assertEqual(recordset.key_catalog['Id'], 3)
+
     def test_unwind(self):
         self.recordset.add(data=[{'index': 5, 'value': ['value_5', 'value_6']}])
         self.recordset.unwind(source_key='value')
         self.assertEqual(len(self.recordset), 7)
 
+        # Tuples are unwound and records without the key are preserved
+        self.recordset.add(data=[{'index': 6, 'value': ('value_7', 'value_8')}, {'index': 7}])
+        self.recordset.unwind(source_key='value')
+        self.assertEqual([record.get('value') for record in self.recordset[-3:]], ['value_7', 'value_8', None])
+
+        self.recordset.unwind(source_key='missing', preserve_null_and_empty_keys=False)
+        self.assertEqual(len(self.recordset), 0)
+
+    def test_unwind_keys(self):
+        records = HarvestRecordSet(data=[{'id': 1, 'ports': [22, 443], 'cidrs': ['10.0.0.0/8', '0.0.0.0/0'], 'x': 'y'},
+                                         {'id': 2, 'ports': [80], 'cidrs': []}])
+        records.add_match('id==1')
+
+        # The records are not modified until unwind() is called
+        unwound = list(records.iter_unwind(['ports', 'cidrs']))
+        self.assertEqual(len(unwound), 4)
+        self.assertEqual(len(records), 2)
+
+        records.unwind(['ports', 'cidrs'])
+
+        self.assertEqual([(record['ports'], record['cidrs']) for record in records],
+                         [(22, '10.0.0.0/8'), (22, '0.0.0.0/0'), (443, '10.0.0.0/8'), (443, '0.0.0.0/0')])
+        self.assertEqual(records[0], {'id': 1, 'ports': 22, 'cidrs': '10.0.0.0/8', 'x': 'y'})
+        self.assertEqual(records.count_matched_records(), 4)
+        self.assertEqual(records.key_catalog, {'id': 4, 'ports': 4, 'cidrs': 4, 'x': 4})
+
+        # Unwound records share the keys of the record they came from
+        self.assertIs(records[0]._base, records[3]._base)
+        records[0]['x'] = 'z'
+        self.assertEqual(records[3]['x'], 'y')
+
+        # Unwinding an unwound record keeps sharing the same keys
+        records.add(data={'id': 3, 'ports': [1, 2]})
+        base = records[0]._base
+        records[0]['nested'] = ['a', 'b']
+        records.unwind('nested')
+        self.assertIs(records[1]._base, base)
+        self.assertEqual(records[1], {'id': 1, 'ports': 22, 'cidrs': '10.0.0.0/8', 'x': 'z', 'nested': 'b'})
+
 
 class TestHarvestRecordSets(unittest.TestCase):
     def setUp(self):
@@ -104,26 +540,110 @@ class TestHarvestRecordSets(unittest.TestCase):
         self.recordsets.index('recordset1', 'index3', 'value')
         self.assertEqual(len(self.recordsets['recordset1'].indexes['index3'][(None, )]), 5)
 
-    # def test_join(self):
-    #     # Test inner join
-    #     self.recordsets.join('joined_inner', ['recordset1', 'recordset2'], 'index', 'inner')
-    #     self.assertEqual(len(self.recordsets['joined_inner']), 2)
-    #
-    #     # Test outer join
-    #     self.recordsets.join('joined_outer', ['recordset1', 'recordset2'], 'index', 'outer')
-    #     self.assertEqual(len(self.recordsets['joined_outer']), 7)
-    #
-    #     # Test left join
-    #     self.recordsets.join('joined_left', ['recordset1', 'recordset2'], 'index', 'left')
-    #     self.assertEqual(len(self.recordsets['joined_left']), 5)
-    #
-    #     # Test right join
-    #     self.recordsets.join('joined_right', ['recordset1', 'recordset2'], 'index', 'right')
-    #     self.assertEqual(len(self.recordsets['joined_right']), 5)
+    def test_join(self):
+        # Test inner join
+        self.recordsets.join('joined_inner', ['recordset1', 'recordset2'], 'index', 'inner')
+        self.assertEqual(len(self.recordsets['joined_inner']), 2)
+
+        # Test outer join
+        self.recordsets.join('joined_outer', ['recordset1', 'recordset2'], 'index', 'outer')
+        self.assertEqual(len(self.recordsets['joined_outer']), 8)
+
+        # Test left join
+        self.recordsets.join('joined_left', ['recordset1', 'recordset2'], 'index', 'left')
+        self.assertEqual(len(self.recordsets['joined_left']), 5)
+
+        # Test right join
+        self.recordsets.join('joined_right', ['recordset1', 'recordset2'], 'index', 'right')
+        self.assertEqual(len(self.recordsets['joined_right']), 5)
+
+        with self.assertRaises(ValueError):
+            self.recordsets.join('joined_invalid', ['recordset1', 'recordset2'], 'index', 'cross')
+
+    def test_join_records(self):
+        instances = HarvestRecordSet(data=[
+            {'InstanceId': 'i-1', 'VolumeId': 'vol-1', 'State': 'running'},
+            {'InstanceId': 'i-2', 'VolumeId': 'vol-2', 'State': 'stopped'},
+            {'InstanceId': 'i-3', 'State': 'running'},
+        ])
+        volumes = HarvestRecordSet(data=[
+            {'VolumeId': 'vol-1', 'Size': 8, 'State': 'in-use'},
+            {'VolumeId': 'vol-1', 'Size': 8, 'State': 'in-use'},
+            {'VolumeId': 'vol-9', 'Size': 100, 'State': 'available'},
+        ])
+
+        # Every pair of matching records is joined and values from the right side are kept
+        inner = instances.join(volumes, 'VolumeId')
+        self.assertEqual(inner[0], {'InstanceId': 'i-1', 'VolumeId': 'vol-1', 'State': 'in-use', 'Size': 8})
+        self.assertEqual(len(inner), 2)
+        self.assertTrue(all(record.recordset is inner for record in inner))
+
+        # Records without the join field are kept by an outer join but never matched
+        outer = instances.join(volumes, ['VolumeId'], 'outer')
+        self.assertEqual(sorted(record.get('InstanceId', '-') for record in outer), ['-', 'i-1', 'i-1', 'i-2', 'i-3'])
+
+        # A hash index over the join fields is used as the hash table
+        volumes.create_index('volume_id', 'VolumeId')
+        self.assertIs(volumes._join_table(('VolumeId', )), volumes.indexes['volume_id'])
+        right = instances.join(volumes, 'VolumeId', 'right')
+        self.assertEqual([record.get('InstanceId') for record in right], ['i-1', 'i-1', None])
+
+    def test_join_spilled(self):
+        expected = self.recordsets.join('joined_hash', ['recordset1', 'recordset2'], 'index', 'outer')['joined_hash']
+
+        # Joins of more records than spill_threshold use a sort-merge join
+        self.recordsets.spill_threshold = 3
+        self.recordsets.join('joined_merge', ['recordset1', 'recordset2'], ['index'], 'outer')
+
+        result = self.recordsets['joined_merge']
+        self.assertEqual([record['index'] for record in result], list(range(8)))
+        self.assertEqual(sorted(result, key=lambda record: record['index']),
+                         sorted(expected, key=lambda record: record['index']))
+
+    def test_join_spilled_same_result(self):
+        left = HarvestRecordSet(data=[{'Tags': [1, 2], 'Name': 'a'}, {'Tags': [3], 'Name': 'b'}, {'Tags': 1, 'Name': 'c'},
+                                      {'Name': 'd'}])
+        right = HarvestRecordSet(data=[{'Tags': [1, 2], 'Size': 8}, {'Tags': True, 'Size': 16}, {'Tags': {'k': 'v'}}])
+        recordsets = HarvestRecordSets(left=left, right=right)
+
+        # Unhashable join values are joined by the hash join and the sort-merge join alike
+        for join_type in ('inner', 'left', 'right', 'outer'):
+            with self.subTest(join_type=join_type):
+                recordsets.spill_threshold = 100
+                recordsets.join('hashed', ['left', 'right'], 'Tags', join_type)
+
+                recordsets.spill_threshold = 3
+                recordsets.join('spilled', ['left', 'right'], 'Tags', join_type)
+
+                self.assertEqual(sorted(map(repr, recordsets['hashed'])), sorted(map(repr, recordsets['spilled'])))
+
+        self.assertEqual(sorted(record['Name'] for record in left.join(right, 'Tags')), ['a', 'c'])
+
+    def test_sort(self):
+        recordset = self.recordsets['recordset1']
+        recordset.add(data={'value': 'no index'})
+        recordset.add_match('index>=2')
+
+        self.recordsets.sort('recordset1', 'index', reverse=True)
+        self.assertEqual([record.get('index') for record in recordset], [4, 3, 2, 1, 0, None])
+        self.assertEqual([record.is_matched_record for record in recordset], [True, True, True, False, False, False])
+
+        # Sorted in spilled runs
+        self.recordsets.spill_threshold = 2
+        self.recordsets.sort('recordset1', ['index'])
+        self.assertEqual([record.get('index') for record in recordset], [None, 0, 1, 2, 3, 4])
+        self.assertEqual(recordset.count_matched_records(), 3)
 
     def test_list(self):
+        self.recordsets['recordset1'].add_match('index>2')
+
         recordset_list = self.recordsets.list()
         self.assertEqual(len(recordset_list), 2)
+        self.assertEqual(recordset_list[0]['Matches'], 2)
+        self.assertEqual(recordset_list[1]['Matches'], 5)
+
+        # Listing does not move records to another record set
+        self.assertIs(self.recordsets['recordset1'][0].recordset, self.recordsets['recordset1'])
 
     def test_purge(self):
         self.recordsets.purge()
@@ -143,9 +663,19 @@ class TestHarvestRecordSets(unittest.TestCase):
         self.assertEqual('recordset_renamed' in self.recordsets, True)
 
     def test_union(self):
+        recordset1 = self.recordsets['recordset1'].create_index('by_index', 'index').add_match('index==1')
+
         self.recordsets.union('union_recordset', ['recordset1', 'recordset2'])
         self.assertEqual(len(self.recordsets['union_recordset']), 10)
 
+        # Changing the union leaves the record sets it was made from unchanged
+        self.recordsets['union_recordset'].modify_records('rename_key', {'old_key': 'index', 'new_key': 'position'})
+        self.assertEqual([record['index'] for record in recordset1], list(range(5)))
+        self.assertEqual(recordset1.keys, ['index', 'value'])
+        self.assertEqual(recordset1.indexes['by_index'][(1, )], [recordset1[1]])
+        self.assertEqual([record.is_matched_record for record in recordset1], [False, True, False, False, False])
+        self.assertEqual(recordset1.count_matched_records(), 1)
+
 
 if __name__ == '__main__':
     unittest.main()
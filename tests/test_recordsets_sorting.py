@@ -0,0 +1,98 @@
+import unittest
+from datetime import datetime, timezone
+from CloudHarvestCoreDataModel.recordset import HarvestRecordSet
+from CloudHarvestCoreDataModel.sorting import external_sort, merge_join, parse_sort_fields, sort_column, sort_key, sort_positions, top_positions
+
+
+class TestSorting(unittest.TestCase):
+    def test_sort_key(self):
+        aware = datetime(2024, 1, 1, tzinfo=timezone.utc)
+        naive = datetime(2024, 1, 1)
+
+        values = ['b', 2, naive, None, float('nan'), True, aware, 'a', 0.5, [1]]
+        result = sorted(values, key=sort_key)
+
+        self.assertIsNone(result[0])
+        self.assertEqual(result[1:4], [0.5, True, 2])
+        self.assertNotEqual(result[4], result[4])
+        self.assertEqual(result[5:], ['a', 'b', aware, naive, [1]])
+
+        # Booleans and numbers compare equal as they do when records are matched
+        self.assertEqual(sort_key(1), sort_key(1.0))
+        self.assertEqual(sort_key(True), sort_key(1))
+
+    def test_external_sort(self):
+        items = [(i % 7, i) for i in range(100)]
+        expected = sorted(items, key=lambda item: item[0])
+
+        # In memory
+        self.assertEqual(list(external_sort(items, run_size=1000, key=lambda item: item[0])), expected)
+
+        # Spilled to temporary files; ties keep their original order
+        self.assertEqual(list(external_sort(iter(items), run_size=9, key=lambda item: item[0])), expected)
+
+        expected = sorted(items, key=lambda item: item[0], reverse=True)
+        self.assertEqual(list(external_sort(items, run_size=9, key=lambda item: item[0], reverse=True)), expected)
+
+        self.assertEqual(list(external_sort([], run_size=9)), [])
+
+        with self.assertRaises(ValueError):
+            list(external_sort(items, run_size=0))
+
+    def test_sort_positions(self):
+        records = [{'a': i % 3, 'b': f'{i:02d}'} for i in range(10)] + [{'b': 'x'}]
+
+        self.assertEqual(parse_sort_fields(['a', {'b': 'desc'}]), [('a', False), ('b', True)])
+        self.assertEqual(parse_sort_fields('a'), [('a', False)])
+
+        with self.assertRaises(ValueError):
+            parse_sort_fields({'a': 'down'})
+
+        # Fields may be sorted in different directions; records missing a field sort first
+        self.assertEqual(sort_positions(records, ['a', {'b': 'desc'}]), [10, 9, 6, 3, 0, 7, 4, 1, 8, 5, 2])
+        self.assertEqual(sort_positions(records, ['a', {'b': 'desc'}], reverse=True), [2, 5, 8, 1, 4, 7, 0, 3, 6, 9, 10])
+
+        # Ties keep their order in either direction
+        self.assertEqual(sort_positions(records, 'a', reverse=True)[:4], [2, 5, 8, 1])
+
+    def test_top_positions(self):
+        records = [{'a': i % 3, 'b': f'{i:02d}'} for i in range(10)] + [{'b': 'x'}]
+
+        for fields in ('a', {'a': 'desc'}, ['a', {'b': 'desc'}], [{'a': 'desc'}, {'b': 'desc'}], ['a', 'b']):
+            for reverse in (False, True):
+                for count in (0, 1, 4, 11, 20):
+                    with self.subTest(fields=fields, reverse=reverse, count=count):
+                        self.assertEqual(top_positions(records, fields, count, reverse=reverse),
+                                         sort_positions(records, fields, reverse=reverse)[:count])
+
+    def test_sort_column(self):
+        # Strings and numbers are compared directly; other columns are converted with sort_key()
+        self.assertEqual(sort_column([{'a': 'x'}, {'a': 'y'}], 'a'), ['x', 'y'])
+        self.assertEqual(sort_column([{'a': 1}, {'a': 2.5}, {'a': True}], 'a'), [1, 2.5, True])
+        self.assertEqual(sort_column([{'a': 1}, {}], 'a'), [sort_key(1), sort_key(None)])
+        self.assertEqual(sort_column([{'a': float('nan')}], 'a'), [sort_key(float('nan'))])
+
+    def test_merge_join(self):
+        left = HarvestRecordSet(data=[{'id': i % 6, 'left': i} for i in range(12)] + [{'left': 'no id'}])
+        right = HarvestRecordSet(data=[{'id': i, 'right': i} for i in range(3, 9)] + [{'id': None, 'right': 'no id'}])
+
+        def normalize(records):
+            return sorted(repr(sorted(record.items())) for record in map(dict, records))
+
+        for join_type in ('inner', 'left', 'right', 'outer'):
+            with self.subTest(join_type=join_type):
+                expected = left.join(right, 'id', join_type)
+                result = list(merge_join(left, right, ['id'], join_type, run_size=4))
+
+                self.assertEqual(normalize(result), normalize(expected))
+
+        # Joined records are ordered by the join fields
+        self.assertEqual([record['id'] for record in merge_join(left, right, ['id'])], [3, 3, 4, 4, 5, 5])
+
+        # Iterators are read once and their records are spilled in runs, so neither side needs to be held in memory
+        result = merge_join((dict(record) for record in left), iter(list(right)), ['id'], 'outer', run_size=2)
+        self.assertEqual(normalize(result), normalize(left.join(right, 'id', 'outer')))
+
+
+if __name__ == '__main__':
+    unittest.main()